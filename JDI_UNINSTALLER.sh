@@ -44,18 +44,21 @@ stop_and_remove_services() {
     sudo systemctl stop jdi-auto-optimize.service 2>/dev/null || true
     sudo systemctl stop jdi-powersave.service 2>/dev/null || true
     sudo systemctl stop jdi-permissions.service 2>/dev/null || true
+    sudo systemctl stop jdi-control.service 2>/dev/null || true
     
     # Disable all JDI services
     sudo systemctl disable jdi-backlight-button.service 2>/dev/null || true
     sudo systemctl disable jdi-auto-optimize.service 2>/dev/null || true
     sudo systemctl disable jdi-powersave.service 2>/dev/null || true
     sudo systemctl disable jdi-permissions.service 2>/dev/null || true
+    sudo systemctl disable jdi-control.service 2>/dev/null || true
     
     # Remove service files
     sudo rm -f /etc/systemd/system/jdi-backlight-button.service
     sudo rm -f /etc/systemd/system/jdi-auto-optimize.service
     sudo rm -f /etc/systemd/system/jdi-powersave.service
     sudo rm -f /etc/systemd/system/jdi-permissions.service
+    sudo rm -f /etc/systemd/system/jdi-control.service
     
     # Reload systemd
     sudo systemctl daemon-reload
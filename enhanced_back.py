@@ -8,6 +8,7 @@ Features:
 - PWM brightness control (0-6 levels)
 - Auto-dimming for battery saving
 - Status monitoring
+- Telemetry (time at level, presses, auto-dim, energy) in a node-exporter textfile
 - Error handling and fallback modes
 """
 
@@ -18,6 +19,9 @@ import time
 import threading
 import subprocess
 
+from jdi_sysfs import default_sysfs
+from jdi_telemetry import Telemetry, TEXTFILE_PATH, TELEMETRY_INTERVAL
+
 # Global GPIO availability flag
 GPIO_AVAILABLE = False
 
@@ -62,8 +66,10 @@ BRIGHTNESS_LEVELS = [0, 1, 2, 3]  # 0=OFF, 1=Low, 3=Medium, 6=High
 current_brightness_index = 2  # Start at medium brightness (level 3)
 
 # Paths for backlight control
-BACKLIGHT_PATH = "/sys/class/backlight/jdi-backlight/brightness"
-BACKLIGHT_MAX_PATH = "/sys/class/backlight/jdi-backlight/max_brightness"
+sysfs = default_sysfs()
+backlight_attr = sysfs.backlight('brightness')
+BACKLIGHT_PATH = backlight_attr.path
+BACKLIGHT_MAX_PATH = sysfs.backlight('max_brightness').path
 
 # Global state
 running = True
@@ -73,6 +79,7 @@ auto_dim_timer = None
 auto_dim_timeout = 300  # 5 minutes
 main_button = None
 power_button = None
+telemetry = Telemetry()
 
 def check_backlight():
     """Check if PWM backlight is available"""
@@ -84,13 +91,12 @@ def get_current_brightness():
         return current_brightness_index
         
     try:
-        with open(BACKLIGHT_PATH, 'r') as f:
-            brightness = int(f.read().strip())
-            # Map to our brightness levels
-            for i, level in enumerate(BRIGHTNESS_LEVELS):
-                if brightness <= level:
-                    return i
-            return len(BRIGHTNESS_LEVELS) - 1
+        brightness = int(backlight_attr.read())
+        # Map to our brightness levels
+        for i, level in enumerate(BRIGHTNESS_LEVELS):
+            if brightness <= level:
+                return i
+        return len(BRIGHTNESS_LEVELS) - 1
     except:
         return current_brightness_index
 
@@ -106,8 +112,9 @@ def set_brightness(level_index):
     
     if check_backlight():
         try:
-            with open(BACKLIGHT_PATH, 'w') as f:
-                f.write(str(brightness_value))
+            # Persistent fd, skipped if the level did not change
+            backlight_attr.write(brightness_value)
+            telemetry.set_level(brightness_value)
             status = "ON" if brightness_value > 0 else "OFF"
             print(f"Brightness set to: {brightness_value}/3 ({status})")
             return True
@@ -133,6 +140,7 @@ def button_pressed():
     # Cycle through brightness levels: 0 -> 1 -> 3 -> 6 -> 0
     current_brightness_index = (current_brightness_index + 1) % len(BRIGHTNESS_LEVELS)
     set_brightness(current_brightness_index)
+    telemetry.press('cycle', time.time() - current_time)
     
     # Reset auto-dim timer
     reset_auto_dim_timer()
@@ -141,6 +149,7 @@ def power_button_pressed():
     """Handle power button press (toggle on/off)"""
     global current_brightness_index
     
+    pressed_at = time.time()
     if current_brightness_index == 0:
         # Turn on to medium brightness
         current_brightness_index = 2  # Level 3
@@ -149,6 +158,7 @@ def power_button_pressed():
         current_brightness_index = 0  # Level 0
         
     set_brightness(current_brightness_index)
+    telemetry.press('power', time.time() - pressed_at)
     print("Power button: toggled display")
 
 def auto_dim():
@@ -157,6 +167,7 @@ def auto_dim():
     if current_brightness_index > 1:
         current_brightness_index = 1  # Dim to low
         set_brightness(current_brightness_index)
+        telemetry.auto_dim()
         print("Auto-dimmed to low brightness after timeout")
 
 def reset_auto_dim_timer():
@@ -194,12 +205,21 @@ def signal_handler(sig, frame):
     
     sys.exit(0)
 
+def write_telemetry():
+    """Write the node-exporter textfile"""
+    try:
+        telemetry.write_textfile(TEXTFILE_PATH)
+    except OSError as e:
+        print(f"Warning: could not write telemetry: {e}")
+
 def cleanup():
     """Cleanup resources"""
     global auto_dim_timer, main_button, power_button
     
     if auto_dim_timer:
         auto_dim_timer.cancel()
+    
+    write_telemetry()
         
     if GPIO_AVAILABLE and main_button:
         main_button.close()
@@ -238,6 +258,7 @@ def main():
     current_level = get_current_brightness()
     brightness_value = BRIGHTNESS_LEVELS[current_level] if current_level < len(BRIGHTNESS_LEVELS) else 0
     max_brightness = max(BRIGHTNESS_LEVELS)
+    telemetry.set_level(brightness_value)
     print(f"Current brightness level: {brightness_value} ({'ON' if brightness_value > 0 else 'OFF'})")
     print(f"Maximum brightness level: {max_brightness}")
     
@@ -251,6 +272,7 @@ def main():
     reset_auto_dim_timer()
     
     # Main loop
+    next_telemetry = time.monotonic() + TELEMETRY_INTERVAL
     try:
         while running:
             time.sleep(1)
@@ -258,6 +280,10 @@ def main():
             # In simulation mode, allow keyboard input for testing
             if not GPIO_AVAILABLE:
                 time.sleep(10)  # Less frequent checks in simulation mode
+            
+            if time.monotonic() >= next_telemetry:
+                write_telemetry()
+                next_telemetry = time.monotonic() + TELEMETRY_INTERVAL
                 
     except KeyboardInterrupt:
         signal_handler(signal.SIGINT, None)
@@ -6,52 +6,42 @@ Author: N@Xs - Enhanced Edition 2025
 This script listens to the kernel input device created by the device tree
 and handles button presses to control backlight brightness.
 FIXED: Uses custom key code (240) to avoid power button interference.
+The event loop blocks in epoll without timeouts, reads events in bulk and
+follows /dev/input hotplug through inotify, so it never wakes up idle.
+With JDI_TRACE_LATENCY=1 every press is traced from the kernel event
+timestamp to the sysfs write (jdi_latency), dumped on SIGUSR1.
 """
 
 import os
 import sys
 import time
 import select
-import struct
 import signal
-import subprocess
+
+from jdi_input import (DeviceLookup, EventReader, Inotify, EV_KEY, KEY_PRESS,
+                       INPUT_DIR, IN_CREATE, IN_DELETE, IN_ATTRIB)
+from jdi_sysfs import default_sysfs
+from jdi_latency import LatencyTracer
 
 # Configuration
-BACKLIGHT_PATH = "/sys/class/backlight/jdi-backlight/brightness"
-BACKLIGHT_MAX_PATH = "/sys/class/backlight/jdi-backlight/max_brightness"
+sysfs = default_sysfs()
+backlight_attr = sysfs.backlight('brightness')
+BACKLIGHT_PATH = backlight_attr.path
+BACKLIGHT_MAX_PATH = sysfs.backlight('max_brightness').path
 BRIGHTNESS_LEVELS = [0, 1, 2, 3]  # OFF, Low, Medium, High
 INPUT_DEVICE_PATH = None
 BRIGHTNESS_KEY_CODE = 240  # Custom key code - NOT power button
+BUTTON_DEVICE_NAMES = ("Brightness Button", "gpio-keys")
 
 # Global state
 current_brightness_index = 2  # Start at medium (level 3)
 running = True
+device_lookup = DeviceLookup(BUTTON_DEVICE_NAMES)
+tracer = LatencyTracer.from_env()
 
 def find_button_device():
-    """Find the input device for our GPIO button"""
-    devices_path = "/proc/bus/input/devices"
-    if not os.path.exists(devices_path):
-        return None
-    
-    try:
-        with open(devices_path, 'r') as f:
-            content = f.read()
-            
-        # Look for our brightness button
-        lines = content.split('\n')
-        for i, line in enumerate(lines):
-            if "Brightness Button" in line or "gpio-keys" in line:
-                # Find the corresponding event device
-                for j in range(i, min(i + 10, len(lines))):
-                    if lines[j].startswith('H: Handlers='):
-                        handlers = lines[j].split('=')[1].strip()
-                        for handler in handlers.split():
-                            if handler.startswith('event'):
-                                return f"/dev/input/{handler}"
-    except:
-        pass
-    
-    return None
+    """Find the input device for our GPIO button (cached until hotplug)"""
+    return device_lookup.find()
 
 def check_backlight():
     """Check if backlight interface is available"""
@@ -63,13 +53,12 @@ def get_current_brightness():
         return current_brightness_index
         
     try:
-        with open(BACKLIGHT_PATH, 'r') as f:
-            brightness = int(f.read().strip())
-            # Map to our brightness levels
-            for i, level in enumerate(BRIGHTNESS_LEVELS):
-                if brightness <= level:
-                    return i
-            return len(BRIGHTNESS_LEVELS) - 1
+        brightness = int(backlight_attr.read())
+        # Map to our brightness levels
+        for i, level in enumerate(BRIGHTNESS_LEVELS):
+            if brightness <= level:
+                return i
+        return len(BRIGHTNESS_LEVELS) - 1
     except:
         return current_brightness_index
 
@@ -85,8 +74,10 @@ def set_brightness(level_index):
     
     if check_backlight():
         try:
-            with open(BACKLIGHT_PATH, 'w') as f:
-                f.write(str(brightness_value))
+            # Persistent fd, skipped if the level did not change
+            backlight_attr.write(brightness_value)
+            if tracer is not None:
+                tracer.complete()
             status = "ON" if brightness_value > 0 else "OFF"
             print(f"GPIO17: Brightness → {brightness_value}/3 ({status})")
             return True
@@ -98,10 +89,13 @@ def set_brightness(level_index):
         print(f"Simulation: Brightness → {brightness_value}/3 ({status})")
         return True
 
-def handle_button_press():
+def handle_button_press(event_ns=None, read_ns=None):
     """Handle button press - cycle through brightness levels"""
     global current_brightness_index
     
+    if tracer is not None:
+        tracer.begin('cycle', event_ns, read_ns)
+        tracer.mark('handler')
     # Cycle through: 0 -> 1 -> 3 -> 6 -> 0
     current_brightness_index = (current_brightness_index + 1) % len(BRIGHTNESS_LEVELS)
     set_brightness(current_brightness_index)
@@ -111,8 +105,88 @@ def signal_handler(sig, frame):
     global running
     print("\nShutting down GPIO17 button handler...")
     running = False
+    if tracer is not None:
+        tracer.dump()
     sys.exit(0)
 
+def handle_input_events(reader):
+    """Process every queued input event of the button device"""
+    events = reader.read()
+    read_ns = time.monotonic_ns()
+    # Kernels without EVIOCSCLOCKID stamp events with CLOCK_REALTIME
+    offset = 0 if reader.monotonic else time.time_ns() - read_ns
+    for sec, usec, ev_type, ev_code, ev_value in events:
+        # Key press event: type=1 (EV_KEY), value=1 (press)
+        # Only respond to our brightness button (key code 240)
+        if ev_type == EV_KEY and ev_value == KEY_PRESS and ev_code == BRIGHTNESS_KEY_CODE:
+            print(f"✅ Brightness button pressed (code: {ev_code})")
+            handle_button_press(sec * 10**9 + usec * 1000 - offset, read_ns)
+        elif ev_type == EV_KEY and ev_value == KEY_PRESS:
+            print(f"⚠️  Ignoring key press (code: {ev_code}) - not brightness button")
+
+def run_input_loop():
+    """Blocking epoll loop over the button device and /dev/input hotplug"""
+    epoll = select.epoll()
+    inotify = Inotify()
+    inotify.add_watch(INPUT_DIR, IN_CREATE | IN_DELETE | IN_ATTRIB)
+    epoll.register(inotify.fileno(), select.EPOLLIN)
+    reader = None
+
+    def attach():
+        nonlocal reader
+        global INPUT_DEVICE_PATH
+        INPUT_DEVICE_PATH = find_button_device()
+        if not INPUT_DEVICE_PATH:
+            return
+        try:
+            reader = EventReader(INPUT_DEVICE_PATH)
+        except PermissionError:
+            print(f"❌ Permission denied accessing {INPUT_DEVICE_PATH}")
+            print("Try running with sudo or add user to input group")
+            return
+        except OSError:
+            # Node not ready yet, a later IN_ATTRIB/IN_CREATE retries
+            return
+        reader.set_monotonic()
+        epoll.register(reader.fileno(), select.EPOLLIN)
+        print(f"✅ GPIO17 button device attached: {INPUT_DEVICE_PATH}")
+
+    def detach():
+        nonlocal reader
+        epoll.unregister(reader.fileno())
+        reader.close()
+        print(f"⚠️  GPIO17 button device removed: {reader.path}")
+        reader = None
+
+    attach()
+    if reader is None:
+        print("Waiting for GPIO button input device...")
+
+    try:
+        while running:
+            # No timeout: the process sleeps until an event or hotplug arrives
+            for fd, mask in epoll.poll():
+                if fd == inotify.fileno():
+                    if any(name.startswith('event') for _, _, name in inotify.read_events()):
+                        device_lookup.invalidate()
+                        if reader is not None and not os.path.exists(reader.path):
+                            detach()
+                        if reader is None:
+                            attach()
+                elif reader is not None and fd == reader.fileno():
+                    if mask & (select.EPOLLHUP | select.EPOLLERR):
+                        detach()
+                        continue
+                    try:
+                        handle_input_events(reader)
+                    except OSError:
+                        detach()
+    finally:
+        if reader is not None:
+            reader.close()
+        inotify.close()
+        epoll.close()
+
 def main():
     """Main function"""
     global running, INPUT_DEVICE_PATH
@@ -123,6 +197,8 @@ def main():
     # Setup signal handlers
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    if tracer is not None:
+        tracer.install_signal()
     
     # Find the input device
     INPUT_DEVICE_PATH = find_button_device()
@@ -142,57 +218,30 @@ def main():
             print("Press GPIO17 button to cycle brightness: 0→1→2→3→0")
             print("Press Ctrl+C to exit")
             
+            # gpiozero delivers presses from its own thread, sleep until a signal
             while running:
-                time.sleep(1)
+                signal.pause()
                 
         except ImportError:
-            print("❌ Error: Neither input device nor gpiozero available")
-            return 1
+            print("⚠️  gpiozero not available, waiting for the input device instead")
         except Exception as e:
             print(f"❌ Error setting up GPIO: {e}")
             return 1
+        else:
+            return 0
     else:
         print(f"✅ Found GPIO button device: {INPUT_DEVICE_PATH}")
-        
-        try:
-            # Open the input device
-            device = open(INPUT_DEVICE_PATH, 'rb')
-            print("✅ GPIO17 button handler started (input device mode)")
-            print(f"Current brightness: {get_current_brightness()}")
-            print("Press GPIO17 button to cycle brightness: 0→1→2→3→0")
-            print(f"Listening for key code: {BRIGHTNESS_KEY_CODE} (NOT power button)")
-            print("Press Ctrl+C to exit")
-            
-            # Input event structure: time_sec, time_usec, type, code, value
-            event_format = 'llHHI'
-            event_size = struct.calcsize(event_format)
-            
-            while running:
-                # Use select to check for input with timeout
-                ready, _, _ = select.select([device], [], [], 1.0)
-                
-                if ready:
-                    data = device.read(event_size)
-                    if len(data) == event_size:
-                        _, _, ev_type, ev_code, ev_value = struct.unpack(event_format, data)
-                        
-                        # Key press event: type=1 (EV_KEY), value=1 (press)
-                        # Only respond to our brightness button (key code 240)
-                        if ev_type == 1 and ev_value == 1 and ev_code == BRIGHTNESS_KEY_CODE:
-                            print(f"✅ Brightness button pressed (code: {ev_code})")
-                            handle_button_press()
-                        elif ev_type == 1 and ev_value == 1:
-                            print(f"⚠️  Ignoring key press (code: {ev_code}) - not brightness button")
-            
-            device.close()
-            
-        except PermissionError:
-            print(f"❌ Permission denied accessing {INPUT_DEVICE_PATH}")
-            print("Try running with sudo or add user to input group")
-            return 1
-        except Exception as e:
-            print(f"❌ Error handling input device: {e}")
-            return 1
+        print("✅ GPIO17 button handler started (input device mode)")
+        print(f"Current brightness: {get_current_brightness()}")
+        print("Press GPIO17 button to cycle brightness: 0→1→2→3→0")
+        print(f"Listening for key code: {BRIGHTNESS_KEY_CODE} (NOT power button)")
+        print("Press Ctrl+C to exit")
+    
+    try:
+        run_input_loop()
+    except OSError as e:
+        print(f"❌ Error handling input device: {e}")
+        return 1
     
     return 0
 
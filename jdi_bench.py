@@ -0,0 +1,384 @@
+#!/usr/bin/python3
+"""
+SPI bandwidth and frame-rate benchmark for the JDI mono and 8-color modes
+Author: N@Xs - Enhanced Edition 2025
+
+Color mode sends 3 bits per pixel, mono 1, so a color row is three times
+the SPI traffic (sharp_memory_to_color_tagged vs
+sharp_memory_gray8_to_mono_tagged). This suite measures what that means
+for representative content.
+
+Features:
+- Built-in deterministic corpus: terminal typing, terminal scrolling,
+  UI widget updates, photo panning
+- Encoded bytes per update, for the driver's damage-range writes and for
+  changed-rows-only writes (jdi_differ)
+- Encode time per frame (jdi_encoder, same conversion as the driver)
+- Theoretical updates/s at several SPI clocks (jdi_emulator bus model)
+- Row-damage sweep: cost of an update as a function of its height
+- JSON output and --compare against a previous run for regression tracking
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+
+import numpy as np
+
+import jdi_encoder
+from jdi_encoder import WIDTH, HEIGHT, mono_line_len, color_line_len
+from jdi_differ import LineDiffer, message_len
+from jdi_emulator import PanelEmulator, MESSAGE_OVERHEAD_NS
+
+SPI_CLOCKS = (2000000, 4000000, 8000000, 10000000)
+DAMAGE_ROWS = (1, 2, 4, 8, 16, 32, 60, 120, 240)
+FRAMES = 30
+SEED = 2025
+GLYPH_W = 8
+GLYPH_H = 16
+REGRESSION_THRESHOLD = 10.0  # Percent
+
+# Direction of every compared scenario metric: 1 higher is worse, -1 lower
+# is worse. Metrics not listed (e.g. frames) are not compared.
+METRIC_DIRECTION = {
+    'encode_ms': 1,
+    'encode_ms_p95': 1,
+    'rows_per_update': 1,
+    'bytes_per_update': 1,
+    'diff_bytes_per_update': 1,
+    'fps': -1,
+    'diff_fps': -1,
+}
+
+
+def rgb_to_xrgb(rgb):
+    """(H, W, 3) RGB to the XRGB8888 layout the framebuffer holds"""
+    h, w, _ = rgb.shape
+    frame = np.zeros((h, w, 4), dtype=np.uint8)
+    frame[:, :, 0] = rgb[:, :, 2]
+    frame[:, :, 1] = rgb[:, :, 1]
+    frame[:, :, 2] = rgb[:, :, 0]
+    return frame
+
+
+# Corpus. Every scenario yields (frame, y1, y2): the XRGB8888 frame and the
+# damage rows the application would report for it.
+
+def _glyphs(rng, count):
+    """Random 8x16 'glyphs' with a blank border, like a console font"""
+    glyphs = rng.random((count, GLYPH_H, GLYPH_W)) < 0.35
+    glyphs[:, :2] = glyphs[:, -3:] = False
+    glyphs[:, :, -1] = False
+    return glyphs
+
+
+def _text_screen(rng, glyphs, rows, cols):
+    screen = np.zeros((rows * GLYPH_H, cols * GLYPH_W), dtype=bool)
+    for r in range(rows):
+        length = int(rng.integers(0, cols))
+        for c in range(length):
+            g = glyphs[rng.integers(len(glyphs))]
+            screen[r * GLYPH_H:(r + 1) * GLYPH_H, c * GLYPH_W:(c + 1) * GLYPH_W] = g
+    return screen
+
+
+def _terminal_rgb(screen):
+    rgb = np.zeros(screen.shape + (3,), dtype=np.uint8)
+    rgb[screen] = (230, 230, 230)
+    return rgb
+
+
+def scenario_terminal(frames, rng):
+    """Typing at a shell prompt: one glyph per update"""
+    glyphs = _glyphs(rng, 96)
+    rows, cols = HEIGHT // GLYPH_H, WIDTH // GLYPH_W
+    screen = _text_screen(rng, glyphs, rows - 1, cols)
+    screen = np.vstack((screen, np.zeros((GLYPH_H, WIDTH), dtype=bool)))
+    y = (rows - 1) * GLYPH_H
+    for i in range(frames):
+        c = i % cols
+        screen[y:y + GLYPH_H, c * GLYPH_W:(c + 1) * GLYPH_W] = glyphs[rng.integers(len(glyphs))]
+        yield rgb_to_xrgb(_terminal_rgb(screen)), y, y + GLYPH_H
+
+
+def scenario_scrolling(frames, rng):
+    """Terminal output scrolling one text line per update"""
+    glyphs = _glyphs(rng, 96)
+    rows, cols = HEIGHT // GLYPH_H, WIDTH // GLYPH_W
+    screen = _text_screen(rng, glyphs, rows, cols)
+    for _ in range(frames):
+        screen = np.vstack((screen[GLYPH_H:], _text_screen(rng, glyphs, 1, cols)))
+        yield rgb_to_xrgb(_terminal_rgb(screen)), 0, HEIGHT
+
+
+def scenario_ui(frames, rng):
+    """Toolkit UI: title bar, panels, a grid of buttons; one button toggles per update"""
+    rgb = np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8)
+    rgb[:24] = (0, 0, 160)
+    rgb[24:, :120] = (200, 200, 200)
+    buttons = []
+    for r in range(4):
+        for c in range(4):
+            y, x = 40 + r * 48, 136 + c * 64
+            rgb[y:y + 36, x:x + 56] = (0, 160, 0)
+            buttons.append((y, x))
+    for i in range(frames):
+        y, x = buttons[int(rng.integers(len(buttons)))]
+        on = tuple(rgb[y + 2, x + 2]) == (0, 160, 0)
+        rgb[y:y + 36, x:x + 56] = (255, 160, 0) if on else (0, 160, 0)
+        yield rgb_to_xrgb(rgb), y, y + 36
+
+
+def scenario_photo(frames, rng):
+    """Photo-like smooth content panned one pixel per update"""
+    low = rng.integers(0, 256, (HEIGHT // 20 + 2, (WIDTH + frames) // 20 + 2, 3)).astype(np.float32)
+    # Bilinear upscale of low-resolution noise
+    ys = np.linspace(0, low.shape[0] - 1.001, HEIGHT)
+    xs = np.linspace(0, low.shape[1] - 1.001, WIDTH + frames)
+    y0, x0 = ys.astype(int), xs.astype(int)
+    fy, fx = (ys - y0)[:, None, None], (xs - x0)[None, :, None]
+    top = low[y0][:, x0] * (1 - fx) + low[y0][:, x0 + 1] * fx
+    bottom = low[y0 + 1][:, x0] * (1 - fx) + low[y0 + 1][:, x0 + 1] * fx
+    image = (top * (1 - fy) + bottom * fy).astype(np.uint8)
+    for i in range(frames):
+        yield rgb_to_xrgb(np.ascontiguousarray(image[:, i:i + WIDTH])), 0, HEIGHT
+
+
+SCENARIOS = {
+    'terminal': scenario_terminal,
+    'scrolling': scenario_scrolling,
+    'ui': scenario_ui,
+    'photo': scenario_photo,
+}
+
+
+# Measurements
+
+def bus_ns(nbytes, spi_hz, overhead_ns=MESSAGE_OVERHEAD_NS):
+    """Modelled bus time of one message (same model as jdi_emulator)"""
+    return nbytes * 8 * 1000000000 // spi_hz + overhead_ns
+
+
+def updates_per_s(message_sizes, spi_hz):
+    """Sustainable updates/s when every update sends `message_sizes` (list per update)"""
+    total_ns = sum(sum(bus_ns(n, spi_hz) for n in sizes) for sizes in message_sizes)
+    return len(message_sizes) * 1e9 / total_ns if total_ns else 0.0
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) if len(values) else 0.0
+
+
+def bench_scenario(name, color, frames, clocks, verify=False):
+    """Encode one scenario and return its metrics"""
+    params = {'color_cutoff': jdi_encoder.DEFAULT_COLOR_CUTOFF} if color else {
+        'mono_cutoff': jdi_encoder.DEFAULT_MONO_CUTOFF,
+        'mono_invert': jdi_encoder.DEFAULT_MONO_INVERT}
+    line_len = color_line_len() if color else mono_line_len()
+    differ = LineDiffer(color, **params)
+    # With verify, the driver-path and changed-rows-only streams are decoded
+    # on two virtual panels that must end up identical
+    driver_panel = PanelEmulator() if verify else None
+    diff_panel = PanelEmulator() if verify else None
+
+    encode_ms = []
+    full_sizes = []
+    diff_sizes = []
+    rows = []
+    for frame, y1, y2 in SCENARIOS[name](frames, np.random.default_rng(SEED)):
+        started = time.perf_counter()
+        lines = jdi_encoder.encode_lines(frame[y1:y2], color, y1, **params)
+        encode_ms.append((time.perf_counter() - started) * 1000)
+        full_sizes.append([message_len(y2 - y1, line_len)])
+        rows.append(y2 - y1)
+        if driver_panel is not None:
+            driver_panel.transfer(jdi_encoder.spi_message(lines, color))
+
+        sizes = []
+        for _, _, run in differ.diff(frame, y1, y2):
+            message = jdi_encoder.spi_message(run, color)
+            sizes.append(len(message))
+            if diff_panel is not None:
+                diff_panel.transfer(message)
+        diff_sizes.append(sizes)
+
+    result = {
+        'frames': len(rows),
+        'encode_ms': float(np.mean(encode_ms)),
+        'encode_ms_p95': percentile(encode_ms, 95),
+        'rows_per_update': float(np.mean(rows)),
+        'bytes_per_update': float(np.mean([s[0] for s in full_sizes])),
+        'diff_bytes_per_update': float(np.mean([sum(s) for s in diff_sizes])),
+        'fps': {str(hz): updates_per_s(full_sizes, hz) for hz in clocks},
+        'diff_fps': {str(hz): updates_per_s(diff_sizes, hz) for hz in clocks},
+    }
+    if verify:
+        result['verified'] = bool(driver_panel.violation_count == 0 and
+                                  diff_panel.violation_count == 0 and
+                                  np.array_equal(driver_panel.image, diff_panel.image))
+    return result
+
+
+def bench_damage(color, clocks, repeat=20):
+    """Cost of a single update as a function of its height in rows"""
+    rng = np.random.default_rng(SEED)
+    frame = rgb_to_xrgb(rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8))
+    line_len = color_line_len() if color else mono_line_len()
+    results = []
+    for rows in DAMAGE_ROWS:
+        band = frame[:rows]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            jdi_encoder.encode_lines(band, color)
+        encode_ms = (time.perf_counter() - started) * 1000 / repeat
+        size = message_len(rows, line_len)
+        results.append({
+            'rows': rows,
+            'bytes': size,
+            'encode_ms': encode_ms,
+            'fps': {str(hz): 1e9 / bus_ns(size, hz) for hz in clocks},
+        })
+    return results
+
+
+def driver_version():
+    """Loaded driver version, or the one in the source tree"""
+    try:
+        with open('/sys/module/jdi_drm_enhanced/version', 'r') as f:
+            return f.read().strip()
+    except OSError:
+        pass
+    main_c = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'main.c')
+    try:
+        with open(main_c, 'r') as f:
+            for line in f:
+                if line.startswith('MODULE_VERSION('):
+                    return line.split('"')[1] + ' (source)'
+    except OSError:
+        pass
+    return None
+
+
+def run(scenarios, modes, frames, clocks, verify=False):
+    results = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'driver_version': driver_version(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'frames': frames,
+            'spi_clocks': list(clocks),
+            'overhead_ns': MESSAGE_OVERHEAD_NS,
+        },
+        'scenarios': {},
+        'damage': {},
+    }
+    for mode in modes:
+        color = mode == 'color'
+        for name in scenarios:
+            results['scenarios'].setdefault(name, {})[mode] = bench_scenario(
+                name, color, frames, clocks, verify)
+        results['damage'][mode] = bench_damage(color, clocks)
+    return results
+
+
+def flatten_metrics(results):
+    """{'scenario.mode.metric[.clock]': value} for comparisons"""
+    flat = {}
+    for name, modes in results['scenarios'].items():
+        for mode, metrics in modes.items():
+            for key, value in metrics.items():
+                if isinstance(value, dict):
+                    for hz, v in value.items():
+                        flat[f"{name}.{mode}.{key}.{hz}"] = v
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    flat[f"{name}.{mode}.{key}"] = value
+    return flat
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """List of (metric, old, new, change %) that got worse by more than threshold"""
+    old, new = flatten_metrics(baseline), flatten_metrics(current)
+    regressions = []
+    for key, value in new.items():
+        direction = METRIC_DIRECTION.get(key.split('.')[2])
+        if direction is None or key not in old or not old[key]:
+            continue
+        change = 100.0 * (value - old[key]) / old[key]
+        worse = direction * change
+        if worse > threshold:
+            regressions.append((key, old[key], value, change))
+    return regressions
+
+
+def print_summary(results):
+    clocks = results['meta']['spi_clocks']
+    print(f"Driver {results['meta']['driver_version']} on {results['meta']['machine']}, "
+          f"{results['meta']['frames']} frames per scenario")
+    header = ' '.join(f"{hz / 1e6:>6g}M" for hz in clocks)
+    print(f"{'scenario':10} {'mode':5} {'enc ms':>7} {'rows':>5} {'bytes':>7} {'diff':>7}  fps@ {header}")
+    for name, modes in results['scenarios'].items():
+        for mode, m in modes.items():
+            fps = ' '.join(f"{m['fps'][str(hz)]:7.1f}" for hz in clocks)
+            print(f"{name:10} {mode:5} {m['encode_ms']:7.2f} {m['rows_per_update']:5.0f} "
+                  f"{m['bytes_per_update']:7.0f} {m['diff_bytes_per_update']:7.0f}       {fps}")
+    print("\nRow-damage sweep (updates/s):")
+    for mode, rows in results['damage'].items():
+        for r in rows:
+            fps = ' '.join(f"{r['fps'][str(hz)]:7.1f}" for hz in clocks)
+            print(f"  {mode:5} {r['rows']:4d} rows {r['bytes']:6d} B {r['encode_ms']:6.2f} ms  {fps}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JDI mono vs 8-color SPI throughput')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run (default: all)')
+    parser.add_argument('--mode', action='append', choices=('mono', 'color'),
+                        help='Mode to run (default: both)')
+    parser.add_argument('--frames', type=int, default=FRAMES)
+    parser.add_argument('--spi-hz', type=int, action='append',
+                        help='SPI clock to model (default: 2, 4, 8, 10 MHz)')
+    parser.add_argument('--verify', action='store_true',
+                        help='Decode every update on the virtual panel and check the image')
+    parser.add_argument('--json', metavar='FILE', help='Write results as JSON ("-" for stdout)')
+    parser.add_argument('--compare', metavar='FILE', help='Baseline JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Regression threshold in percent')
+    args = parser.parse_args()
+
+    results = run(args.scenario or list(SCENARIOS), args.mode or ['mono', 'color'],
+                  args.frames, tuple(args.spi_hz or SPI_CLOCKS), args.verify)
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print_summary(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if args.verify:
+        failed = [f"{name}/{mode}" for name, modes in results['scenarios'].items()
+                  for mode, m in modes.items() if not m.get('verified')]
+        if failed:
+            print(f"Verification failed: {', '.join(failed)}", file=sys.stderr)
+            return 1
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for key, old, new, change in regressions:
+            print(f"REGRESSION {key}: {old:.3f} -> {new:.3f} ({change:+.1f}%)", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,347 @@
+#!/usr/bin/python3
+"""
+Resident JDI control service on a Unix socket
+Author: N@Xs - Enhanced Edition 2025
+
+Every powersave/backlight/monoset alias used to start a new interpreter
+under sudo, which costs hundreds of milliseconds before any work is
+done. This service runs once as root and answers those commands from
+warm state (imported modules, open sysfs attributes, one
+JDIPowerManager and ProfileEngine); jdi_ctl.py is the client.
+
+Features:
+- One request per line (shell words), reply is a status line (OK/ERR)
+  followed by the command output, then the connection is closed
+- powersave.py commands, profiles (jdi_profiles.py), raw brightness,
+  parameter reads and a compact status
+- Socket access by group (default: video) instead of sudo, peer uid of
+  every request taken from SO_PEERCRED and counted
+- Cached sysfs values dropped before each request, other tools may have
+  changed them in the meantime
+- Only known parameter names are accepted from clients: the service
+  runs as root and names end up in sysfs paths
+- Brightness changes go to the daemon (jdi_daemon.py), which owns the
+  backlight state; sysfs is written directly only when it is not running
+"""
+
+import io
+import os
+import grp
+import sys
+import time
+import shlex
+import socket
+import struct
+import signal
+import asyncio
+import argparse
+import contextlib
+
+from jdi_sysfs import default_sysfs
+from jdi_profiles import ProfileEngine, ProfileError, PROFILES, parse_assignments
+import powersave
+import jdi_ctl
+
+CONTROL_SOCKET = os.environ.get('JDI_CONTROL_SOCKET', '/run/jdi/control.sock')
+DAEMON_SOCKET = os.environ.get('JDI_DAEMON_SOCKET', '/run/jdi/daemon.sock')
+DAEMON_TIMEOUT = 1.0    # Seconds the daemon gets to answer a forwarded request
+SOCKET_GROUP = 'video'
+SOCKET_MODE = 0o660
+MAX_REQUEST = 4096
+REQUEST_TIMEOUT = 5.0   # Seconds a client gets to send its request line
+
+STATUS_PARAMS = ('color', 'mono_cutoff', 'mono_invert', 'color_cutoff', 'dither',
+                 'auto_power_save', 'idle_timeout', 'auto_clear', 'overlays')
+
+USAGE = """Commands:
+  ping                          Round trip check
+  status                        Parameters and brightness as key=value
+  get NAME...                   Read module parameters
+  brightness [N]                Read or set the PWM brightness
+  profile NAME [--dry-run]      Apply a display profile (monoset/optimizer)
+  profile set KEY=VALUE...      Apply parameter values transactionally
+  profile list                  Profile names
+  powersave COMMAND [--timeout MS] [--level N]
+                                powersave.py commands: status, enable-powersave,
+                                disable-powersave, dither-on/off, backlight-on/off,
+                                brightness, optimize, telemetry
+  stats                         Service counters
+  help                          This text"""
+
+
+class CommandError(Exception):
+    pass
+
+
+def peer_uid(sock):
+    """uid of the process on the other end of a Unix socket"""
+    try:
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    except (OSError, AttributeError):
+        return None
+    return struct.unpack('3i', creds)[1]
+
+
+class ControlService:
+    """Command handlers over warm state, independent of the transport"""
+
+    def __init__(self, sysfs=None, daemon_socket=DAEMON_SOCKET):
+        self.sysfs = sysfs or default_sysfs()
+        self.daemon_socket = daemon_socket
+        self.pm = powersave.JDIPowerManager(self.sysfs, brightness_writer=self.set_brightness)
+        self.profiles = ProfileEngine(self.sysfs)
+        self.started = time.monotonic()
+
+        # Counters
+        self.requests = 0
+        self.errors = 0
+        self.busy_ns = 0
+        self.by_uid = {}
+
+    def handle(self, line, uid=None):
+        """Run one request line; returns (ok, output)"""
+        started = time.monotonic_ns()
+        self.requests += 1
+        self.by_uid[uid] = self.by_uid.get(uid, 0) + 1
+        self.sysfs.invalidate()
+        out = io.StringIO()
+        try:
+            words = shlex.split(line)
+            if not words:
+                raise CommandError('Empty request')
+            handler = getattr(self, 'cmd_' + words[0].replace('-', '_'), None)
+            if handler is None:
+                raise CommandError(f"Unknown command: {words[0]} (try 'help')")
+            with contextlib.redirect_stdout(out):
+                ok = handler(words[1:]) is not False
+        except (CommandError, ProfileError, ValueError) as e:
+            out.write(f"{e}\n")
+            ok = False
+        except OSError as e:
+            out.write(f"Error: {e}\n")
+            ok = False
+        if not ok:
+            self.errors += 1
+        self.busy_ns += time.monotonic_ns() - started
+        return ok, out.getvalue()
+
+    def check_params(self, names):
+        """Refuse client-supplied names that are not parameters before any path is built"""
+        for name in names:
+            if not name or '/' in name or '..' in name:
+                raise CommandError(f"Invalid parameter name: {name!r}")
+            self.profiles.check_key(name)
+
+    def set_brightness(self, level):
+        """Hand a PWM level to the daemon; its cached level would go stale
+        if the sysfs file were written behind its back"""
+        try:
+            ok, output = jdi_ctl.request(['brightness', str(level)], self.daemon_socket,
+                                         timeout=DAEMON_TIMEOUT)
+        except TimeoutError:
+            print("Daemon did not answer")
+            return False
+        except OSError:
+            # No daemon running: nothing else holds the level
+            self.sysfs.backlight('brightness').write(level)
+            return True
+        if not ok:
+            print(f"Daemon: {output.strip()}")
+        return ok
+
+    # Commands (print their output, return False on failure)
+
+    def cmd_ping(self, args):
+        print('pong')
+
+    def cmd_help(self, args):
+        print(USAGE)
+
+    def cmd_status(self, args):
+        for name in STATUS_PARAMS:
+            value = self.profiles.read(name)
+            if value is not None:
+                print(f"{name}={value}")
+        for name in ('brightness', 'max_brightness'):
+            try:
+                print(f"{name}={self.sysfs.backlight(name).read()}")
+            except OSError:
+                pass
+
+    def cmd_get(self, args):
+        if not args:
+            raise CommandError('Usage: get NAME...')
+        self.check_params(args)
+        ok = True
+        for name in args:
+            value = self.profiles.read(name)
+            if value is None:
+                print(f"{name}: not available")
+                ok = False
+            else:
+                print(value if len(args) == 1 else f"{name}={value}")
+        return ok
+
+    def cmd_brightness(self, args):
+        attr = self.sysfs.backlight('brightness')
+        if not args:
+            print(attr.read())
+            return
+        level = int(args[0])
+        maximum = self.pm.read_pwm_max_brightness()
+        if not 0 <= level <= maximum:
+            raise CommandError(f"Brightness must be 0-{maximum}")
+        return self.set_brightness(level)
+
+    def cmd_profile(self, args):
+        dry_run = '--dry-run' in args
+        quiet = '--quiet' in args
+        args = [a for a in args if a not in ('--dry-run', '--quiet')]
+        if not args:
+            raise CommandError('Usage: profile NAME|set KEY=VALUE...|list [--dry-run]')
+        if args[0] == 'list':
+            for name in sorted(PROFILES):
+                print(name)
+            return
+        if args[0] == 'set':
+            self.check_params([item.partition('=')[0] for item in args[1:]])
+            profile = parse_assignments(args[1:])
+        else:
+            profile = args[0]
+        changes = self.profiles.apply(profile, dry_run=dry_run)
+        if quiet and not dry_run:
+            return
+        for key, current, target in changes:
+            print(f"{key}: {current} -> {target}")
+        if not changes:
+            print('No changes')
+
+    def cmd_powersave(self, args):
+        parser = argparse.ArgumentParser(prog='powersave', add_help=False, exit_on_error=False)
+        parser.add_argument('command', nargs='?', default='status')
+        parser.add_argument('--timeout', type=int, default=120000)
+        parser.add_argument('--level', type=int, default=4)
+        try:
+            options, extra = parser.parse_known_args(args)
+        except (argparse.ArgumentError, SystemExit) as e:
+            # exit_on_error does not cover every parser error in 3.11
+            raise CommandError(f"Usage: powersave COMMAND [--timeout MS] [--level N] ({e})")
+        if extra:
+            raise CommandError(f"Unexpected arguments: {' '.join(extra)}")
+        result = powersave.run_command(self.pm, options.command, options.timeout, options.level)
+        if result is None:
+            raise CommandError(f"Unknown powersave command: {options.command}")
+        return bool(result)
+
+    def cmd_stats(self, args):
+        for key, value in self.stats().items():
+            print(f"{key}={value}")
+
+    def stats(self):
+        requests = self.requests or 1
+        return {
+            'uptime_s': round(time.monotonic() - self.started),
+            'requests': self.requests,
+            'errors': self.errors,
+            'mean_ms': round(self.busy_ns / requests / 1e6, 3),
+            'clients': ','.join(f"{uid}:{n}" for uid, n in sorted(self.by_uid.items(),
+                                                                  key=lambda i: str(i[0]))),
+        }
+
+
+class ControlServer:
+    """asyncio Unix socket front end of a ControlService"""
+
+    def __init__(self, service, path=CONTROL_SOCKET, group=SOCKET_GROUP, mode=SOCKET_MODE):
+        self.service = service
+        self.path = path
+        self.group = group
+        self.mode = mode
+        self.server = None
+
+    async def start(self):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, mode=0o755, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        # Stream buffer just over MAX_REQUEST: longer lines fail in readline()
+        self.server = await asyncio.start_unix_server(self._client, self.path,
+                                                      limit=MAX_REQUEST + 1)
+        os.chmod(self.path, self.mode)
+        if self.group:
+            try:
+                os.chown(self.path, -1, grp.getgrnam(self.group).gr_gid)
+            except (KeyError, PermissionError) as e:
+                print(f"Warning: socket group {self.group} not applied: {e}")
+
+    async def _client(self, reader, writer):
+        uid = peer_uid(writer.get_extra_info('socket'))
+        try:
+            try:
+                line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            except ValueError:
+                # readline() reports a line past the stream limit as ValueError
+                line = None
+            if line is None or len(line) > MAX_REQUEST:
+                ok, output = False, 'Request too long\n'
+            else:
+                ok, output = self.service.handle(line.decode(errors='replace'), uid)
+            writer.write(('OK\n' if ok else 'ERR\n').encode() + output.encode())
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        with contextlib.suppress(OSError):
+            os.unlink(self.path)
+
+
+async def serve(path, group, mode):
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+
+    service = ControlService()
+    server = ControlServer(service, path, group, mode)
+    await server.start()
+    print(f"JDI control service listening on {path}")
+    try:
+        await stopped.wait()
+    finally:
+        server.close()
+        s = service.stats()
+        print(f"\nServed {s['requests']} requests ({s['errors']} errors), "
+              f"{s['mean_ms']} ms mean")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JDI control service (Unix socket)')
+    parser.add_argument('--socket', default=CONTROL_SOCKET, help='Socket path')
+    parser.add_argument('--group', default=SOCKET_GROUP,
+                        help="Group allowed to connect ('' keeps root's group)")
+    parser.add_argument('--mode', type=lambda v: int(v, 8), default=SOCKET_MODE,
+                        help='Socket permissions (octal)')
+    parser.add_argument('--once', metavar='REQUEST',
+                        help='Run one request in-process and exit (no socket)')
+    args = parser.parse_args()
+
+    if args.once is not None:
+        ok, output = ControlService().handle(args.once)
+        sys.stdout.write(output)
+        return 0 if ok else 1
+    try:
+        asyncio.run(serve(args.socket, args.group, args.mode))
+    except OSError as e:
+        print(f"Error: cannot listen on {args.socket}: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
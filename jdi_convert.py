@@ -0,0 +1,349 @@
+#!/usr/bin/python3
+"""
+Multi-core batch asset converter for the JDI panel
+Author: N@Xs - Enhanced Edition 2025
+
+Pre-renders images and animation frames into what the panel receives,
+with the same rules as sharp_memory_gray8_to_mono_tagged() and
+sharp_memory_to_color_tagged(), so apps can load the result instead of
+re-running gray conversion, thresholding and dithering on every reload.
+
+Features:
+- Image directories (PPM, raw gray8/XRGB8888, other formats with Pillow)
+  and raw video frame streams (ffmpeg -f rawvideo -pix_fmt bgr0)
+- Output as the SPI message of tagged lines (.bin, same bytes as
+  jdi_encoder.py) or packed 1bpp/3bpp bitplanes (.bits)
+- Optional pre-dithering (dither parameter modes) or the perceptual
+  8-color LUT (jdi_palette.py)
+- Process pool; frames and results travel through
+  multiprocessing.shared_memory slots, only slot numbers are pickled
+- Content-addressed cache keyed by the source bytes plus mono_cutoff,
+  mono_invert, color_cutoff and dither: cache hits are never decoded
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from collections import deque
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+import jdi_encoder
+import jdi_dither
+from jdi_encoder import WIDTH, HEIGHT, color_line_len
+from jdi_palette import CACHE_DIR
+
+CONVERT_CACHE_DIR = os.path.join(CACHE_DIR, 'convert')
+CACHE_VERSION = 1
+IMAGE_EXTENSIONS = ('.ppm', '.raw', '.png', '.jpg', '.jpeg', '.bmp', '.gif')
+FORMATS = {'tagged': '.bin', 'bitplane': '.bits'}
+
+
+def default_params():
+    return {
+        'color': jdi_encoder.DEFAULT_COLOR,
+        'mono_cutoff': jdi_encoder.DEFAULT_MONO_CUTOFF,
+        'mono_invert': jdi_encoder.DEFAULT_MONO_INVERT,
+        'color_cutoff': jdi_encoder.DEFAULT_COLOR_CUTOFF,
+        'dither': 0,
+        'quantize': 'threshold',
+        'format': 'tagged',
+    }
+
+
+def sysfs_params():
+    """Conversion parameters matching the running driver"""
+    params = default_params()
+    params.update(jdi_encoder.read_params())
+    try:
+        from jdi_sysfs import default_sysfs
+        params['dither'] = int(default_sysfs().param('dither').read())
+    except (OSError, ValueError):
+        pass
+    return params
+
+
+def cache_key(content_hash, params):
+    """Cache key of a source (sha256 of its bytes) under conversion parameters"""
+    data = json.dumps({'version': CACHE_VERSION, 'source': content_hash, **params},
+                      sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def max_output_len(params, width=WIDTH, height=HEIGHT):
+    return 2 + height * color_line_len(width)
+
+
+def convert_frame(frame, params, lut=None):
+    """One frame to panel bytes (SPI message or packed bitplanes)"""
+    color = params['color']
+    if color and lut is not None:
+        frame = lut.apply(frame)
+    elif params['dither']:
+        frame = jdi_dither.dither_frame(frame, jdi_dither.mode_for_param(params['dither']),
+                                        color, params['mono_cutoff'], params['color_cutoff'])
+    lines = jdi_encoder.encode_lines(frame, color, mono_cutoff=params['mono_cutoff'],
+                                     mono_invert=params['mono_invert'],
+                                     color_cutoff=params['color_cutoff'])
+    if params['format'] == 'bitplane':
+        return lines[:, 1:-1].tobytes()
+    return jdi_encoder.spi_message(lines, color)
+
+
+def fit_frame(frame, width=WIDTH, height=HEIGHT):
+    """Crop/pad (white) a gray8, RGB or XRGB frame to the panel as XRGB8888"""
+    frame = np.asarray(frame)
+    if frame.ndim == 2:
+        frame = np.repeat(frame[:, :, np.newaxis], 4, axis=2)
+    elif frame.shape[2] == 3:
+        frame = jdi_dither.rgb_to_xrgb(frame)
+    if frame.shape[:2] == (height, width):
+        return frame
+    out = np.full((height, width, 4), 255, dtype=np.uint8)
+    h, w = min(height, frame.shape[0]), min(width, frame.shape[1])
+    out[:h, :w] = frame[:h, :w]
+    return out
+
+
+def load_image(path):
+    if path.endswith(('.ppm', '.raw')):
+        return jdi_dither.load_frame(path)
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ValueError(f"{path}: only PPM/raw frames without Pillow")
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGB'))
+
+
+# Worker side: the shared memory blocks are attached once per process
+
+_worker = {}
+
+
+def _init_worker(in_name, out_name, frame_shape, out_size, params):
+    # Forked workers share the parent's resource tracker, the parent
+    # unlinks the blocks once the pool is done
+    frames = shared_memory.SharedMemory(name=in_name)
+    results = shared_memory.SharedMemory(name=out_name)
+    lut = None
+    if params['color'] and params['quantize'] == 'lut':
+        from jdi_palette import ColorLUT
+        lut = ColorLUT(cutoff=params['color_cutoff'])
+    _worker.update(frames=frames, results=results, frame_shape=frame_shape,
+                   out_size=out_size, params=params, lut=lut)
+
+
+def _convert_slot(slot):
+    w = _worker
+    count = w['frames'].size // int(np.prod(w['frame_shape']))
+    frames = np.ndarray((count,) + w['frame_shape'], dtype=np.uint8, buffer=w['frames'].buf)
+    data = convert_frame(frames[slot], w['params'], w['lut'])
+    start = slot * w['out_size']
+    w['results'].buf[start:start + len(data)] = data
+    return len(data)
+
+
+class BatchConverter:
+    """Converts sources on a process pool through shared-memory slots
+
+    A source is (name, content bytes, decode) where decode() returns the
+    frame; it is only called on a cache miss.
+    """
+
+    def __init__(self, params=None, workers=None, cache_dir=CONVERT_CACHE_DIR,
+                 width=WIDTH, height=HEIGHT, slots=None):
+        self.params = dict(default_params(), **(params or {}))
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.frame_shape = (height, width, 4)
+        self.out_size = max_output_len(self.params, width, height)
+        self.slots = slots or 2 * self.workers
+
+        # Counters
+        self.hits = 0
+        self.converted = 0
+        self.decode_s = 0.0
+
+    # Cache
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def cached(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, key, data):
+        if not self.cache_dir:
+            return
+        path = self._cache_path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Warning: could not cache {key}: {e}")
+
+    # Conversion
+
+    def convert(self, sources):
+        """Yield (name, data, cached) in source order"""
+        frame_bytes = int(np.prod(self.frame_shape))
+        frames_shm = shared_memory.SharedMemory(create=True, size=self.slots * frame_bytes)
+        results_shm = shared_memory.SharedMemory(create=True, size=self.slots * self.out_size)
+        frames = np.ndarray((self.slots,) + self.frame_shape, dtype=np.uint8,
+                            buffer=frames_shm.buf)
+        pool = Pool(self.workers, _init_worker,
+                    (frames_shm.name, results_shm.name, self.frame_shape,
+                     self.out_size, self.params))
+        try:
+            free = list(range(self.slots))
+            queue = deque()     # (name, key, data or None, slot, async result)
+
+            def finish():
+                name, key, data, slot, result = queue.popleft()
+                if result is None:
+                    return name, data, True
+                length = result.get()
+                start = slot * self.out_size
+                data = bytes(results_shm.buf[start:start + length])
+                free.append(slot)
+                self.store(key, data)
+                self.converted += 1
+                return name, data, False
+
+            for name, content, decode in sources:
+                key = cache_key(hashlib.sha256(content).hexdigest(), self.params)
+                data = self.cached(key)
+                if data is not None:
+                    self.hits += 1
+                    queue.append((name, key, data, None, None))
+                else:
+                    while not free:
+                        yield finish()
+                    slot = free.pop()
+                    started = time.perf_counter()
+                    frames[slot] = fit_frame(decode(), self.frame_shape[1], self.frame_shape[0])
+                    self.decode_s += time.perf_counter() - started
+                    queue.append((name, key, None, slot,
+                                  pool.apply_async(_convert_slot, (slot,))))
+                while queue and (queue[0][4] is None or queue[0][4].ready()):
+                    yield finish()
+            while queue:
+                yield finish()
+        finally:
+            pool.terminate()
+            pool.join()
+            del frames
+            frames_shm.close()
+            frames_shm.unlink()
+            results_shm.close()
+            results_shm.unlink()
+
+
+def directory_sources(paths):
+    """Sources for image files and directories (recursively, sorted)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, n) for n in names
+                          if n.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            files.append(path)
+    for path in sorted(files):
+        with open(path, 'rb') as f:
+            content = f.read()
+        yield path, content, lambda path=path: load_image(path)
+
+
+def stream_sources(f, name, width=WIDTH, height=HEIGHT):
+    """Sources for a raw XRGB8888 (bgr0) frame stream"""
+    size = width * height * 4
+    n = 0
+    while True:
+        content = f.read(size)
+        if len(content) < size:
+            return
+        yield (f"{name}-{n:06d}", content,
+               lambda content=content: np.frombuffer(content, np.uint8).reshape(height, width, 4))
+        n += 1
+
+
+def output_path(output, name, root, fmt):
+    """Mirror the source layout below `output`"""
+    rel = os.path.relpath(name, root) if root else os.path.basename(name)
+    return os.path.join(output, os.path.splitext(rel)[0] + FORMATS[fmt])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch-convert assets into JDI panel data')
+    parser.add_argument('inputs', nargs='+', help='Image files/directories, or "-" for a '
+                        'raw 400x240 bgr0 stream on stdin')
+    parser.add_argument('--output', required=True, help='Output directory')
+    parser.add_argument('--format', choices=list(FORMATS), default='tagged')
+    parser.add_argument('--mono', action='store_true')
+    parser.add_argument('--color', action='store_true')
+    parser.add_argument('--from-sysfs', action='store_true', help='Parameters from the driver')
+    parser.add_argument('--mono-cutoff', type=int)
+    parser.add_argument('--mono-invert', action='store_true')
+    parser.add_argument('--color-cutoff', type=int)
+    parser.add_argument('--dither', type=int, choices=range(5), help='dither parameter mode')
+    parser.add_argument('--lut', action='store_true', help='Perceptual 8-color LUT (color only)')
+    parser.add_argument('--workers', type=int, help='Processes (default: all cores)')
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args()
+
+    params = sysfs_params() if args.from_sysfs else default_params()
+    if args.mono or args.color:
+        params['color'] = args.color
+    for name in ('mono_cutoff', 'color_cutoff', 'dither'):
+        if getattr(args, name) is not None:
+            params[name] = getattr(args, name)
+    if args.mono_invert:
+        params['mono_invert'] = True
+    params['quantize'] = 'lut' if args.lut else 'threshold'
+    params['format'] = args.format
+
+    converter = BatchConverter(params, args.workers,
+                               None if args.no_cache else CONVERT_CACHE_DIR)
+    if args.inputs == ['-']:
+        sources = stream_sources(sys.stdin.buffer, 'stream')
+        root = None
+    else:
+        sources = directory_sources(args.inputs)
+        root = args.inputs[0] if len(args.inputs) == 1 and os.path.isdir(args.inputs[0]) else None
+
+    started = time.perf_counter()
+    total = 0
+    try:
+        for name, data, _ in converter.convert(sources):
+            path = output_path(args.output, name, root, args.format)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            total += 1
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    elapsed = time.perf_counter() - started
+
+    print(f"{total} assets in {elapsed:.2f} s with {converter.workers} workers: "
+          f"{converter.converted} converted, {converter.hits} from cache")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
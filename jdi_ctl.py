@@ -0,0 +1,63 @@
+#!/usr/bin/python3 -S
+"""
+Client of the JDI control service (jdi_control.py)
+Author: N@Xs - Enhanced Edition 2025
+
+Sends its arguments as one request and prints the reply. Runs with
+python3 -S (no site import) so a command takes milliseconds; no sudo
+needed, the socket is group-accessible.
+
+Exit status: 0 done, 1 command failed, 2 service not reachable (callers
+can fall back to the standalone tools).
+
+Shell equivalent: echo 'brightness 3' | socat - UNIX-CONNECT:/run/jdi/control.sock
+"""
+
+import os
+import sys
+# The C module: socket.py imports enum and selectors, most of the start-up time
+import _socket
+
+CONTROL_SOCKET = os.environ.get('JDI_CONTROL_SOCKET', '/run/jdi/control.sock')
+SAFE = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789@%+=:,./-_')
+
+
+def quote(word):
+    """Shell quoting for the request line (shlex would import re)"""
+    if word and all(c in SAFE for c in word):
+        return word
+    return "'" + word.replace("'", "'\"'\"'") + "'"
+
+
+def request(words, path=CONTROL_SOCKET, timeout=None):
+    """Send one request, returns (ok, output)"""
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+        sock.sendall((' '.join(quote(w) for w in words) + '\n').encode())
+        chunks = []
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        sock.close()
+    status, _, output = b''.join(chunks).decode(errors='replace').partition('\n')
+    return status == 'OK', output
+
+
+def main():
+    words = sys.argv[1:] or ['help']
+    try:
+        ok, output = request(words)
+    except OSError as e:
+        sys.stderr.write(f"JDI control service not reachable at {CONTROL_SOCKET}: {e.strerror}\n")
+        return 2
+    sys.stdout.write(output)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,511 @@
+#!/usr/bin/python3
+"""
+JDI Backlight & Power Daemon - single asyncio process
+Author: N@Xs - Enhanced Edition 2025
+
+Replaces the separate enhanced_back.py, gpio17_button_handler.py and
+powersave.py service processes with one interpreter.
+
+Features:
+- Owns the backlight state (one BRIGHTNESS_LEVELS table, one writer)
+- Level changes ramped on a loop timer (jdi_ramp), bursts of presses
+  coalesced into one transition
+- GPIO button sources: kernel input device (evdev, hotplug aware) and
+  gpiozero callbacks handed over to the event loop
+- Idle engine (jdi_idle): any input device counts as activity, dim ->
+  off -> panel standby on a single loop timer, adaptive timeouts
+- Applies the driver's auto power save settings at startup
+- Telemetry: time at level, presses, latency, auto-dim and estimated
+  energy, written periodically to a node-exporter textfile
+- Optional per-stage press latency tracing (jdi_latency), dumped on
+  SIGUSR1
+- Root-only socket for the control service's brightness commands, so
+  the level is never changed behind the daemon's back
+- Idle cost is zero: the loop sleeps in epoll until an event or the
+  auto-dim deadline
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+
+from jdi_input import (DeviceLookup, EventReader, Inotify, EV_KEY, KEY_PRESS,
+                       INPUT_DIR, IN_CREATE, IN_DELETE, IN_ATTRIB)
+from jdi_sysfs import default_sysfs
+from jdi_idle import IdleEngine, InputActivity, OFF_DELAY
+from jdi_ramp import BacklightRamp, EASINGS, RAMP_DURATION, RAMP_EASING
+from jdi_latency import LatencyTracer, DUMP_SIGNAL
+from jdi_telemetry import (Telemetry, KmsgWatcher, parse_level_mw,
+                           TEXTFILE_PATH, TELEMETRY_INTERVAL)
+from jdi_control import ControlServer, DAEMON_SOCKET
+
+# Configuration
+BRIGHTNESS_LEVELS = [0, 1, 2, 3]  # OFF, Low, Medium, High
+DEFAULT_LEVEL_INDEX = 2
+DIM_LEVEL_INDEX = 1
+AUTO_DIM_TIMEOUT = 300  # 5 minutes
+BUTTON_DEBOUNCE = 0.3
+BRIGHTNESS_KEY_CODE = 240  # Custom key code - NOT power button
+BUTTON_DEVICE_NAMES = ("Brightness Button", "gpio-keys")
+BUTTON_GPIO = 21
+POWER_BUTTON_GPIO = 27
+
+
+class Backlight:
+    """Backlight state; the only place that writes the PWM level"""
+
+    def __init__(self, attr=None, levels=BRIGHTNESS_LEVELS,
+                 index=DEFAULT_LEVEL_INDEX, telemetry=None, ramp=None, tracer=None):
+        self.attr = attr if attr is not None else default_sysfs().backlight('brightness')
+        self.levels = list(levels)
+        self.index = index
+        self.telemetry = telemetry
+        self.tracer = tracer
+        # With a ramp, level changes are animated and the ramp does the writes
+        self.ramp = ramp
+        if ramp is not None:
+            ramp.attr = self.attr
+            ramp.on_write = self._on_ramp_write
+
+    def _on_ramp_write(self, value):
+        if self.tracer is not None:
+            self.tracer.complete()
+        if self.telemetry is not None:
+            self.telemetry.set_level(value)
+
+    @property
+    def value(self):
+        return self.levels[self.index]
+
+    def read_index(self):
+        """Sync the level index with the current sysfs value"""
+        try:
+            brightness = int(self.attr.read())
+        except (OSError, ValueError):
+            return self.index
+        self.index = self.index_for(brightness)
+        if self.telemetry is not None:
+            self.telemetry.set_level(brightness)
+        if self.ramp is not None:
+            self.ramp.sync()
+        return self.index
+
+    def index_for(self, brightness):
+        """Level index for a raw PWM value"""
+        return next((i for i, level in enumerate(self.levels) if brightness <= level),
+                    len(self.levels) - 1)
+
+    def set_index(self, index):
+        """Set brightness level index"""
+        if index < 0 or index >= len(self.levels):
+            return False
+        self.index = index
+        status = "ON" if self.value > 0 else "OFF"
+        if not self.attr.exists():
+            print(f"Simulation: Brightness → {self.value}/{max(self.levels)} ({status})")
+            if self.tracer is not None:
+                self.tracer.complete()
+            return True
+        if self.ramp is not None:
+            if self.ramp.set_target(self.value):
+                print(f"Brightness → {self.value}/{max(self.levels)} ({status})")
+            return True
+        try:
+            written = self.attr.write(self.value)
+        except OSError as e:
+            print(f"Error setting brightness: {e}")
+            return False
+        if self.tracer is not None:
+            self.tracer.complete()
+        if self.telemetry is not None:
+            self.telemetry.set_level(self.value)
+        if not written:
+            return True
+        print(f"Brightness → {self.value}/{max(self.levels)} ({status})")
+        return True
+
+    def cycle(self):
+        """Cycle through brightness levels: 0 -> 1 -> 2 -> 3 -> 0"""
+        return self.set_index((self.index + 1) % len(self.levels))
+
+    def toggle(self):
+        """Toggle between off and the default level"""
+        return self.set_index(DEFAULT_LEVEL_INDEX if self.index == 0 else 0)
+
+
+class DaemonCommands:
+    """Requests the control service forwards to the backlight owner"""
+
+    def __init__(self, daemon):
+        self.daemon = daemon
+
+    def handle(self, line, uid=None):
+        """Run one request line; returns (ok, output)"""
+        words = line.split()
+        if words == ['ping']:
+            return True, 'pong\n'
+        if len(words) == 2 and words[0] == 'brightness' and words[1].isdigit():
+            self.daemon.set_brightness(int(words[1]))
+            return True, f"{self.daemon.backlight.value}\n"
+        return False, f"Unknown daemon request: {line.strip()}\n"
+
+
+class JDIDaemon:
+    """Event loop owner: button sources, auto-dim timer, power settings"""
+
+    def __init__(self, backlight, auto_dim_timeout=AUTO_DIM_TIMEOUT,
+                 debounce=BUTTON_DEBOUNCE, key_code=BRIGHTNESS_KEY_CODE,
+                 input_dir=INPUT_DIR, device_lookup=None, telemetry=None,
+                 textfile=TEXTFILE_PATH, telemetry_interval=TELEMETRY_INTERVAL,
+                 idle=None, all_inputs=True, tracer=None, control_socket=DAEMON_SOCKET):
+        self.backlight = backlight
+        # Without an explicit engine: plain fixed-timeout dimming
+        self.idle = idle or IdleEngine(backlight, DIM_LEVEL_INDEX, auto_dim_timeout,
+                                       off_delay=0, adaptive=False, sync_driver=False,
+                                       telemetry=telemetry)
+        self.all_inputs = all_inputs
+        self.debounce = debounce
+        self.key_code = key_code
+        self.input_dir = input_dir
+        self.device_lookup = device_lookup or DeviceLookup(BUTTON_DEVICE_NAMES)
+        self.telemetry = telemetry
+        self.textfile = textfile
+        self.telemetry_interval = telemetry_interval
+        self.tracer = tracer
+        self.control_socket = control_socket
+
+        self.loop = None
+        self.stopped = None
+        self.last_press = 0.0
+        self.presses = 0
+        self._activity = None
+        self._inotify = None
+        self._reader = None
+        self._buttons = []
+        self._telemetry_handle = None
+        self._kmsg = None
+        self._control = None
+
+    # Button handlers (always run on the loop thread)
+
+    def on_cycle_press(self, pressed_at=None, read_ns=None):
+        self._trace_begin('cycle', pressed_at, read_ns)
+        now = time.monotonic()
+        if now - self.last_press < self.debounce:
+            if self.tracer is not None:
+                self.tracer.discard()
+            return
+        self.last_press = now
+        self.presses += 1
+        if self.tracer is not None:
+            self.tracer.mark('handler')
+        self.backlight.cycle()
+        self._record_press('cycle', pressed_at)
+        self.idle.activity(restore=False)
+
+    def on_power_press(self, pressed_at=None, read_ns=None):
+        self._trace_begin('power', pressed_at, read_ns)
+        self.presses += 1
+        if self.tracer is not None:
+            self.tracer.mark('handler')
+        self.backlight.toggle()
+        self._record_press('power', pressed_at)
+        self.idle.activity(restore=False)
+        print("Power button: toggled display")
+
+    def set_brightness(self, value):
+        """Level set through the control service, handled like a press"""
+        self.backlight.set_index(self.backlight.index_for(value))
+        self.idle.activity(restore=False)
+
+    async def start_control(self):
+        """Root-only socket for forwarded brightness commands"""
+        server = ControlServer(DaemonCommands(self), self.control_socket, group='', mode=0o600)
+        try:
+            await server.start()
+        except OSError as e:
+            print(f"Warning: no control socket at {self.control_socket}: {e}")
+            return
+        self._control = server
+
+    def _trace_begin(self, button, pressed_at, read_ns):
+        if self.tracer is not None:
+            event_ns = int(pressed_at * 1e9) if pressed_at is not None else None
+            self.tracer.begin(button, event_ns, read_ns)
+
+    def _record_press(self, button, pressed_at):
+        # pressed_at is CLOCK_MONOTONIC time, see _on_input()
+        if self.telemetry is not None:
+            latency = time.monotonic() - pressed_at if pressed_at is not None else None
+            self.telemetry.press(button, latency)
+
+    # Telemetry
+
+    def write_telemetry(self):
+        try:
+            self.telemetry.write_textfile(self.textfile)
+        except OSError as e:
+            print(f"Warning: could not write telemetry: {e}")
+
+    def _telemetry_tick(self):
+        self.write_telemetry()
+        if self.tracer is not None:
+            self.write_latency()
+        self._telemetry_handle = self.loop.call_later(self.telemetry_interval,
+                                                      self._telemetry_tick)
+
+    def write_latency(self):
+        try:
+            self.tracer.write_textfile()
+        except OSError as e:
+            print(f"Warning: could not write latency traces: {e}")
+
+    def start_telemetry(self):
+        """Periodic textfile writes and driver button messages for the tracer"""
+        if self.telemetry_interval > 0:
+            self._telemetry_handle = self.loop.call_later(self.telemetry_interval,
+                                                          self._telemetry_tick)
+        if self.tracer is None:
+            return
+        try:
+            self._kmsg = KmsgWatcher(self.tracer)
+            self.loop.add_reader(self._kmsg.fileno(), self._kmsg.read)
+        except OSError:
+            self._kmsg = None
+
+    # Kernel input device (evdev)
+
+    def _attach_device(self):
+        path = self.device_lookup.find()
+        if not path:
+            return
+        try:
+            self._reader = EventReader(path)
+        except OSError as e:
+            if isinstance(e, PermissionError):
+                print(f"Permission denied accessing {path}")
+            return
+        # Monotonic event timestamps compare with time.monotonic() directly
+        self._reader.set_monotonic()
+        self.loop.add_reader(self._reader.fileno(), self._on_input)
+        print(f"Button input device attached: {path}")
+        if self._activity is not None:
+            # Button presses set the level themselves, see on_cycle_press()
+            self._activity.exclude = {path}
+            self._activity.rescan()
+
+    def _detach_device(self):
+        self.loop.remove_reader(self._reader.fileno())
+        self._reader.close()
+        print(f"Button input device removed: {self._reader.path}")
+        self._reader = None
+
+    def _on_input(self):
+        try:
+            events = self._reader.read()
+        except OSError:
+            self._detach_device()
+            return
+        read_ns = time.monotonic_ns()
+        # Kernels without EVIOCSCLOCKID stamp events with CLOCK_REALTIME
+        offset = 0 if self._reader.monotonic else time.time_ns() - read_ns
+        for sec, usec, ev_type, ev_code, ev_value in events:
+            if ev_type == EV_KEY and ev_value == KEY_PRESS and ev_code == self.key_code:
+                self.on_cycle_press((sec * 10**9 + usec * 1000 - offset) / 1e9, read_ns)
+
+    def _on_hotplug(self):
+        if not any(name.startswith('event') for _, _, name in self._inotify.read_events()):
+            return
+        self.device_lookup.invalidate()
+        if self._reader is not None and not os.path.exists(self._reader.path):
+            self._detach_device()
+        if self._reader is None:
+            self._attach_device()
+        if self._activity is not None:
+            self._activity.rescan()
+
+    def watch_input_device(self):
+        """Follow the button input device (and all others for activity), including hotplug"""
+        if self.all_inputs:
+            self._activity = InputActivity(self.loop, self.idle.activity, self.input_dir)
+            self._activity.rescan()
+        try:
+            self._inotify = Inotify()
+            self._inotify.add_watch(self.input_dir, IN_CREATE | IN_DELETE | IN_ATTRIB)
+            self.loop.add_reader(self._inotify.fileno(), self._on_hotplug)
+        except OSError as e:
+            print(f"Warning: input hotplug not available: {e}")
+            self._inotify = None
+        self._attach_device()
+
+    # gpiozero buttons
+
+    def attach_gpiozero(self, button_gpio=BUTTON_GPIO, power_gpio=POWER_BUTTON_GPIO):
+        """gpiozero calls back from its own thread; hop onto the loop"""
+        try:
+            from gpiozero import Button
+        except ImportError:
+            print("gpiozero not available, GPIO buttons disabled")
+            return
+
+        def threadsafe(handler):
+            return lambda: self.loop.call_soon_threadsafe(handler, time.monotonic())
+
+        try:
+            if button_gpio is not None:
+                button = Button(button_gpio, pull_up=True)
+                button.when_pressed = threadsafe(self.on_cycle_press)
+                self._buttons.append(button)
+                print(f"Main button GPIO {button_gpio} configured")
+            if power_gpio is not None:
+                button = Button(power_gpio, pull_up=True)
+                button.when_pressed = threadsafe(self.on_power_press)
+                self._buttons.append(button)
+                print(f"Power button GPIO {power_gpio} configured")
+        except Exception as e:
+            print(f"Error setting up GPIO: {e}")
+
+    # Lifecycle
+
+    def stop(self):
+        if self.stopped is not None and not self.stopped.is_set():
+            print("\nShutting down JDI daemon...")
+            self.stopped.set()
+
+    def close(self):
+        self.idle.stop()
+        if self._control is not None:
+            self._control.close()
+            self._control = None
+        if self.backlight.ramp is not None:
+            self.backlight.ramp.stop()
+            s = self.backlight.ramp.stats()
+            print(f"Backlight ramp: {s['transitions']} transitions, {s['writes']} writes, "
+                  f"{s['merged_requests']} requests merged")
+        if self._activity is not None:
+            self._activity.close()
+            self._activity = None
+        if self._telemetry_handle is not None:
+            self._telemetry_handle.cancel()
+            self._telemetry_handle = None
+        if self._kmsg is not None:
+            self.loop.remove_reader(self._kmsg.fileno())
+            self._kmsg.close()
+            self._kmsg = None
+        if self.telemetry is not None:
+            self.write_telemetry()
+        if self.tracer is not None:
+            self.write_latency()
+        if self._reader is not None:
+            self.loop.remove_reader(self._reader.fileno())
+            self._reader.close()
+            self._reader = None
+        if self._inotify is not None:
+            self.loop.remove_reader(self._inotify.fileno())
+            self._inotify.close()
+            self._inotify = None
+        for button in self._buttons:
+            button.close()
+        self._buttons = []
+
+    async def run(self, use_evdev=True, button_gpio=BUTTON_GPIO, power_gpio=POWER_BUTTON_GPIO):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(sig, self.stop)
+        if self.tracer is not None:
+            self.tracer.install_signal(self.loop)
+            print(f"Latency tracing on, send {DUMP_SIGNAL.name} to dump")
+
+        self.backlight.read_index()
+        if self.telemetry is not None:
+            self.start_telemetry()
+        if use_evdev:
+            self.watch_input_device()
+        if button_gpio is not None or power_gpio is not None:
+            self.attach_gpiozero(button_gpio, power_gpio)
+        if self.backlight.ramp is not None:
+            self.backlight.ramp.start(self.loop)
+        self.idle.start(self.loop)
+        if self.control_socket:
+            await self.start_control()
+
+        try:
+            await self.stopped.wait()
+        finally:
+            self.close()
+
+
+def apply_powersave(timeout_s):
+    """Enable the driver's auto power save (replaces the powersave service loop)"""
+    from powersave import JDIPowerManager
+    pm = JDIPowerManager()
+    if pm.module_path.exists():
+        pm.enable_powersave(int(timeout_s * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JDI backlight and power daemon')
+    parser.add_argument('--auto-dim', type=float, default=AUTO_DIM_TIMEOUT,
+                        help='Seconds of inactivity before dimming (0 disables)')
+    parser.add_argument('--off-delay', type=float, default=OFF_DELAY,
+                        help='Seconds after dimming before the backlight goes off (0 disables)')
+    parser.add_argument('--no-adaptive', action='store_true',
+                        help='Keep the idle timeouts fixed')
+    parser.add_argument('--no-driver-sync', action='store_true',
+                        help='Do not set the driver auto_power_save/idle_timeout')
+    parser.add_argument('--idle-state', help='File to keep learned idle timeouts in')
+    parser.add_argument('--button-only', action='store_true',
+                        help='Only the brightness buttons count as activity')
+    parser.add_argument('--powersave-timeout', type=float,
+                        help='Enable driver auto power save with this timeout in seconds')
+    parser.add_argument('--button-gpio', type=int, default=BUTTON_GPIO,
+                        help='gpiozero brightness button pin (-1 disables)')
+    parser.add_argument('--power-gpio', type=int, default=POWER_BUTTON_GPIO,
+                        help='gpiozero power button pin (-1 disables)')
+    parser.add_argument('--no-evdev', action='store_true',
+                        help='Do not listen on the kernel input device')
+    parser.add_argument('--textfile', default=TEXTFILE_PATH,
+                        help='node-exporter textfile for telemetry')
+    parser.add_argument('--telemetry-interval', type=float, default=TELEMETRY_INTERVAL,
+                        help='Seconds between textfile writes (0: only at exit)')
+    parser.add_argument('--level-mw', type=parse_level_mw,
+                        help="Backlight draw per level for energy estimates, e.g. '0:0,1:20,2:45,3:90'")
+    parser.add_argument('--no-telemetry', action='store_true', help='Disable telemetry')
+    parser.add_argument('--trace-latency', action='store_true',
+                        help='Trace per-stage button latency (also JDI_TRACE_LATENCY=1)')
+    parser.add_argument('--ramp', type=float, default=RAMP_DURATION,
+                        help='Seconds per brightness transition (0 jumps)')
+    parser.add_argument('--ramp-easing', choices=list(EASINGS), default=RAMP_EASING)
+    parser.add_argument('--control-socket', default=DAEMON_SOCKET,
+                        help="Socket for the control service's brightness commands ('' disables)")
+    args = parser.parse_args()
+
+    print("JDI Backlight & Power Daemon - N@Xs Edition")
+    if args.powersave_timeout is not None:
+        apply_powersave(args.powersave_timeout)
+
+    telemetry = None if args.no_telemetry else Telemetry(args.level_mw)
+    ramp = BacklightRamp(duration=args.ramp, easing=args.ramp_easing) if args.ramp > 0 else None
+    tracer = LatencyTracer() if args.trace_latency else LatencyTracer.from_env()
+    backlight = Backlight(telemetry=telemetry, ramp=ramp, tracer=tracer)
+    idle = IdleEngine(backlight, DIM_LEVEL_INDEX, args.auto_dim, args.off_delay,
+                      adaptive=not args.no_adaptive, sync_driver=not args.no_driver_sync,
+                      state_path=args.idle_state, telemetry=telemetry)
+    daemon = JDIDaemon(backlight, idle=idle, telemetry=telemetry, textfile=args.textfile,
+                       telemetry_interval=args.telemetry_interval,
+                       all_inputs=not args.button_only, tracer=tracer,
+                       control_socket=args.control_socket)
+    asyncio.run(daemon.run(
+        use_evdev=not args.no_evdev,
+        button_gpio=args.button_gpio if args.button_gpio >= 0 else None,
+        power_gpio=args.power_gpio if args.power_gpio >= 0 else None,
+    ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""
+Line-level frame differ for the JDI LPM027M128C tagged-line format
+Author: N@Xs - Enhanced Edition 2025
+
+sharp_memory_fb_dirty() widens every damage rect to full-width rows and
+sends every row of the range. This encoder stage keeps the last frame it
+sent, compares the encoded rows of the next frame with vectorized
+comparisons and only emits the rows that really changed, grouped into
+contiguous runs (one write-line transfer per run).
+
+Features:
+- Row comparison on packed panel data (only visible changes count)
+- Contiguous runs with optional gap merging
+- SPI byte accounting against the full-range write
+"""
+
+import sys
+import argparse
+
+import numpy as np
+
+import jdi_encoder
+from jdi_encoder import WIDTH, HEIGHT
+
+
+def changed_runs(changed, max_gap=0):
+    """Group a boolean per-row mask into [start, stop) runs
+
+    Runs separated by at most `max_gap` unchanged rows are merged.
+    """
+    changed = np.asarray(changed, dtype=bool)
+    if not changed.any():
+        return []
+
+    edges = np.diff(np.concatenate(([0], changed.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+
+    runs = [[int(starts[0]), int(stops[0])]]
+    for start, stop in zip(starts[1:], stops[1:]):
+        if start - runs[-1][1] <= max_gap:
+            runs[-1][1] = int(stop)
+        else:
+            runs.append([int(start), int(stop)])
+    return [tuple(run) for run in runs]
+
+
+def message_len(rows, line_len):
+    """Bytes on the SPI bus for one write-line transfer of `rows` lines"""
+    return 1 + rows * line_len + 1 if rows else 0
+
+
+class LineDiffer:
+    """Keeps the last sent frame and emits only the changed tagged lines"""
+
+    def __init__(self, color=jdi_encoder.DEFAULT_COLOR, width=WIDTH, height=HEIGHT,
+                 max_gap=0, **params):
+        self.color = color
+        self.width = width
+        self.height = height
+        self.max_gap = max_gap
+        self.params = params
+        self.line_len = (jdi_encoder.color_line_len(width) if color
+                         else jdi_encoder.mono_line_len(width))
+        self.last = np.zeros((height, self.line_len), dtype=np.uint8)
+        self.valid = np.zeros(height, dtype=bool)
+
+        # Counters
+        self.updates = 0
+        self.rows_sent = 0
+        self.bytes_sent = 0
+        self.bytes_full = 0
+
+    def reset(self):
+        """Forget the last frame so the next update is sent in full"""
+        self.valid[:] = False
+
+    def diff(self, frame, y1=0, y2=None):
+        """Encode `frame` and return the list of changed runs
+
+        Each run is `(start_row, stop_row, lines)` where `lines` is the
+        (rows, line_len) array of tagged lines. Only rows in the damage
+        range [y1, y2) are considered, like sharp_memory_fb_dirty().
+        """
+        if y2 is None:
+            y2 = self.height
+
+        lines = jdi_encoder.encode_lines(np.asarray(frame)[y1:y2], self.color, y1,
+                                         **self.params)
+        # Rows never sent since the last reset always count as changed
+        changed = np.any(lines != self.last[y1:y2], axis=1)
+        changed |= ~self.valid[y1:y2]
+
+        runs = []
+        for start, stop in changed_runs(changed, self.max_gap):
+            runs.append((y1 + start, y1 + stop, lines[start:stop]))
+        self.last[y1:y2] = lines
+        self.valid[y1:y2] = True
+
+        self.updates += 1
+        self.bytes_full += message_len(y2 - y1, self.line_len)
+        for start, stop, _ in runs:
+            self.rows_sent += stop - start
+            self.bytes_sent += message_len(stop - start, self.line_len)
+        return runs
+
+    def messages(self, frame, y1=0, y2=None):
+        """Yield the SPI write-line transfers for the changed runs of `frame`"""
+        for _, _, lines in self.diff(frame, y1, y2):
+            yield jdi_encoder.spi_message(lines, self.color)
+
+    def stats(self):
+        """SPI bytes sent compared with full-range writes"""
+        saved = self.bytes_full - self.bytes_sent
+        return {
+            'updates': self.updates,
+            'rows_sent': self.rows_sent,
+            'bytes_sent': self.bytes_sent,
+            'bytes_full': self.bytes_full,
+            'bytes_saved': saved,
+            'saved_percent': (100.0 * saved / self.bytes_full) if self.bytes_full else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report SPI bytes saved by line-level diffing')
+    parser.add_argument('frames', nargs='+', help='Raw gray8 or XRGB8888 frames, in order')
+    parser.add_argument('--mono', dest='color', action='store_false', default=True)
+    parser.add_argument('--max-gap', type=int, default=0)
+    args = parser.parse_args()
+
+    differ = LineDiffer(color=args.color, max_gap=args.max_gap)
+    for path in args.frames:
+        try:
+            frame = jdi_encoder.load_raw_frame(path)
+        except (OSError, ValueError) as e:
+            print(f"Error loading frame: {e}")
+            return 1
+        runs = differ.diff(frame)
+        rows = sum(stop - start for start, stop, _ in runs)
+        print(f"{path}: {rows} rows changed in {len(runs)} runs")
+
+    stats = differ.stats()
+    print(f"SPI bytes: {stats['bytes_sent']} sent / {stats['bytes_full']} full-range "
+          f"({stats['bytes_saved']} saved, {stats['saved_percent']:.1f}%)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
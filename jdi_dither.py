@@ -0,0 +1,312 @@
+#!/usr/bin/python3
+"""
+Userspace dithering engine for the JDI LPM027M128C
+Author: N@Xs - Enhanced Edition 2025
+
+src/drm_iface.c defines ditherMatrix1..4 and apply_dithering(), but the
+conversion path never calls them: the `dither` parameter has no effect.
+This module dithers frames before they reach the framebuffer. Every
+output channel is 0 or 255, so the driver's cutoff conversion passes the
+pattern through unchanged.
+
+Features:
+- 'driver1'..'driver4': the driver's matrices with its exact semantics
+  (value + matrix * scale, clamped, compared with the cutoff)
+- 'bayer2'/'bayer4'/'bayer8': centered ordered dithering around the cutoff
+- 'blue-noise': 64x64 void-and-cluster style threshold map
+- 'floyd': Floyd-Steinberg error diffusion, rows processed as skewed
+  wavefronts so every step is one vectorized operation
+- Mono (gray8 like the driver, mono_cutoff) and per-channel 8-color
+  (color_cutoff) output
+- Threshold maps cached per mode and frame size; ordered modes take a
+  few ms per 400x240 frame, Floyd-Steinberg is meant for still images
+"""
+
+import os
+import sys
+import time
+import argparse
+from functools import lru_cache
+
+import numpy as np
+
+import jdi_encoder
+
+# Exact copies of src/drm_iface.c with the scale apply_dithering() uses
+DRIVER_MATRICES = {
+    1: ([[0, 2],
+         [3, 1]], 16),
+    2: ([[0, 8],
+         [12, 4]], 16),
+    3: ([[0, 8, 2, 10],
+         [12, 4, 14, 6],
+         [3, 11, 1, 9],
+         [15, 7, 13, 5]], 4),
+    4: ([[0, 32, 8, 40],
+         [48, 16, 56, 24],
+         [12, 44, 4, 36],
+         [60, 28, 52, 20]], 4),
+}
+
+BLUE_NOISE_SIZE = 64
+BLUE_NOISE_SIGMA = 1.5
+
+MODES = ('none', 'driver1', 'driver2', 'driver3', 'driver4',
+         'bayer2', 'bayer4', 'bayer8', 'blue-noise', 'floyd')
+
+
+def mode_for_param(level):
+    """Mode matching the driver's `dither` parameter (0-4)"""
+    level = int(level)
+    return f"driver{level}" if level in DRIVER_MATRICES else 'none'
+
+
+def bayer_matrix(n):
+    """n x n Bayer index matrix (n a power of two)"""
+    m = np.zeros((1, 1), dtype=np.int32)
+    while m.shape[0] < n:
+        m = np.block([[4 * m, 4 * m + 2], [4 * m + 3, 4 * m + 1]])
+    return m
+
+
+def blue_noise_ranks(size=BLUE_NOISE_SIZE, sigma=BLUE_NOISE_SIGMA):
+    """Rank map where each new point fills the largest void
+
+    Points are placed one at a time at the minimum of a toroidal Gaussian
+    energy field, so every threshold level is spread evenly (blue noise).
+    """
+    coords = np.arange(size)
+    d = np.minimum(coords, size - coords).astype(np.float64)
+    kernel = np.exp(-(d[:, None] ** 2 + d[None, :] ** 2) / (2 * sigma ** 2))
+
+    energy = np.zeros((size, size))
+    ranks = np.zeros((size, size), dtype=np.int32)
+    filled = np.zeros((size, size), dtype=bool)
+    y, x = 0, 0
+    for rank in range(size * size):
+        ranks[y, x] = rank
+        filled[y, x] = True
+        energy += np.roll(np.roll(kernel, y, axis=0), x, axis=1)
+        if rank + 1 < size * size:
+            masked = np.where(filled, np.inf, energy)
+            y, x = np.unravel_index(np.argmin(masked), masked.shape)
+    return ranks
+
+
+@lru_cache(maxsize=None)
+def _base_map(mode):
+    """Offset tile of an ordered mode; offsets are added to the value"""
+    if mode.startswith('driver'):
+        matrix, scale = DRIVER_MATRICES[int(mode[6:])]
+        return np.asarray(matrix, dtype=np.int16) * scale
+    if mode.startswith('bayer'):
+        ranks = bayer_matrix(int(mode[5:]))
+    elif mode == 'blue-noise':
+        ranks = blue_noise_ranks()
+    else:
+        raise ValueError(f"Unknown ordered dither mode: {mode}")
+    # Centered around zero: the cutoff stays the 50% point
+    n = ranks.size
+    return np.round((ranks + 0.5) / n * 256 - 128).astype(np.int16)
+
+
+@lru_cache(maxsize=32)
+def threshold_map(mode, height, width):
+    """Offsets for a whole (height, width) frame, cached per mode and size"""
+    base = _base_map(mode)
+    reps = (-(-height // base.shape[0]), -(-width // base.shape[1]))
+    tiled = np.tile(base, reps)[:height, :width]
+    tiled.setflags(write=False)
+    return tiled
+
+
+def ordered(values, mode, cutoff):
+    """Ordered dithering of uint8 values (H, W) or (H, W, C); returns 0/255"""
+    offsets = threshold_map(mode, values.shape[0], values.shape[1])
+    if values.ndim == 3:
+        offsets = offsets[:, :, np.newaxis]
+    # Clamp like apply_dithering() does before the cutoff comparison
+    biased = np.clip(values.astype(np.int16) + offsets, 0, 255)
+    return np.where(biased >= cutoff, 255, 0).astype(np.uint8)
+
+
+@lru_cache(maxsize=8)
+def _wavefronts(height, width):
+    """Pixel index arrays per wavefront: x + 2y is constant on a front
+
+    With Floyd-Steinberg weights every pixel only depends on pixels of
+    earlier fronts, so a whole front can be quantized at once.
+    """
+    ys, xs = np.mgrid[0:height, 0:width]
+    front = (xs + 2 * ys).ravel()
+    order = np.argsort(front, kind='stable')
+    bounds = np.cumsum(np.bincount(front))[:-1]
+    return [(ys.ravel()[idx], xs.ravel()[idx]) for idx in np.split(order, bounds)]
+
+
+def floyd_steinberg(values, cutoff):
+    """Floyd-Steinberg error diffusion of (H, W) or (H, W, C) values; returns 0/255"""
+    squeeze = values.ndim == 2
+    if squeeze:
+        values = values[:, :, np.newaxis]
+    height, width = values.shape[:2]
+
+    # One pixel of padding left/right and one row below absorbs edge errors
+    work = np.zeros((height + 1, width + 2, values.shape[2]), dtype=np.float32)
+    work[:height, 1:width + 1] = values
+    out = np.zeros(values.shape, dtype=np.uint8)
+
+    for ys, xs in _wavefronts(height, width):
+        px = xs + 1
+        old = work[ys, px]
+        new = np.where(old >= cutoff, 255.0, 0.0)
+        out[ys, xs] = new
+        err = old - new
+        # Separate statements: targets within one statement never repeat
+        work[ys, px + 1] += err * (7 / 16)
+        work[ys + 1, px - 1] += err * (3 / 16)
+        work[ys + 1, px] += err * (5 / 16)
+        work[ys + 1, px + 1] += err * (1 / 16)
+    return out[:, :, 0] if squeeze else out
+
+
+def dither_values(values, mode, cutoff):
+    """Dispatch on mode for raw uint8 values"""
+    if mode == 'none':
+        return np.where(values >= cutoff, 255, 0).astype(np.uint8)
+    if mode == 'floyd':
+        return floyd_steinberg(values, cutoff)
+    return ordered(values, mode, cutoff)
+
+
+def dither_frame(frame, mode, color=jdi_encoder.DEFAULT_COLOR,
+                 mono_cutoff=jdi_encoder.DEFAULT_MONO_CUTOFF,
+                 color_cutoff=jdi_encoder.DEFAULT_COLOR_CUTOFF):
+    """Dither a gray8, RGB or XRGB8888 frame into a pre-dithered XRGB8888 frame"""
+    if color:
+        bgr = jdi_encoder.to_bgr888(frame)
+        out = dither_values(bgr, mode, color_cutoff)
+        b, g, r = out[:, :, 0], out[:, :, 1], out[:, :, 2]
+    else:
+        frame = np.asarray(frame)
+        if frame.ndim == 3 and frame.shape[2] == 3:
+            frame = rgb_to_xrgb(frame)
+        gray = dither_values(jdi_encoder.to_gray8(frame), mode, mono_cutoff)
+        b = g = r = gray
+
+    xrgb = np.zeros(b.shape + (4,), dtype=np.uint8)
+    xrgb[:, :, 0] = b
+    xrgb[:, :, 1] = g
+    xrgb[:, :, 2] = r
+    return xrgb
+
+
+def rgb_to_xrgb(rgb):
+    """(H, W, 3) RGB to XRGB8888 memory layout (B, G, R, X)"""
+    xrgb = np.zeros(rgb.shape[:2] + (4,), dtype=np.uint8)
+    xrgb[:, :, :3] = rgb[:, :, ::-1]
+    return xrgb
+
+
+def load_ppm(path):
+    """Load a binary (P6) PPM as an (H, W, 3) RGB array"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    fields = []
+    pos = 0
+    while len(fields) < 4:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b'#':
+            pos = data.index(b'\n', pos)
+            continue
+        end = pos
+        while not data[end:end + 1].isspace():
+            end += 1
+        fields.append(data[pos:end])
+        pos = end
+    if fields[0] != b'P6' or int(fields[3]) != 255:
+        raise ValueError(f"{path}: only 8-bit binary PPM (P6) is supported")
+    width, height = int(fields[1]), int(fields[2])
+    pixels = np.frombuffer(data, dtype=np.uint8, count=width * height * 3, offset=pos + 1)
+    return pixels.reshape(height, width, 3)
+
+
+def load_frame(path):
+    if path.endswith('.ppm'):
+        return load_ppm(path)
+    return jdi_encoder.load_raw_frame(path)
+
+
+def write_framebuffer(frame, path='/dev/fb0', stride=None):
+    """Write an XRGB8888 frame to a framebuffer device with one pwrite per row block"""
+    frame = np.ascontiguousarray(frame)
+    row_bytes = frame.shape[1] * 4
+    stride = stride or row_bytes
+    fd = os.open(path, os.O_WRONLY | os.O_CLOEXEC)
+    try:
+        if stride == row_bytes:
+            os.pwrite(fd, frame.tobytes(), 0)
+        else:
+            for y in range(frame.shape[0]):
+                os.pwrite(fd, frame[y].tobytes(), y * stride)
+    finally:
+        os.close(fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dither frames for the JDI display')
+    parser.add_argument('input', help='PPM, raw gray8 or raw XRGB8888 frame (400x240)')
+    parser.add_argument('--mode', choices=MODES,
+                        help='Dither mode (default: from the driver dither parameter)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--color', dest='color', action='store_true', default=None)
+    mode.add_argument('--mono', dest='color', action='store_false')
+    parser.add_argument('--mono-cutoff', type=int)
+    parser.add_argument('--color-cutoff', type=int)
+    parser.add_argument('--fb', metavar='DEVICE', help='Write the result to a framebuffer, e.g. /dev/fb0')
+    parser.add_argument('--output', help='Write the result as raw XRGB8888')
+    parser.add_argument('--bench', type=int, metavar='N', help='Time N conversions')
+    args = parser.parse_args()
+
+    params = jdi_encoder.read_params()
+    module_path = '/sys/module/jdi_drm_enhanced/parameters/dither'
+    if args.mode is None:
+        try:
+            with open(module_path, 'r') as f:
+                args.mode = mode_for_param(f.read().strip())
+        except (OSError, ValueError):
+            args.mode = 'bayer4'
+    color = params['color'] if args.color is None else args.color
+    mono_cutoff = args.mono_cutoff if args.mono_cutoff is not None else params['mono_cutoff']
+    color_cutoff = args.color_cutoff if args.color_cutoff is not None else params['color_cutoff']
+
+    try:
+        frame = load_frame(args.input)
+    except (OSError, ValueError) as e:
+        print(f"Error loading frame: {e}")
+        return 1
+
+    out = dither_frame(frame, args.mode, color, mono_cutoff, color_cutoff)
+
+    if args.bench:
+        started = time.perf_counter()
+        for _ in range(args.bench):
+            dither_frame(frame, args.mode, color, mono_cutoff, color_cutoff)
+        elapsed = (time.perf_counter() - started) / args.bench
+        print(f"{args.mode} ({'color' if color else 'mono'}): {elapsed * 1000:.2f} ms/frame, "
+              f"{1 / elapsed:.1f} fps")
+
+    if args.output:
+        out.tofile(args.output)
+    if args.fb:
+        try:
+            write_framebuffer(out, args.fb)
+        except OSError as e:
+            print(f"Error writing framebuffer: {e}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/python3
+"""
+Virtual JDI LPM027M128C (Sharp memory LCD) panel
+Author: N@Xs - Enhanced Edition 2025
+
+Decodes the SPI byte stream the driver sends (src/drm_iface.c,
+src/display.c) into a 400x240 RGB image, so the data path can be measured
+and regression-tested without the panel.
+
+Features:
+- Write-line command (0x80 color / 0x88 mono) with 1-based line tags,
+  per-line zero trailers and the message trailer
+- Clear screen (0x20) and no-update (0x00) commands, VCOM bit (0x40)
+- Transfer time modelled at a configurable SPI clock
+- Reads a file, a pipe (stdin) or a Unix socket; reports messages/s,
+  bytes per message, modelled fps and protocol violations
+- Snapshot of the panel contents as PPM
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+
+import numpy as np
+
+from jdi_encoder import (WIDTH, HEIGHT, CMD_WRITE_COLOR, CMD_WRITE_MONO,
+                         CMD_CLEAR_SCREEN, mono_line_len, color_line_len)
+
+CMD_NO_UPDATE = 0x00
+CMD_VCOM = 0x40
+
+SPI_HZ = 4000000        # spi-max-frequency in the device tree overlays
+MESSAGE_OVERHEAD_NS = 80 + 2000  # ndelay(80) + CS/transfer setup estimate
+READ_SIZE = 64 * 1024
+MAX_VIOLATIONS = 100    # Only the first ones are kept, all are counted
+
+
+class PanelEmulator:
+    """Incremental decoder of the panel's SPI byte stream"""
+
+    def __init__(self, width=WIDTH, height=HEIGHT, spi_hz=SPI_HZ,
+                 overhead_ns=MESSAGE_OVERHEAD_NS):
+        self.width = width
+        self.height = height
+        self.spi_hz = spi_hz
+        self.overhead_ns = overhead_ns
+        self.line_lens = {
+            CMD_WRITE_COLOR: color_line_len(width),
+            CMD_WRITE_MONO: mono_line_len(width),
+        }
+
+        # Panel memory, white after power-on/clear
+        self.image = np.full((height, width, 3), 255, dtype=np.uint8)
+        self.vcom = None
+
+        self._buf = bytearray()
+        self._offset = 0        # Stream offset of _buf[0]
+
+        # Counters
+        self.messages = 0
+        self.writes = 0
+        self.clears = 0
+        self.vcom_toggles = 0
+        self.lines = 0
+        self.bytes = 0
+        self.write_bytes = 0
+        self.transfer_ns = 0
+        self.violation_count = 0
+        self.violations = []
+        self.rows_written = np.zeros(height, dtype=np.uint64)
+
+    # Stream handling
+
+    def feed(self, data):
+        """Decode as many complete messages as `data` completes"""
+        self._buf += data
+        pos = 0
+        while pos < len(self._buf):
+            consumed = self._message(pos)
+            if consumed == 0:
+                break
+            pos += consumed
+        del self._buf[:pos]
+        self._offset += pos
+
+    def transfer(self, message):
+        """Decode one complete SPI message (one chip-select cycle)"""
+        self.feed(message)
+        if self._buf:
+            self.violation(self._offset, f"incomplete message ({len(self._buf)} bytes)")
+            self._offset += len(self._buf)
+            self._buf.clear()
+
+    def finish(self):
+        """End of stream: anything left over is a truncated message"""
+        if self._buf:
+            self.violation(self._offset, f"stream ends inside a message ({len(self._buf)} bytes)")
+            self._offset += len(self._buf)
+            self._buf.clear()
+
+    def violation(self, offset, message):
+        self.violation_count += 1
+        if len(self.violations) < MAX_VIOLATIONS:
+            self.violations.append((offset, message))
+
+    def _message(self, pos):
+        """Decode the message at `pos`; returns bytes consumed, 0 if incomplete"""
+        buf = self._buf
+        cmd = buf[pos]
+        vcom = bool(cmd & CMD_VCOM)
+        mode = cmd & ~CMD_VCOM
+
+        if mode in self.line_lens:
+            end = self._write_lines(pos, mode)
+            if end is None:
+                return 0
+        elif mode in (CMD_CLEAR_SCREEN, CMD_NO_UPDATE):
+            if pos + 2 > len(buf):
+                return 0
+            if buf[pos + 1] != 0:
+                self.violation(self._offset + pos + 1, f"non-zero trailer 0x{buf[pos + 1]:02x}")
+            if mode == CMD_CLEAR_SCREEN:
+                self.image.fill(255)
+                self.clears += 1
+            end = pos + 2
+        else:
+            self.violation(self._offset + pos, f"unknown command 0x{cmd:02x}")
+            end = pos + 1
+
+        if self.vcom is not None and vcom != self.vcom:
+            self.vcom_toggles += 1
+        self.vcom = vcom
+
+        size = end - pos
+        self.messages += 1
+        self.bytes += size
+        self.transfer_ns += self.message_ns(size)
+        return size
+
+    def _write_lines(self, pos, mode):
+        buf = self._buf
+        line_len = self.line_lens[mode]
+
+        # Walk the tags first so incomplete messages cost nothing to retry
+        tags = []
+        p = pos + 1
+        while True:
+            if p >= len(buf):
+                return None
+            tag = buf[p]
+            if tag == 0:
+                break  # Message trailer
+            if p + line_len > len(buf):
+                return None
+            tags.append((p, tag))
+            p += line_len
+        end = p + 1
+
+        if not tags:
+            self.violation(self._offset + pos, "write command without lines")
+        rows = []
+        starts = []
+        for start, tag in tags:
+            if tag > self.height:
+                self.violation(self._offset + start, f"line tag {tag} out of range")
+                continue
+            if buf[start + line_len - 1] != 0:
+                self.violation(self._offset + start + line_len - 1,
+                               f"line {tag}: non-zero trailer 0x{buf[start + line_len - 1]:02x}")
+            rows.append(tag - 1)
+            starts.append(start + 1)
+
+        if rows:
+            data = np.frombuffer(bytes(buf[pos:end]), dtype=np.uint8)
+            offsets = np.array(starts) - pos
+            index = offsets[:, np.newaxis] + np.arange(line_len - 2)
+            self._draw(np.array(rows), data[index], mode)
+
+        self.writes += 1
+        self.lines += len(rows)
+        self.write_bytes += end - pos
+        return end
+
+    def _draw(self, rows, packed, mode):
+        bits = np.unpackbits(packed, axis=1)
+        if mode == CMD_WRITE_MONO:
+            pixels = np.repeat(bits[:, :self.width, np.newaxis], 3, axis=2)
+        else:
+            pixels = bits[:, :self.width * 3].reshape(len(rows), self.width, 3)
+        self.image[rows] = pixels * 255
+        self.rows_written[rows] += 1
+
+    # Timing model
+
+    def message_ns(self, size):
+        """Modelled time on the bus for a message of `size` bytes"""
+        return size * 8 * 1000000000 // self.spi_hz + self.overhead_ns
+
+    # Results
+
+    def stats(self):
+        writes = self.writes or 1
+        transfer_s = self.transfer_ns / 1e9
+        return {
+            'messages': self.messages,
+            'writes': self.writes,
+            'clears': self.clears,
+            'vcom_toggles': self.vcom_toggles,
+            'lines': self.lines,
+            'bytes': self.bytes,
+            'bytes_per_write': self.write_bytes / writes,
+            'lines_per_write': self.lines / writes,
+            'spi_hz': self.spi_hz,
+            'transfer_s': transfer_s,
+            'max_writes_per_s': self.writes / transfer_s if transfer_s else 0.0,
+            'violations': self.violation_count,
+        }
+
+    def save_ppm(self, path):
+        """Write the panel contents as a binary PPM"""
+        with open(path, 'wb') as f:
+            f.write(f"P6 {self.width} {self.height} 255\n".encode())
+            f.write(self.image.tobytes())
+
+
+def read_stream(emulator, f, read_size=READ_SIZE):
+    """Feed everything from a binary file object"""
+    while True:
+        data = f.read(read_size)
+        if not data:
+            break
+        emulator.feed(data)
+    emulator.finish()
+
+
+def serve_socket(emulator, path, report):
+    """Accept connections on a Unix socket, one stream per connection"""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    print(f"Listening on {path}")
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                with conn.makefile('rb') as f:
+                    started = time.monotonic()
+                    read_stream(emulator, f)
+                    report(emulator, time.monotonic() - started)
+    finally:
+        server.close()
+        os.unlink(path)
+
+
+def print_report(emulator, elapsed):
+    s = emulator.stats()
+    print(f"Messages: {s['messages']} ({s['writes']} writes, {s['clears']} clears, "
+          f"{s['vcom_toggles']} VCOM toggles)")
+    print(f"Lines written: {s['lines']} ({s['lines_per_write']:.1f}/write)")
+    print(f"Bytes: {s['bytes']} ({s['bytes_per_write']:.0f}/write)")
+    if elapsed > 0:
+        print(f"Decoded: {s['messages'] / elapsed:.1f} messages/s, "
+              f"{s['writes'] / elapsed:.1f} writes/s")
+    print(f"Bus time at {s['spi_hz'] / 1e6:g} MHz: {s['transfer_s'] * 1000:.2f} ms "
+          f"-> {s['max_writes_per_s']:.1f} writes/s max")
+    print(f"Protocol violations: {s['violations']}")
+    for offset, message in emulator.violations[:10]:
+        print(f"  @{offset}: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Emulate the JDI panel on an SPI byte stream')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='Stream file, "-" for stdin (default)')
+    parser.add_argument('--listen', metavar='SOCKET', help='Read streams from a Unix socket')
+    parser.add_argument('--spi-hz', type=int, default=SPI_HZ, help='Modelled SPI clock')
+    parser.add_argument('--snapshot', metavar='PPM', help='Save the final image as PPM')
+    args = parser.parse_args()
+
+    emulator = PanelEmulator(spi_hz=args.spi_hz)
+
+    if args.listen:
+        try:
+            serve_socket(emulator, args.listen, print_report)
+        except KeyboardInterrupt:
+            pass
+    else:
+        started = time.monotonic()
+        try:
+            if args.input == '-':
+                read_stream(emulator, sys.stdin.buffer)
+            else:
+                with open(args.input, 'rb') as f:
+                    read_stream(emulator, f)
+        except OSError as e:
+            print(f"Error reading stream: {e}")
+            return 1
+        print_report(emulator, time.monotonic() - started)
+
+    if args.snapshot:
+        emulator.save_ppm(args.snapshot)
+    return 1 if emulator.violation_count else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+"""
+Reference encoder for the JDI LPM027M128C tagged-line SPI format
+Author: N@Xs - Enhanced Edition 2025
+
+Mirrors the conversion done by the kernel driver in src/drm_iface.c:
+- drm_fb_xrgb8888_to_gray8() / drm_fb_xrgb8888_to_rgb888() source conversion
+- sharp_memory_gray8_to_mono_tagged() (mono_cutoff, mono_invert)
+- sharp_memory_to_color_tagged() (color_cutoff, red/blue flip)
+- 1-based line tag and zero trailer on every line
+- write-line command byte and message trailer of the SPI transfer
+
+Whole frames are converted with NumPy (packbits), no per-pixel loops, so
+content can be pre-encoded offline and compared byte-for-byte with the
+driver output.
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+
+# Panel geometry
+WIDTH = 400
+HEIGHT = 240
+
+# SPI commands (see sharp_memory_spi_write_tagged_lines)
+CMD_WRITE_COLOR = 0b10000000
+CMD_WRITE_MONO = 0b10001000
+CMD_CLEAR_SCREEN = 0b00100000
+
+# Module parameter defaults (see src/params_iface.c)
+DEFAULT_MONO_CUTOFF = 32
+DEFAULT_MONO_INVERT = False
+DEFAULT_COLOR_CUTOFF = 127
+DEFAULT_COLOR = True
+
+
+def mono_line_len(width=WIDTH):
+    """Length of one tagged mono line: tag + width/8 data bytes + trailer"""
+    return 2 + width // 8
+
+
+def color_line_len(width=WIDTH):
+    """Length of one tagged color line: tag + 3*width/8 data bytes + trailer"""
+    return 2 + (width * 3) // 8
+
+
+def _xrgb_channels(frame):
+    """Split an XRGB8888 frame into (r, g, b) uint8 planes"""
+    frame = np.asarray(frame)
+    if frame.dtype == np.uint32 and frame.ndim == 2:
+        frame = frame.view(np.uint8).reshape(frame.shape + (4,))
+    if frame.dtype != np.uint8 or frame.ndim != 3 or frame.shape[2] != 4:
+        raise ValueError(f"Expected XRGB8888 frame, got {frame.dtype} {frame.shape}")
+    # Little-endian XRGB8888 is stored as B, G, R, X in memory
+    return frame[:, :, 2], frame[:, :, 1], frame[:, :, 0]
+
+
+def xrgb8888_to_gray8(frame):
+    """Convert XRGB8888 to gray8 exactly like drm_fb_xrgb8888_to_gray8()"""
+    r, g, b = _xrgb_channels(frame)
+    # ITU BT.601: Y = 0.299 R + 0.587 G + 0.114 B, integer form used by DRM
+    gray = 3 * r.astype(np.uint16)
+    gray += 6 * g.astype(np.uint16)
+    gray += b
+    gray //= 10
+    return gray.astype(np.uint8)
+
+
+def xrgb8888_to_bgr888(frame):
+    """Convert XRGB8888 to the byte order drm_fb_xrgb8888_to_rgb888() writes
+
+    DRM_FORMAT_RGB888 is stored as B, G, R in memory, which is why the
+    color encoder has to flip red and blue afterwards.
+    """
+    r, g, b = _xrgb_channels(frame)
+    return np.stack((b, g, r), axis=2)
+
+
+def to_gray8(frame):
+    """Accept a gray8 (H, W) or XRGB8888 frame and return gray8"""
+    frame = np.asarray(frame)
+    if frame.dtype == np.uint8 and frame.ndim == 2:
+        return frame
+    return xrgb8888_to_gray8(frame)
+
+
+def to_bgr888(frame):
+    """Accept a gray8, RGB888 (H, W, 3) or XRGB8888 frame and return B, G, R bytes"""
+    frame = np.asarray(frame)
+    if frame.dtype == np.uint8 and frame.ndim == 2:
+        # Gray pixels go to every channel, like draw_overlays() does
+        return np.repeat(frame[:, :, np.newaxis], 3, axis=2)
+    if frame.dtype == np.uint8 and frame.ndim == 3 and frame.shape[2] == 3:
+        return frame[:, :, ::-1]
+    return xrgb8888_to_bgr888(frame)
+
+
+def _tagged(data, y0, out):
+    """Wrap packed line data with 1-based line tags and zero trailers"""
+    height, data_len = data.shape
+    if out is None:
+        out = np.empty((height, data_len + 2), dtype=np.uint8)
+    out[:, 0] = (np.arange(height) + y0 + 1) & 0xFF  # Indexed from 1
+    out[:, 1:-1] = data
+    out[:, -1] = 0
+    return out
+
+
+def gray8_to_mono_tagged(gray, y0=0, cutoff=DEFAULT_MONO_CUTOFF,
+                         invert=DEFAULT_MONO_INVERT, out=None):
+    """Vectorized sharp_memory_gray8_to_mono_tagged()
+
+    Returns a (height, 2 + width/8) uint8 array of tagged lines for rows
+    starting at framebuffer row `y0`.
+    """
+    gray = np.asarray(gray, dtype=np.uint8)
+    if gray.ndim != 2 or gray.shape[1] % 8:
+        raise ValueError(f"Expected gray8 rows with width multiple of 8, got {gray.shape}")
+
+    packed = np.packbits(gray >= cutoff, axis=1)
+    if invert:
+        np.invert(packed, out=packed)
+    return _tagged(packed, y0, out)
+
+
+def bgr888_to_color_tagged(bgr, y0=0, cutoff=DEFAULT_COLOR_CUTOFF, out=None):
+    """Vectorized sharp_memory_to_color_tagged() on B, G, R source bytes
+
+    Every channel byte is thresholded against `cutoff`, then each 3-bit
+    pixel group is flipped from B, G, R to the panel's R, G, B order.
+    """
+    bgr = np.asarray(bgr, dtype=np.uint8)
+    if bgr.ndim != 3 or bgr.shape[2] != 3 or bgr.shape[1] % 8:
+        raise ValueError(f"Expected (H, W, 3) rows with width multiple of 8, got {bgr.shape}")
+
+    height, width = bgr.shape[:2]
+    bits = (bgr >= cutoff)[:, :, ::-1]  # Flip red and blue
+    packed = np.packbits(bits.reshape(height, width * 3), axis=1)
+    return _tagged(packed, y0, out)
+
+
+def encode_lines(frame, color=DEFAULT_COLOR, y0=0,
+                 mono_cutoff=DEFAULT_MONO_CUTOFF, mono_invert=DEFAULT_MONO_INVERT,
+                 color_cutoff=DEFAULT_COLOR_CUTOFF):
+    """Encode frame rows into tagged lines, the buffer the driver sends over SPI"""
+    if color:
+        return bgr888_to_color_tagged(to_bgr888(frame), y0, color_cutoff)
+    return gray8_to_mono_tagged(to_gray8(frame), y0, mono_cutoff, mono_invert)
+
+
+def spi_message(lines, color=DEFAULT_COLOR):
+    """Build the full write-line transfer: command byte, tagged lines, trailer"""
+    cmd = CMD_WRITE_COLOR if color else CMD_WRITE_MONO
+    return bytes((cmd,)) + np.ascontiguousarray(lines).tobytes() + b'\x00'
+
+
+def encode_frame(frame, color=DEFAULT_COLOR, y0=0, **params):
+    """Encode a frame into the exact bytes of one sharp_memory_fb_dirty() transfer"""
+    return spi_message(encode_lines(frame, color, y0, **params), color)
+
+
+def read_params(module_path='/sys/module/jdi_drm_enhanced/parameters'):
+    """Read the encoder-relevant module parameters, falling back to defaults"""
+    def read(name, default):
+        try:
+            with open(os.path.join(module_path, name), 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return default
+
+    return {
+        'color': read('color', 'Y' if DEFAULT_COLOR else 'N') == 'Y',
+        'mono_cutoff': int(read('mono_cutoff', DEFAULT_MONO_CUTOFF)),
+        'mono_invert': read('mono_invert', 'Y' if DEFAULT_MONO_INVERT else 'N') == 'Y',
+        'color_cutoff': int(read('color_cutoff', DEFAULT_COLOR_CUTOFF)),
+    }
+
+
+def load_raw_frame(path, width=WIDTH, height=HEIGHT):
+    """Load a raw gray8 or XRGB8888 frame, the format is picked from the file size"""
+    data = np.fromfile(path, dtype=np.uint8)
+    if data.size == width * height:
+        return data.reshape(height, width)
+    if data.size == width * height * 4:
+        return data.reshape(height, width, 4)
+    raise ValueError(f"{path}: {data.size} bytes is neither gray8 nor XRGB8888 {width}x{height}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Encode raw frames into JDI tagged-line SPI data')
+    parser.add_argument('input', help='Raw gray8 or XRGB8888 frame (400x240)')
+    parser.add_argument('output', help='Output file, "-" for stdout')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--color', dest='color', action='store_true', default=None)
+    mode.add_argument('--mono', dest='color', action='store_false')
+    parser.add_argument('--mono-cutoff', type=int)
+    parser.add_argument('--mono-invert', action='store_true', default=None)
+    parser.add_argument('--color-cutoff', type=int)
+    parser.add_argument('--lines-only', action='store_true',
+                        help='Write tagged lines without command byte and trailer')
+    parser.add_argument('--from-sysfs', action='store_true',
+                        help='Use the current driver parameters as defaults')
+
+    args = parser.parse_args()
+
+    params = read_params() if args.from_sysfs else {
+        'color': DEFAULT_COLOR,
+        'mono_cutoff': DEFAULT_MONO_CUTOFF,
+        'mono_invert': DEFAULT_MONO_INVERT,
+        'color_cutoff': DEFAULT_COLOR_CUTOFF,
+    }
+    for name in ('color', 'mono_cutoff', 'mono_invert', 'color_cutoff'):
+        value = getattr(args, name)
+        if value is not None:
+            params[name] = value
+
+    try:
+        frame = load_raw_frame(args.input)
+    except (OSError, ValueError) as e:
+        print(f"Error loading frame: {e}")
+        return 1
+
+    color = params.pop('color')
+    lines = encode_lines(frame, color, **params)
+    data = lines.tobytes() if args.lines_only else spi_message(lines, color)
+
+    if args.output == '-':
+        sys.stdout.buffer.write(data)
+    else:
+        with open(args.output, 'wb') as f:
+            f.write(data)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,573 @@
+#!/usr/bin/python3
+"""
+Memory-mapped framebuffer with dirty-rectangle flushing for the JDI panel
+Author: N@Xs - Enhanced Edition 2025
+
+Buffered write()s to /dev/fb0 damage everything they cover. This maps the
+pixels instead and tells the driver which rows changed: the clips passed
+to DRM_IOCTL_MODE_DIRTYFB reach drm_atomic_helper_damage_merged() and
+sharp_memory_fb_dirty() converts and sends only those rows.
+
+Features:
+- Dumb buffer on the DRM card (CREATE_DUMB/MAP_DUMB/ADDFB, SETCRTC to
+  scan it out), flushed with DIRTYFB clips
+- /dev/fb0 mmap (fbdev emulation, the kernel's deferred I/O picks up the
+  touched pages)
+- Plain file backend for tests, records the clips it would send
+- Zero-copy NumPy views: (H, W, 4) XRGB8888 bytes and (H, W) uint32
+- Damage rectangles merged into row runs, one DIRTYFB per run
+"""
+
+import os
+import sys
+import mmap
+import time
+import ctypes
+import argparse
+
+import numpy as np
+
+from jdi_overlay import DRM_IO, DRM_IOWR, DrmDevice
+from jdi_differ import changed_runs
+from jdi_encoder import WIDTH, HEIGHT
+from jdi_sysfs import default_sysfs
+
+BYTES_PER_PIXEL = 4     # XRGB8888, the only format the driver accepts
+MAX_GAP = 2             # Clean rows merged into a run instead of a second commit
+FBDEV_PATH = '/dev/fb0'
+FILE_PATH = '/tmp/jdi-fb.raw'
+
+
+class drm_clip_rect(ctypes.Structure):
+    _fields_ = [
+        ('x1', ctypes.c_ushort),
+        ('y1', ctypes.c_ushort),
+        ('x2', ctypes.c_ushort),
+        ('y2', ctypes.c_ushort),
+    ]
+
+
+class drm_mode_fb_dirty_cmd(ctypes.Structure):
+    _fields_ = [
+        ('fb_id', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('color', ctypes.c_uint32),
+        ('num_clips', ctypes.c_uint32),
+        ('clips_ptr', ctypes.c_uint64),
+    ]
+
+
+class drm_mode_create_dumb(ctypes.Structure):
+    _fields_ = [
+        ('height', ctypes.c_uint32),
+        ('width', ctypes.c_uint32),
+        ('bpp', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('handle', ctypes.c_uint32),
+        ('pitch', ctypes.c_uint32),
+        ('size', ctypes.c_uint64),
+    ]
+
+
+class drm_mode_map_dumb(ctypes.Structure):
+    _fields_ = [
+        ('handle', ctypes.c_uint32),
+        ('pad', ctypes.c_uint32),
+        ('offset', ctypes.c_uint64),
+    ]
+
+
+class drm_mode_destroy_dumb(ctypes.Structure):
+    _fields_ = [('handle', ctypes.c_uint32)]
+
+
+class drm_mode_fb_cmd(ctypes.Structure):
+    _fields_ = [
+        ('fb_id', ctypes.c_uint32),
+        ('width', ctypes.c_uint32),
+        ('height', ctypes.c_uint32),
+        ('pitch', ctypes.c_uint32),
+        ('bpp', ctypes.c_uint32),
+        ('depth', ctypes.c_uint32),
+        ('handle', ctypes.c_uint32),
+    ]
+
+
+class drm_mode_card_res(ctypes.Structure):
+    _fields_ = [
+        ('fb_id_ptr', ctypes.c_uint64),
+        ('crtc_id_ptr', ctypes.c_uint64),
+        ('connector_id_ptr', ctypes.c_uint64),
+        ('encoder_id_ptr', ctypes.c_uint64),
+        ('count_fbs', ctypes.c_uint32),
+        ('count_crtcs', ctypes.c_uint32),
+        ('count_connectors', ctypes.c_uint32),
+        ('count_encoders', ctypes.c_uint32),
+        ('min_width', ctypes.c_uint32),
+        ('max_width', ctypes.c_uint32),
+        ('min_height', ctypes.c_uint32),
+        ('max_height', ctypes.c_uint32),
+    ]
+
+
+class drm_mode_modeinfo(ctypes.Structure):
+    _fields_ = [
+        ('clock', ctypes.c_uint32),
+        ('hdisplay', ctypes.c_uint16),
+        ('hsync_start', ctypes.c_uint16),
+        ('hsync_end', ctypes.c_uint16),
+        ('htotal', ctypes.c_uint16),
+        ('hskew', ctypes.c_uint16),
+        ('vdisplay', ctypes.c_uint16),
+        ('vsync_start', ctypes.c_uint16),
+        ('vsync_end', ctypes.c_uint16),
+        ('vtotal', ctypes.c_uint16),
+        ('vscan', ctypes.c_uint16),
+        ('vrefresh', ctypes.c_uint32),
+        ('flags', ctypes.c_uint32),
+        ('type', ctypes.c_uint32),
+        ('name', ctypes.c_char * 32),
+    ]
+
+
+class drm_mode_get_connector(ctypes.Structure):
+    _fields_ = [
+        ('encoders_ptr', ctypes.c_uint64),
+        ('modes_ptr', ctypes.c_uint64),
+        ('props_ptr', ctypes.c_uint64),
+        ('prop_values_ptr', ctypes.c_uint64),
+        ('count_modes', ctypes.c_uint32),
+        ('count_props', ctypes.c_uint32),
+        ('count_encoders', ctypes.c_uint32),
+        ('encoder_id', ctypes.c_uint32),
+        ('connector_id', ctypes.c_uint32),
+        ('connector_type', ctypes.c_uint32),
+        ('connector_type_id', ctypes.c_uint32),
+        ('connection', ctypes.c_uint32),
+        ('mm_width', ctypes.c_uint32),
+        ('mm_height', ctypes.c_uint32),
+        ('subpixel', ctypes.c_uint32),
+        ('pad', ctypes.c_uint32),
+    ]
+
+
+class drm_mode_crtc(ctypes.Structure):
+    _fields_ = [
+        ('set_connectors_ptr', ctypes.c_uint64),
+        ('count_connectors', ctypes.c_uint32),
+        ('crtc_id', ctypes.c_uint32),
+        ('fb_id', ctypes.c_uint32),
+        ('x', ctypes.c_uint32),
+        ('y', ctypes.c_uint32),
+        ('gamma_size', ctypes.c_uint32),
+        ('mode_valid', ctypes.c_uint32),
+        ('mode', drm_mode_modeinfo),
+    ]
+
+
+# Core DRM mode-setting ioctls (include/uapi/drm/drm.h)
+DRM_IOCTL_SET_MASTER = DRM_IO(0x1e)
+DRM_IOCTL_MODE_GETRESOURCES = DRM_IOWR(0xA0, drm_mode_card_res)
+DRM_IOCTL_MODE_SETCRTC = DRM_IOWR(0xA2, drm_mode_crtc)
+DRM_IOCTL_MODE_GETCONNECTOR = DRM_IOWR(0xA7, drm_mode_get_connector)
+DRM_IOCTL_MODE_ADDFB = DRM_IOWR(0xAE, drm_mode_fb_cmd)
+DRM_IOCTL_MODE_RMFB = DRM_IOWR(0xAF, ctypes.c_uint)
+DRM_IOCTL_MODE_DIRTYFB = DRM_IOWR(0xB1, drm_mode_fb_dirty_cmd)
+DRM_IOCTL_MODE_CREATE_DUMB = DRM_IOWR(0xB2, drm_mode_create_dumb)
+DRM_IOCTL_MODE_MAP_DUMB = DRM_IOWR(0xB3, drm_mode_map_dumb)
+DRM_IOCTL_MODE_DESTROY_DUMB = DRM_IOWR(0xB4, drm_mode_destroy_dumb)
+
+DRM_MODE_CONNECTED = 1
+
+
+class DamageTracker:
+    """Collects damaged rectangles and merges them into row runs
+
+    drm_atomic_helper_damage_merged() folds every clip of one commit into
+    a single bounding box, so distant rectangles are better sent as
+    separate commits. Runs separated by at most `max_gap` clean rows are
+    merged, since a few extra rows cost less than another commit.
+    """
+
+    def __init__(self, width, height, max_gap=MAX_GAP):
+        self.width = width
+        self.height = height
+        self.max_gap = max_gap
+        self.rows = np.zeros(height, dtype=bool)
+        self.x1 = np.full(height, width, dtype=np.int32)
+        self.x2 = np.zeros(height, dtype=np.int32)
+        self.rects = 0
+
+    def add(self, x, y, width, height):
+        """Mark a rectangle as damaged (clipped to the screen)"""
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(self.width, x + width), min(self.height, y + height)
+        if x1 >= x2 or y1 >= y2:
+            return
+        self.rows[y1:y2] = True
+        np.minimum(self.x1[y1:y2], x1, out=self.x1[y1:y2])
+        np.maximum(self.x2[y1:y2], x2, out=self.x2[y1:y2])
+        self.rects += 1
+
+    def add_all(self):
+        self.add(0, 0, self.width, self.height)
+
+    def pending(self):
+        return bool(self.rows.any())
+
+    def clips(self):
+        """Merged damage as (x1, y1, x2, y2) clips, one per row run"""
+        clips = []
+        for start, stop in changed_runs(self.rows, self.max_gap):
+            dirty = self.rows[start:stop]
+            clips.append((int(self.x1[start:stop][dirty].min()), start,
+                          int(self.x2[start:stop][dirty].max()), stop))
+        return clips
+
+    def take(self):
+        """Return the merged clips and start over"""
+        clips = self.clips()
+        self.clear()
+        return clips
+
+    def clear(self):
+        self.rows[:] = False
+        self.x1[:] = self.width
+        self.x2[:] = 0
+        self.rects = 0
+
+
+class Framebuffer:
+    """Mapped XRGB8888 pixels with damage tracking
+
+    `pixels` is an (H, W, 4) uint8 view in memory order (B, G, R, X) and
+    `xrgb` an (H, W) uint32 view of the same memory; both honour the
+    stride. Writes through the views must be reported with damage() (the
+    blit/fill/region helpers do it), flush() sends the merged clips.
+    """
+
+    def __init__(self, buf, width, height, stride, max_gap=MAX_GAP):
+        self.buf = buf
+        self.width = width
+        self.height = height
+        self.stride = stride
+        self.pixels = np.ndarray((height, width, BYTES_PER_PIXEL), dtype=np.uint8,
+                                 buffer=buf, strides=(stride, BYTES_PER_PIXEL, 1))
+        self.xrgb = np.ndarray((height, width), dtype=np.uint32,
+                               buffer=buf, strides=(stride, BYTES_PER_PIXEL))
+        self.tracker = DamageTracker(width, height, max_gap)
+
+        # Counters
+        self.flushes = 0
+        self.commits = 0
+        self.rows_flushed = 0
+        self.flush_ns = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Drawing
+
+    def damage(self, x=0, y=0, width=None, height=None):
+        """Report a rectangle written through the views (default: everything)"""
+        self.tracker.add(x, y, self.width if width is None else width,
+                         self.height if height is None else height)
+
+    def region(self, x, y, width, height):
+        """Writable view of a rectangle, marked damaged (clipped to the screen)"""
+        self.damage(x, y, width, height)
+        return self.pixels[max(0, y):max(0, y + height), max(0, x):max(0, x + width)]
+
+    def blit(self, frame, x=0, y=0):
+        """Copy an (h, w, 4) XRGB8888 or (h, w) uint32 image to (x, y)"""
+        frame = np.asarray(frame)
+        if frame.ndim == 2:
+            frame = frame.astype(np.uint32, copy=False).view(np.uint8).reshape(frame.shape + (4,))
+        h, w = frame.shape[:2]
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(self.width, x + w), min(self.height, y + h)
+        if x1 >= x2 or y1 >= y2:
+            return
+        self.pixels[y1:y2, x1:x2] = frame[y1 - y:y2 - y, x1 - x:x2 - x]
+        self.tracker.add(x1, y1, x2 - x1, y2 - y1)
+
+    def fill(self, value, x=0, y=0, width=None, height=None):
+        """Fill a rectangle with a 0xXXRRGGBB value"""
+        width = self.width if width is None else width
+        height = self.height if height is None else height
+        self.xrgb[max(0, y):max(0, y + height), max(0, x):max(0, x + width)] = value
+        self.tracker.add(x, y, width, height)
+
+    # Flushing
+
+    def flush(self):
+        """Send the damaged rows to the panel, returns the clips sent"""
+        if not self.tracker.pending():
+            return []
+        started = time.monotonic_ns()
+        clips = self.tracker.take()
+        for clip in clips:
+            self._flush_clip(clip)
+            self.rows_flushed += clip[3] - clip[1]
+        self.commits += len(clips)
+        self.flushes += 1
+        self.flush_ns += time.monotonic_ns() - started
+        return clips
+
+    def _flush_clip(self, clip):
+        """Send one (x1, y1, x2, y2) clip; plain memory has nowhere to send it"""
+        pass
+
+    def stats(self):
+        flushes = self.flushes or 1
+        return {
+            'width': self.width,
+            'height': self.height,
+            'stride': self.stride,
+            'flushes': self.flushes,
+            'commits': self.commits,
+            'rows_flushed': self.rows_flushed,
+            'rows_per_flush': self.rows_flushed / flushes,
+            'flush_ms': self.flush_ns / flushes / 1e6,
+        }
+
+    def close(self):
+        # The mapping can only go once no view is exported any more
+        self.pixels = self.xrgb = None
+        try:
+            self.buf.close()
+        except BufferError:
+            pass
+
+
+class FileFramebuffer(Framebuffer):
+    """Framebuffer backed by a plain file, for tests
+
+    Flushed clips are recorded in `flushed` instead of being sent.
+    """
+
+    def __init__(self, path=FILE_PATH, width=WIDTH, height=HEIGHT, stride=None,
+                 max_gap=MAX_GAP):
+        stride = stride or width * BYTES_PER_PIXEL
+        size = stride * height
+        self.path = path
+        self.flushed = []
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            buf = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        super().__init__(buf, width, height, stride, max_gap)
+
+    def _flush_clip(self, clip):
+        self.flushed.append(clip)
+
+
+class FbdevFramebuffer(Framebuffer):
+    """mmap of the fbdev emulation (/dev/fb0)
+
+    The fbdev framebuffer belongs to the kernel's fbdev client, there is
+    no DIRTYFB for it: its deferred I/O tracks the written pages and
+    flushes them on its own. Only touching the damaged pages is what keeps
+    the conversion small, flush() just does the accounting.
+    """
+
+    def __init__(self, path=FBDEV_PATH, sysfs=None, max_gap=MAX_GAP):
+        sysfs = sysfs or default_sysfs()
+        attr_dir = os.path.join('class/graphics', os.path.basename(path))
+        width, height = (int(v) for v in
+                         sysfs.attr(os.path.join(attr_dir, 'virtual_size')).read().split(','))
+        bpp = int(sysfs.attr(os.path.join(attr_dir, 'bits_per_pixel')).read())
+        stride = int(sysfs.attr(os.path.join(attr_dir, 'stride')).read())
+        if bpp != BYTES_PER_PIXEL * 8:
+            raise ValueError(f"{path} is {bpp} bpp, expected XRGB8888")
+
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CLOEXEC)
+        try:
+            buf = mmap.mmap(fd, stride * height, mmap.MAP_SHARED,
+                            mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        super().__init__(buf, width, height, stride, max_gap)
+
+    def _flush_clip(self, clip):
+        pass
+
+
+def find_output(device):
+    """First connected connector with a mode: (crtc_id, connector_id, mode)"""
+    res = drm_mode_card_res()
+    device.ioctl(DRM_IOCTL_MODE_GETRESOURCES, res)
+    crtcs = (ctypes.c_uint32 * res.count_crtcs)()
+    connectors = (ctypes.c_uint32 * res.count_connectors)()
+    res = drm_mode_card_res(crtc_id_ptr=ctypes.addressof(crtcs),
+                            connector_id_ptr=ctypes.addressof(connectors),
+                            count_crtcs=len(crtcs), count_connectors=len(connectors))
+    device.ioctl(DRM_IOCTL_MODE_GETRESOURCES, res)
+    if not crtcs:
+        raise OSError(19, "No CRTC on the DRM card")
+
+    for connector_id in connectors:
+        conn = drm_mode_get_connector(connector_id=connector_id)
+        device.ioctl(DRM_IOCTL_MODE_GETCONNECTOR, conn)
+        if conn.connection != DRM_MODE_CONNECTED or not conn.count_modes:
+            continue
+        modes = (drm_mode_modeinfo * conn.count_modes)()
+        conn = drm_mode_get_connector(connector_id=connector_id,
+                                      modes_ptr=ctypes.addressof(modes),
+                                      count_modes=len(modes))
+        device.ioctl(DRM_IOCTL_MODE_GETCONNECTOR, conn)
+        return crtcs[0], connector_id, modes[0]
+    raise OSError(19, "No connected display on the DRM card")
+
+
+class DumbFramebuffer(Framebuffer):
+    """Dumb buffer on the DRM card, flushed with DRM_IOCTL_MODE_DIRTYFB
+
+    SETCRTC and DIRTYFB need DRM master: run without a compositor holding
+    the card. Closing removes the framebuffer, the kernel then gives the
+    display back to fbcon.
+    """
+
+    def __init__(self, device=None, scanout=True, max_gap=MAX_GAP):
+        if device is None or isinstance(device, str):
+            device = DrmDevice(device)
+        self.device = device
+        self.fb_id = 0
+        self.handle = 0
+
+        crtc_id, connector_id, mode = find_output(device)
+        width, height = mode.hdisplay, mode.vdisplay
+
+        create = drm_mode_create_dumb(width=width, height=height, bpp=BYTES_PER_PIXEL * 8)
+        device.ioctl(DRM_IOCTL_MODE_CREATE_DUMB, create)
+        self.handle = create.handle
+
+        try:
+            fb = drm_mode_fb_cmd(width=width, height=height, pitch=create.pitch,
+                                 bpp=32, depth=24, handle=create.handle)
+            device.ioctl(DRM_IOCTL_MODE_ADDFB, fb)
+            self.fb_id = fb.fb_id
+
+            mapping = drm_mode_map_dumb(handle=create.handle)
+            device.ioctl(DRM_IOCTL_MODE_MAP_DUMB, mapping)
+            buf = mmap.mmap(device.fd, create.size, mmap.MAP_SHARED,
+                            mmap.PROT_READ | mmap.PROT_WRITE, offset=mapping.offset)
+
+            if scanout:
+                connectors = (ctypes.c_uint32 * 1)(connector_id)
+                crtc = drm_mode_crtc(set_connectors_ptr=ctypes.addressof(connectors),
+                                     count_connectors=1, crtc_id=crtc_id,
+                                     fb_id=self.fb_id, mode_valid=1, mode=mode)
+                device.ioctl(DRM_IOCTL_MODE_SETCRTC, crtc)
+        except OSError:
+            self._release()
+            raise
+
+        super().__init__(buf, width, height, create.pitch, max_gap)
+
+        # Reused ioctl argument structs
+        self._clip = drm_clip_rect()
+        self._dirty = drm_mode_fb_dirty_cmd(fb_id=self.fb_id, num_clips=1,
+                                            clips_ptr=ctypes.addressof(self._clip))
+
+    def _flush_clip(self, clip):
+        self._clip.x1, self._clip.y1, self._clip.x2, self._clip.y2 = clip
+        self.device.ioctl(DRM_IOCTL_MODE_DIRTYFB, self._dirty)
+
+    def _release(self):
+        if self.fb_id:
+            self.device.ioctl(DRM_IOCTL_MODE_RMFB, ctypes.c_uint(self.fb_id))
+            self.fb_id = 0
+        if self.handle:
+            self.device.ioctl(DRM_IOCTL_MODE_DESTROY_DUMB,
+                              drm_mode_destroy_dumb(handle=self.handle))
+            self.handle = 0
+        self.device.close()
+
+    def close(self):
+        super().close()
+        self._release()
+
+
+def open_framebuffer(backend, path=None, max_gap=MAX_GAP):
+    """Open a framebuffer backend by name ('dumb', 'fbdev' or 'file')"""
+    if backend == 'dumb':
+        return DumbFramebuffer(path, max_gap=max_gap)
+    if backend == 'fbdev':
+        return FbdevFramebuffer(path or FBDEV_PATH, max_gap=max_gap)
+    if backend == 'file':
+        return FileFramebuffer(path or FILE_PATH, max_gap=max_gap)
+    raise ValueError(f"Unknown framebuffer backend '{backend}'")
+
+
+def bench(fb, frames, size=32):
+    """Move a box across the screen, flushing only the rows it touches"""
+    fb.fill(0xffffffff)
+    fb.flush()
+    x = y = 0
+    dx, dy = 7, 3
+    for _ in range(frames):
+        fb.fill(0xffffffff, x, y, size, size)
+        x += dx
+        y += dy
+        if not 0 <= x <= fb.width - size:
+            dx = -dx
+            x += 2 * dx
+        if not 0 <= y <= fb.height - size:
+            dy = -dy
+            y += 2 * dy
+        fb.fill(0xff000000, x, y, size, size)
+        fb.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Draw on the JDI panel through a mapped framebuffer')
+    parser.add_argument('image', nargs='?', help='PPM or raw 400x240 frame to draw')
+    parser.add_argument('--backend', choices=['dumb', 'fbdev', 'file'], default='dumb')
+    parser.add_argument('--device', help='DRM card, fbdev node or file (backend dependent)')
+    parser.add_argument('--x', type=int, default=0)
+    parser.add_argument('--y', type=int, default=0)
+    parser.add_argument('--max-gap', type=int, default=MAX_GAP,
+                        help='Clean rows merged into one flush')
+    parser.add_argument('--bench', type=int, metavar='FRAMES', help='Moving box benchmark')
+    parser.add_argument('--hold', type=float, default=0,
+                        help='Seconds to keep the dumb buffer on screen')
+    args = parser.parse_args()
+
+    try:
+        fb = open_framebuffer(args.backend, args.device, args.max_gap)
+    except (OSError, ValueError) as e:
+        print(f"Error opening {args.backend} framebuffer: {e}")
+        return 1
+
+    with fb:
+        if args.image:
+            import jdi_dither
+            frame = jdi_dither.load_frame(args.image)
+            if frame.ndim == 3 and frame.shape[2] == 3:
+                frame = jdi_dither.rgb_to_xrgb(frame)
+            elif frame.ndim == 2 and frame.dtype == np.uint8:
+                frame = np.repeat(frame[:, :, np.newaxis], 4, axis=2)
+            fb.blit(frame, args.x, args.y)
+            clips = fb.flush()
+            print(f"Flushed {len(clips)} clip(s): {clips}")
+        if args.bench:
+            bench(fb, args.bench)
+            s = fb.stats()
+            print(f"{s['flushes']} flushes, {s['commits']} commits, "
+                  f"{s['rows_per_flush']:.1f} rows/flush of {s['height']}, "
+                  f"{s['flush_ms']:.3f} ms/flush")
+        if args.hold:
+            time.sleep(args.hold)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
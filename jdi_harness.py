@@ -0,0 +1,521 @@
+#!/usr/bin/python3
+"""
+Hardware-free benchmark harness for the JDI userspace tools
+Author: N@Xs - Enhanced Edition 2025
+
+Builds a simulated sysfs, /proc and /dev/input tree in a temp directory
+so the daemon, powersave, status and profile code paths can be measured
+(and regression-checked) without the panel, the button or root.
+
+Features:
+- Fake tree: module parameters with the driver defaults, jdi-backlight
+  class device, fb0, /proc/modules and a /proc/bus/input/devices entry
+  for the "Brightness Button" gpio-keys device
+- The button's event node is a FIFO; synthetic input_event press/release
+  pairs (EV_KEY + EV_SYN) are injected at a chosen rate
+- Scenarios: button presses through the asyncio daemon at several rates,
+  status polling (jdi_status, powersave, control service) and profile
+  application (changing and no-op)
+- Per operation: wall and CPU time, read/write syscalls (/proc/self/io) and sysfs
+  reads/writes/skipped writes; press latency p50/p99 from jdi_latency
+- JSON output and --compare against a previous run, like jdi_bench.py
+- `create` prints the JDI_SYSFS_ROOT/JDI_PROC_ROOT/JDI_INPUT_DIR exports
+  to run any of the tools against a tree, `inject` feeds its button
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import contextlib
+
+from jdi_input import DeviceLookup, EVENT, EV_KEY, EV_SYN
+from jdi_sysfs import Sysfs, MODULE_PARAMS_DIR, BACKLIGHT_DIR
+from jdi_daemon import Backlight, JDIDaemon, BRIGHTNESS_KEY_CODE, BUTTON_DEVICE_NAMES
+from jdi_latency import LatencyTracer
+from jdi_profiles import ProfileEngine
+from jdi_status import StatusCollector, MODULE_NAME, FB_SIZE_ATTR
+from jdi_control import ControlService
+import powersave
+
+# Driver defaults (src/params_iface.c) and the jdi-drm-enhanced.dts backlight
+PARAMS = {
+    'color': 'Y',
+    'mono_cutoff': '32',
+    'mono_invert': 'N',
+    'color_cutoff': '127',
+    'overlays': 'Y',
+    'auto_clear': 'Y',
+    'backlit': 'N',
+    'auto_power_save': 'N',
+    'idle_timeout': '30000',
+    'dither': '0',
+}
+BACKLIGHT = {
+    'brightness': '2',
+    'max_brightness': '3',
+    'actual_brightness': '2',
+    'bl_power': '0',
+    'type': 'raw',
+}
+FB_ATTRS = {
+    'virtual_size': '400,240',
+    'bits_per_pixel': '32',
+    'name': 'jdi-drm-enhanceddrmfb',
+}
+BUTTON_EVENT = 'event0'
+
+PRESS_RATES = (5, 20, 100)   # Presses per second
+PRESSES = 100
+ITERATIONS = 500
+REGRESSION_THRESHOLD = 10.0  # Percent
+
+# Informational metrics, not compared (skipped writes are savings, not a cost)
+NOT_COMPARED = ('ops', 'rate_hz', 'handled', 'sysfs_skipped_per_op')
+
+
+class FakeTree:
+    """Simulated sys/, proc/ and dev/input/ below one directory"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.sys = os.path.join(self.root, 'sys')
+        self.proc = os.path.join(self.root, 'proc')
+        self.input_dir = os.path.join(self.root, 'dev', 'input')
+        self.devices_path = os.path.join(self.proc, 'bus', 'input', 'devices')
+        self.button = os.path.join(self.input_dir, BUTTON_EVENT)
+
+    def _write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def create(self, params=None, backlight=None):
+        """Populate the tree (existing values are reset)"""
+        for name, value in dict(PARAMS, **(params or {})).items():
+            self._write(os.path.join(self.sys, MODULE_PARAMS_DIR, name), f"{value}\n")
+        for name, value in dict(BACKLIGHT, **(backlight or {})).items():
+            self._write(os.path.join(self.sys, BACKLIGHT_DIR, name), f"{value}\n")
+        fb_dir = os.path.dirname(os.path.join(self.sys, FB_SIZE_ATTR))
+        for name, value in FB_ATTRS.items():
+            self._write(os.path.join(fb_dir, name), f"{value}\n")
+        os.makedirs(os.path.join(self.sys, 'class', 'drm', 'card0'), exist_ok=True)
+
+        self._write(os.path.join(self.proc, 'modules'),
+                    f"{MODULE_NAME} 45056 0 - Live 0x0000000000000000\n")
+        self._write(os.path.join(self.proc, 'uptime'), "1000.00 3900.00\n")
+        self._write(self.devices_path, self.input_devices())
+
+        os.makedirs(self.input_dir, exist_ok=True)
+        if not os.path.exists(self.button):
+            os.mkfifo(self.button, 0o660)
+        return self
+
+    def input_devices(self):
+        """/proc/bus/input/devices with the driver's gpio-keys button"""
+        return (
+            'I: Bus=0019 Vendor=0001 Product=0001 Version=0100\n'
+            f'N: Name="{BUTTON_DEVICE_NAMES[1]}"\n'
+            'P: Phys=gpio-keys/input0\n'
+            'S: Sysfs=/devices/platform/gpio-keys/input/input0\n'
+            'U: Uniq=\n'
+            f'H: Handlers=kbd {BUTTON_EVENT} \n'
+            'B: PROP=0\n'
+            'B: EV=100003\n'
+            '\n'
+        )
+
+    def env(self):
+        """Environment variables pointing the JDI tools at this tree"""
+        return {
+            'JDI_SYSFS_ROOT': self.sys,
+            'JDI_PROC_ROOT': self.proc,
+            'JDI_INPUT_DIR': self.input_dir,
+            'JDI_TEXTFILE_DIR': self.root,
+            'JDI_CONTROL_SOCKET': os.path.join(self.root, 'control.sock'),
+            'JDI_DAEMON_SOCKET': os.path.join(self.root, 'daemon.sock'),
+        }
+
+    def sysfs(self):
+        return Sysfs(self.sys)
+
+
+class EventInjector:
+    """Writes input_event structs into the tree's button FIFO
+
+    The FIFO is opened read-write: the writer never blocks on a missing
+    reader, and readers never see EOF (an endless HUP under epoll) while
+    the injector is open.
+    """
+
+    def __init__(self, path, code=BRIGHTNESS_KEY_CODE):
+        self.path = path
+        self.code = code
+        self.fd = os.open(path, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+        self.injected = 0
+
+    def _events(self, value):
+        # Realtime stamps: EVIOCSCLOCKID fails on a FIFO, readers fall back
+        sec, nsec = divmod(time.time_ns(), 10**9)
+        usec = nsec // 1000
+        return (EVENT.pack(sec, usec, EV_KEY, self.code, value)
+                + EVENT.pack(sec, usec, EV_SYN, 0, 0))
+
+    def press(self):
+        """Press and release, as one write"""
+        os.write(self.fd, self._events(1) + self._events(0))
+        self.injected += 1
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+# Measurement
+
+def syscall_counts():
+    """(read, write) syscalls of this process so far, from /proc/self/io"""
+    counts = {}
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                counts[key] = int(value)
+    except OSError:
+        return None
+    return counts.get('syscr', 0), counts.get('syscw', 0)
+
+
+def sysfs_totals(sysfs):
+    totals = {'reads': 0, 'writes': 0, 'skipped': 0}
+    for counters in sysfs.stats().values():
+        for key in totals:
+            totals[key] += counters[key]
+    return totals
+
+
+class Measure:
+    """Context manager collecting per-operation costs of a block"""
+
+    def __init__(self, sysfs, ops):
+        self.sysfs = sysfs
+        self.ops = ops
+        self.result = {}
+
+    def __enter__(self):
+        self._sysfs = sysfs_totals(self.sysfs)
+        self._syscalls = syscall_counts()
+        self._cpu = time.process_time_ns()
+        self._started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self._started
+        cpu = time.process_time_ns() - self._cpu
+        syscalls = syscall_counts()
+        sysfs = sysfs_totals(self.sysfs)
+        ops = self.ops or 1
+        self.result = {'ops': self.ops, 'wall_us_per_op': round(elapsed / ops / 1000, 2),
+                       'cpu_us_per_op': round(cpu / ops / 1000, 2)}
+        if syscalls is not None and self._syscalls is not None:
+            reads = syscalls[0] - self._syscalls[0]
+            writes = syscalls[1] - self._syscalls[1]
+            # Measuring itself costs one open/read/close of /proc/self/io
+            self.result['syscalls_per_op'] = round(max(0, reads + writes - 1) / ops, 2)
+        for key in ('reads', 'writes', 'skipped'):
+            self.result[f"sysfs_{key}_per_op"] = round((sysfs[key] - self._sysfs[key]) / ops, 2)
+        return False
+
+
+# Scenarios. Each gets a fresh tree and returns its metrics.
+
+def scenario_press(tree, rate, presses=PRESSES):
+    """Button presses through the daemon's evdev path at `rate` per second"""
+    sysfs = tree.sysfs()
+    tracer = LatencyTracer(path=os.path.join(tree.root, 'jdi_latency.prom'))
+    backlight = Backlight(sysfs.backlight('brightness'), tracer=tracer)
+    daemon = JDIDaemon(backlight, auto_dim_timeout=0, debounce=0.0,
+                       input_dir=tree.input_dir, telemetry_interval=0,
+                       device_lookup=_lookup(tree), tracer=tracer,
+                       control_socket=os.path.join(tree.root, 'daemon.sock'))
+    injector = EventInjector(tree.button)
+
+    async def run():
+        task = asyncio.ensure_future(daemon.run(button_gpio=None, power_gpio=None))
+        await asyncio.sleep(0.05)
+        with Measure(sysfs, presses) as m:
+            interval = 1.0 / rate
+            deadline = time.monotonic()
+            for _ in range(presses):
+                injector.press()
+                deadline += interval
+                await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+            # Let the last press reach sysfs
+            await asyncio.sleep(min(interval, 0.05))
+        daemon.stop()
+        await task
+        return m.result
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = asyncio.run(run())
+    finally:
+        injector.close()
+        sysfs.close()
+    total = tracer.histograms.get(('cycle', 'total'))
+    result.update(rate_hz=rate, handled=daemon.presses,
+                  p50_ms=total.summary()['p50_ms'] if total else None,
+                  p99_ms=total.summary()['p99_ms'] if total else None)
+    # Wall time is set by the injection rate; CPU time is the cost
+    result.pop('wall_us_per_op')
+    if 'syscalls_per_op' in result:
+        result['syscalls_per_op'] = round(result['syscalls_per_op'] - 1, 2)  # The injector's write
+    return result
+
+
+def _lookup(tree):
+    return DeviceLookup(BUTTON_DEVICE_NAMES, tree.devices_path, tree.input_dir)
+
+
+def _repeat(sysfs, iterations, op):
+    with contextlib.redirect_stdout(io.StringIO()):
+        op()  # Warm-up: attributes opened, names listed
+        with Measure(sysfs, iterations) as m:
+            for _ in range(iterations):
+                op()
+    return m.result
+
+
+def scenario_status(tree, iterations=ITERATIONS):
+    """jdi-status snapshots"""
+    sysfs = tree.sysfs()
+    collector = StatusCollector(sysfs, proc_root=tree.proc)
+    try:
+        return _repeat(sysfs, iterations, collector.snapshot)
+    finally:
+        sysfs.close()
+
+
+def scenario_powersave_status(tree, iterations=ITERATIONS):
+    """powersave.py status through a warm JDIPowerManager"""
+    sysfs = tree.sysfs()
+    pm = powersave.JDIPowerManager(sysfs)
+    try:
+        return _repeat(sysfs, iterations, pm.show_status)
+    finally:
+        sysfs.close()
+
+
+def scenario_control_status(tree, iterations=ITERATIONS):
+    """'status' requests of the control service (transport excluded)"""
+    sysfs = tree.sysfs()
+    service = ControlService(sysfs)
+    try:
+        return _repeat(sysfs, iterations, lambda: service.handle('status'))
+    finally:
+        sysfs.close()
+
+
+def scenario_profile(tree, iterations=ITERATIONS):
+    """Alternating mono / 8colors profiles (every apply changes values)"""
+    sysfs = tree.sysfs()
+    engine = ProfileEngine(sysfs)
+    state = {'next': 'mono'}
+
+    def apply():
+        engine.apply(state['next'])
+        state['next'] = '8colors' if state['next'] == 'mono' else 'mono'
+
+    try:
+        return _repeat(sysfs, iterations, apply)
+    finally:
+        sysfs.close()
+
+
+def scenario_profile_noop(tree, iterations=ITERATIONS):
+    """Re-applying the active profile (nothing to write)"""
+    sysfs = tree.sysfs()
+    engine = ProfileEngine(sysfs)
+    engine.apply('mono')
+    try:
+        return _repeat(sysfs, iterations, lambda: engine.apply('mono'))
+    finally:
+        sysfs.close()
+
+
+SCENARIOS = {
+    'press': scenario_press,
+    'status': scenario_status,
+    'powersave_status': scenario_powersave_status,
+    'control_status': scenario_control_status,
+    'profile': scenario_profile,
+    'profile_noop': scenario_profile_noop,
+}
+
+
+def run(scenarios, rates=PRESS_RATES, presses=PRESSES, iterations=ITERATIONS):
+    results = {
+        'meta': {
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'presses': presses,
+            'iterations': iterations,
+        },
+        'scenarios': {},
+    }
+    for name in scenarios:
+        runs = [(f"press_{rate:g}hz", (rate, presses)) for rate in rates] if name == 'press' \
+            else [(name, (iterations,))]
+        for key, args in runs:
+            with tempfile.TemporaryDirectory(prefix='jdi-harness-') as root:
+                tree = FakeTree(root).create()
+                results['scenarios'][key] = SCENARIOS[name](tree, *args)
+    return results
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """List of (metric, old, new, change %) that got worse by more than threshold
+
+    Every compared metric is a cost, so higher is worse; the rest are
+    listed in NOT_COMPARED.
+    """
+    regressions = []
+    for name, metrics in current['scenarios'].items():
+        old_metrics = baseline.get('scenarios', {}).get(name, {})
+        for key, value in metrics.items():
+            old = old_metrics.get(key)
+            if key in NOT_COMPARED or not isinstance(value, (int, float)) or not old:
+                continue
+            change = 100.0 * (value - old) / old
+            if change > threshold:
+                regressions.append((f"{name}.{key}", old, value, change))
+    return regressions
+
+
+def print_summary(results):
+    meta = results['meta']
+    print(f"Python {meta['python']} on {meta['machine']}, {meta['presses']} presses, "
+          f"{meta['iterations']} iterations per scenario")
+    print(f"{'scenario':18} {'us/op':>9} {'cpu us':>8} {'sysc/op':>8} {'rd/op':>6} {'wr/op':>6} {'skip/op':>7}  latency")
+    fmt = lambda v, spec: format(v, spec) if v is not None else format('-', spec.rstrip('f').split('.')[0])
+    for name, m in results['scenarios'].items():
+        latency = ''
+        if 'handled' in m:
+            latency = f"{m['handled']}/{m['ops']} handled"
+            if m['p50_ms'] is not None:
+                latency += f", p50 {m['p50_ms']:.3f} ms p99 {m['p99_ms']:.3f} ms"
+        print(f"{name:18} {fmt(m.get('wall_us_per_op'), '9.1f')} {m['cpu_us_per_op']:8.1f} "
+              f"{fmt(m.get('syscalls_per_op'), '8.2f')} {m['sysfs_reads_per_op']:6.2f} "
+              f"{m['sysfs_writes_per_op']:6.2f} {m['sysfs_skipped_per_op']:7.2f}  {latency}")
+
+
+# Commands
+
+def cmd_create(args):
+    tree = FakeTree(args.root).create()
+    for key, value in tree.env().items():
+        print(f"export {key}={value}")
+    if not args.hold:
+        return 0
+    # Keep a writer open: readers of the FIFO would otherwise spin on EOF
+    injector = EventInjector(tree.button)
+    print(f"# Holding {tree.button} open, Ctrl-C to stop", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        injector.close()
+    return 0
+
+
+def cmd_inject(args):
+    tree = FakeTree(args.root)
+    if not os.path.exists(tree.button):
+        print(f"No button node at {tree.button} (run: create {args.root})")
+        return 1
+    injector = EventInjector(tree.button, args.code)
+    try:
+        for i in range(args.presses):
+            if i:
+                time.sleep(1.0 / args.rate)
+            injector.press()
+    except BlockingIOError:
+        print(f"FIFO full after {injector.injected} presses (nothing is reading {tree.button})")
+        return 1
+    finally:
+        injector.close()
+    print(f"Injected {injector.injected} presses (code {args.code}) into {tree.button}")
+    return 0
+
+
+def cmd_bench(args):
+    results = run(args.scenario or list(SCENARIOS), tuple(args.rate or PRESS_RATES),
+                  args.presses, args.iterations)
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print_summary(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for key, old, new, change in regressions:
+            print(f"REGRESSION {key}: {old:.3f} -> {new:.3f} ({change:+.1f}%)", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hardware-free JDI harness (simulated sysfs/evdev)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('create', help='Build a fake tree and print its environment')
+    p.add_argument('root', help='Directory for the tree')
+    p.add_argument('--hold', action='store_true',
+                   help='Stay running with the button FIFO held open')
+    p.set_defaults(func=cmd_create)
+
+    p = sub.add_parser('inject', help='Inject button presses into a fake tree')
+    p.add_argument('root', help='Directory of the tree')
+    p.add_argument('--presses', type=int, default=1)
+    p.add_argument('--rate', type=float, default=5.0, help='Presses per second')
+    p.add_argument('--code', type=int, default=BRIGHTNESS_KEY_CODE, help='Key code')
+    p.set_defaults(func=cmd_inject)
+
+    p = sub.add_parser('bench', help='Run the benchmark scenarios')
+    p.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                   help='Scenario to run (default: all)')
+    p.add_argument('--rate', type=float, action='append',
+                   help='Press rate in Hz for the press scenario (default: 5, 20, 100)')
+    p.add_argument('--presses', type=int, default=PRESSES)
+    p.add_argument('--iterations', type=int, default=ITERATIONS)
+    p.add_argument('--json', metavar='FILE', help='Write results as JSON ("-" for stdout)')
+    p.add_argument('--compare', metavar='FILE', help='Baseline JSON to check for regressions')
+    p.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                   help='Regression threshold in percent')
+    p.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,277 @@
+#!/usr/bin/python3
+"""
+Activity-driven idle engine for the JDI backlight daemon
+Author: N@Xs - Enhanced Edition 2025
+
+Features:
+- Every /dev/input/event* device counts as activity (keyboard, touch,
+  mouse, buttons), read from the event loop with epoll
+- One lazy deadline timer: input only stores a timestamp, the timer
+  re-arms itself when it fires early
+- Multi-stage idle: dim, backlight off, panel standby (the daemon is the
+  only owner of the driver auto_power_save/idle_timeout)
+- Adaptive timeouts: dimming that is undone right away lengthens the
+  timeout, sessions that run into the off stage shorten it
+"""
+
+import os
+import json
+import time
+
+from jdi_input import EventReader, event_devices, INPUT_DIR
+from jdi_sysfs import default_sysfs
+
+STAGE_ACTIVE = 0
+STAGE_DIM = 1
+STAGE_OFF = 2
+STAGE_NAMES = ('active', 'dim', 'off')
+
+DIM_TIMEOUT = 300       # Seconds of inactivity before dimming
+OFF_DELAY = 300         # Seconds after dimming before the backlight goes off
+MIN_DIM_TIMEOUT = 30
+MAX_DIM_TIMEOUT = 1800
+REACTION_WINDOW = 10    # Activity this soon after dimming means "too early"
+GROW_FACTOR = 1.5
+SHRINK_FACTOR = 0.9
+
+
+class IdleEngine:
+    """Idle stages on a single loop timer, with adaptive timeouts"""
+
+    def __init__(self, backlight, dim_level_index=1, dim_timeout=DIM_TIMEOUT,
+                 off_delay=OFF_DELAY, adaptive=True, sysfs=None, sync_driver=True,
+                 state_path=None, telemetry=None, clock=time.monotonic):
+        self.backlight = backlight
+        self.dim_level_index = dim_level_index
+        self.dim_timeout = float(dim_timeout)
+        self.off_delay = float(off_delay)
+        self.adaptive = adaptive
+        self.sysfs = sysfs
+        self.sync_driver = sync_driver
+        self.state_path = state_path
+        self.telemetry = telemetry
+        self.clock = clock
+
+        self.loop = None
+        self.stage = STAGE_ACTIVE
+        self.last_activity = clock()
+        self.stage_since = self.last_activity
+        self.saved_index = None
+        self._handle = None
+
+        # Counters
+        self.dims = 0
+        self.offs = 0
+        self.premature = 0
+        self.wakeups = 0
+
+        self.load_state()
+
+    # Timeouts
+
+    def stage_deadline(self, stage):
+        """Idle seconds after which `stage` is entered"""
+        if stage == STAGE_DIM:
+            return self.dim_timeout
+        return self.dim_timeout + self.off_delay
+
+    def enabled(self):
+        return self.dim_timeout > 0
+
+    def last_stage(self):
+        """Deepest stage the engine goes to (off_delay <= 0 stops at dim)"""
+        return STAGE_OFF if self.off_delay > 0 else STAGE_DIM
+
+    # Event loop side
+
+    def start(self, loop):
+        self.loop = loop
+        self.last_activity = self.clock()
+        self.sync_driver_params()
+        self._arm()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self.save_state()
+
+    def _arm(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self.enabled() or self.stage >= self.last_stage():
+            return
+        deadline = self.last_activity + self.stage_deadline(self.stage + 1)
+        self._handle = self.loop.call_later(max(0.0, deadline - self.clock()), self._on_deadline)
+
+    def _on_deadline(self):
+        self._handle = None
+        idle = self.clock() - self.last_activity
+        while self.stage < self.last_stage() and idle >= self.stage_deadline(self.stage + 1):
+            self._enter(self.stage + 1)
+        self._arm()
+
+    def _enter(self, stage):
+        now = self.clock()
+        # Counters and telemetry only for stages that changed the level
+        if stage == STAGE_DIM:
+            if self.backlight.index > self.dim_level_index:
+                self.saved_index = self.backlight.index
+                self.backlight.set_index(self.dim_level_index)
+                print("Auto-dimmed to low brightness after timeout")
+                self.dims += 1
+                if self.telemetry is not None:
+                    self.telemetry.auto_dim()
+        elif stage == STAGE_OFF:
+            if self.saved_index is None and self.backlight.index > 0:
+                self.saved_index = self.backlight.index
+            if self.backlight.index > 0:
+                self.backlight.set_index(0)
+                print("Backlight off after inactivity")
+                self.offs += 1
+                if self.telemetry is not None:
+                    self.telemetry.power_event('idle_off')
+        self.stage = stage
+        self.stage_since = now
+
+    # Activity
+
+    def activity(self, restore=True):
+        """Input seen; cheap unless the display is in an idle stage
+
+        restore=False is for inputs that set the backlight themselves
+        (the brightness buttons).
+        """
+        now = self.clock()
+        self.last_activity = now
+        if self.stage == STAGE_ACTIVE:
+            return
+
+        self.wakeups += 1
+        self._learn(now)
+        if restore and self.saved_index is not None:
+            self.backlight.set_index(self.saved_index)
+        self.saved_index = None
+        self.stage = STAGE_ACTIVE
+        self.stage_since = now
+        if self.loop is not None:
+            self._arm()
+
+    def _learn(self, now):
+        if not self.adaptive:
+            return
+        if self.stage == STAGE_DIM and now - self.stage_since <= REACTION_WINDOW:
+            # Dimmed while the user was still there
+            self.premature += 1
+            self.dim_timeout = min(MAX_DIM_TIMEOUT, self.dim_timeout * GROW_FACTOR)
+        elif self.stage == STAGE_OFF:
+            # The user was away long enough for the off stage: dim sooner
+            self.dim_timeout = max(MIN_DIM_TIMEOUT, self.dim_timeout * SHRINK_FACTOR)
+        else:
+            return
+        self.sync_driver_params(enable=False)
+        self.save_state()
+
+    # Driver power save
+
+    def sync_driver_params(self, enable=True):
+        """Panel standby follows the backlight off stage
+
+        enable=True (start-up) also turns auto_power_save on; later syncs
+        only move idle_timeout, so `powersave disable-powersave` holds.
+        """
+        if not self.sync_driver or not self.enabled() or self.last_stage() != STAGE_OFF:
+            return
+        sysfs = self.sysfs or default_sysfs()
+        timeout_ms = int(round(self.stage_deadline(STAGE_OFF))) * 1000
+        try:
+            if enable:
+                sysfs.param('auto_power_save').write('Y')
+            sysfs.param('idle_timeout').write(timeout_ms)
+        except OSError as e:
+            print(f"Warning: could not sync driver power save: {e}")
+
+    # Learned state
+
+    def load_state(self):
+        if not self.state_path or not self.adaptive:
+            return
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+            self.dim_timeout = min(MAX_DIM_TIMEOUT, max(MIN_DIM_TIMEOUT, float(state['dim_timeout'])))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def save_state(self):
+        if not self.state_path or not self.adaptive:
+            return
+        tmp = f"{self.state_path}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'dim_timeout': round(self.dim_timeout, 1)}, f)
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            print(f"Warning: could not save idle state: {e}")
+
+    def stats(self):
+        return {
+            'stage': STAGE_NAMES[self.stage],
+            'idle': round(self.clock() - self.last_activity, 1),
+            'dim_timeout': round(self.dim_timeout, 1),
+            'off_delay': self.off_delay,
+            'dims': self.dims,
+            'offs': self.offs,
+            'premature': self.premature,
+            'wakeups': self.wakeups,
+        }
+
+
+class InputActivity:
+    """Reads every input device from the loop and reports activity
+
+    Events are drained and only counted; IdleEngine.activity() just
+    stores a timestamp, so motion floods cost next to nothing.
+    """
+
+    def __init__(self, loop, on_activity, input_dir=INPUT_DIR, exclude=()):
+        self.loop = loop
+        self.on_activity = on_activity
+        self.input_dir = input_dir
+        self.exclude = set(exclude)
+        self.readers = {}
+        self.events = 0
+
+    def rescan(self):
+        """Attach new devices and drop vanished ones (call on hotplug)"""
+        paths = set(event_devices(self.input_dir)) - self.exclude
+        for path in list(self.readers):
+            if path not in paths:
+                self._detach(path)
+        for path in paths - set(self.readers):
+            try:
+                reader = EventReader(path)
+            except OSError:
+                continue
+            self.readers[path] = reader
+            self.loop.add_reader(reader.fileno(), self._on_input, path)
+
+    def _detach(self, path):
+        reader = self.readers.pop(path)
+        self.loop.remove_reader(reader.fileno())
+        reader.close()
+
+    def _on_input(self, path):
+        try:
+            events = self.readers[path].read()
+        except OSError:
+            self._detach(path)
+            return
+        if events:
+            self.events += len(events)
+            self.on_activity()
+
+    def close(self):
+        for path in list(self.readers):
+            self._detach(path)
@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+"""
+Input device helpers for the JDI button and power services
+Author: N@Xs - Enhanced Edition 2025
+
+Features:
+- Bulk evdev reader: many `input_event` structs per read() into a
+  preallocated buffer, unpacked in one go
+- Minimal inotify wrapper (ctypes) to follow /dev/input hotplug
+- Cached /proc/bus/input/devices lookup, invalidated on hotplug only
+- Event timestamps switchable to CLOCK_MONOTONIC (EVIOCSCLOCKID) so they
+  compare directly with time.monotonic_ns()
+- Configurable /dev/input and /proc roots (JDI_INPUT_DIR, JDI_PROC_ROOT)
+  so the tools can run against a simulated tree (jdi_harness.py)
+"""
+
+import os
+import time
+import fcntl
+import ctypes
+import struct
+
+# struct input_event: struct timeval time; __u16 type; __u16 code; __s32 value
+EVENT_FORMAT = 'llHHi'
+EVENT = struct.Struct(EVENT_FORMAT)
+EVENT_SIZE = EVENT.size
+
+EV_SYN = 0x00
+EV_KEY = 0x01
+KEY_PRESS = 1
+
+# _IOW('E', 0xa0, int): clock of the event timestamps
+EVIOCSCLOCKID = 0x400445a0
+
+INPUT_DIR = os.environ.get('JDI_INPUT_DIR', '/dev/input')
+DEVICES_PATH = os.path.join(os.environ.get('JDI_PROC_ROOT', '/proc'), 'bus/input/devices')
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    """Non-blocking inotify instance usable with epoll"""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.watches = {}
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.watches[wd] = path
+        return wd
+
+    def read_events(self):
+        """Return pending events as (path, mask, name) tuples"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            events.append((self.watches.get(wd), mask, name))
+        return events
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class EventReader:
+    """Non-blocking evdev reader that unpacks events in bulk"""
+
+    def __init__(self, path, batch=64):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+        self._buf = bytearray(EVENT_SIZE * batch)
+        self._view = memoryview(self._buf)
+        self.monotonic = False
+
+    def set_monotonic(self):
+        """Stamp events with CLOCK_MONOTONIC instead of CLOCK_REALTIME"""
+        try:
+            fcntl.ioctl(self.fd, EVIOCSCLOCKID, struct.pack('i', time.CLOCK_MONOTONIC))
+        except OSError:
+            return False
+        self.monotonic = True
+        return True
+
+    def read(self):
+        """Return all queued events as (sec, usec, type, code, value) tuples"""
+        events = []
+        while True:
+            try:
+                n = os.readv(self.fd, [self._buf])
+            except BlockingIOError:
+                return events
+            n -= n % EVENT_SIZE
+            events.extend(EVENT.iter_unpack(self._view[:n]))
+            if n < len(self._buf):
+                return events
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def parse_input_devices(content):
+    """Parse /proc/bus/input/devices into a list of dicts with name/handlers/lines"""
+    devices = []
+    for block in content.split('\n\n'):
+        lines = [line for line in block.split('\n') if line]
+        if not lines:
+            continue
+        device = {'name': '', 'handlers': [], 'lines': lines}
+        for line in lines:
+            if line.startswith('N: Name='):
+                device['name'] = line.split('=', 1)[1].strip().strip('"')
+            elif line.startswith('H: Handlers='):
+                device['handlers'] = line.split('=', 1)[1].split()
+        devices.append(device)
+    return devices
+
+
+def event_handler(device):
+    """The eventN handler of a parsed device, or None"""
+    for handler in device['handlers']:
+        if handler.startswith('event'):
+            return handler
+    return None
+
+
+class DeviceLookup:
+    """Finds an input device by name and caches the result
+
+    /proc/bus/input/devices is parsed once; the cached path stays valid
+    until invalidate() is called, typically on /dev/input hotplug.
+    """
+
+    def __init__(self, names, devices_path=DEVICES_PATH, input_dir=INPUT_DIR):
+        self.names = tuple(names)
+        self.devices_path = devices_path
+        self.input_dir = input_dir
+        self._cached = False
+        self._path = None
+
+    def invalidate(self):
+        self._cached = False
+
+    def find(self):
+        if not self._cached:
+            self._path = self._lookup()
+            self._cached = True
+        return self._path
+
+    def _lookup(self):
+        try:
+            with open(self.devices_path, 'r') as f:
+                devices = parse_input_devices(f.read())
+        except OSError:
+            return None
+
+        for device in devices:
+            if any(name in line for line in device['lines'] for name in self.names):
+                handler = event_handler(device)
+                if handler:
+                    return os.path.join(self.input_dir, handler)
+        return None
+
+
+def event_devices(input_dir=INPUT_DIR):
+    """All /dev/input/event* nodes"""
+    try:
+        names = os.listdir(input_dir)
+    except OSError:
+        return []
+    return sorted(os.path.join(input_dir, name) for name in names if name.startswith('event'))
@@ -0,0 +1,299 @@
+#!/usr/bin/python3
+"""
+Button-to-backlight latency tracing for the JDI tools
+Author: N@Xs - Enhanced Edition 2025
+
+Follows every button press from the kernel input_event timestamp to the
+completed sysfs write, so a "laggy" button can be pinned on evdev
+delivery, the Python handler or the PWM write.
+
+Features:
+- Stages stamped with time.monotonic_ns(); the evdev timestamp is the
+  start when the reader is switched to CLOCK_MONOTONIC
+- Per-stage histograms with power-of-two microsecond buckets: one
+  integer increment per sample, p50/p99 interpolated on demand
+- Driver button messages from /dev/kmsg traced as their own source
+- Report dumped on a signal (SIGUSR1) and a node-exporter textfile
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+
+from jdi_telemetry import TEXTFILE_DIR
+
+TEXTFILE_NAME = 'jdi_latency.prom'
+TEXTFILE_PATH = os.path.join(TEXTFILE_DIR, TEXTFILE_NAME)
+TRACE_ENV = 'JDI_TRACE_LATENCY'
+DUMP_SIGNAL = signal.SIGUSR1
+
+# Consecutive stages of one press and the interval each pair measures
+STAGES = ('event', 'read', 'handler', 'write')
+INTERVALS = {
+    ('event', 'read'): 'delivery',      # Kernel timestamp to userspace read
+    ('read', 'handler'): 'dispatch',    # Read to handler, debounce done
+    ('handler', 'write'): 'write',      # Handler to sysfs write completion
+}
+BUCKETS = 25            # 1 us .. 16.7 s
+MAX_PENDING = 16        # Presses waiting for their write
+STALE_NS = 5 * 10**9    # Presses that never led to a write are dropped
+
+
+class LatencyHistogram:
+    """Power-of-two microsecond buckets with interpolated percentiles"""
+
+    __slots__ = ('counts', 'count', 'sum_ns', 'max_ns')
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+
+    def add(self, ns):
+        ns = max(0, ns)
+        # Bucket i holds [2^(i-1), 2^i) microseconds
+        self.counts[min(BUCKETS - 1, (ns // 1000).bit_length())] += 1
+        self.count += 1
+        self.sum_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, q):
+        """Latency in ns below which a fraction q of the samples fall"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = (1 << (i - 1)) * 1000 if i else 0
+                high = (1 << i) * 1000
+                value = low + (high - low) * (rank - seen) / n
+                return int(min(value, self.max_ns))
+            seen += n
+        return self.max_ns
+
+    def summary(self):
+        ms = lambda ns: None if ns is None else round(ns / 1e6, 3)
+        return {
+            'count': self.count,
+            'p50_ms': ms(self.percentile(0.5)),
+            'p99_ms': ms(self.percentile(0.99)),
+            'mean_ms': ms(self.sum_ns // self.count) if self.count else None,
+            'max_ms': ms(self.max_ns),
+        }
+
+
+class LatencyTracer:
+    """Open traces per press, closed by the next backlight write
+
+    begin() opens a trace, mark('handler') stamps the newest one and
+    complete() stamps 'write' on every open trace and records the
+    intervals. Presses that were debounced are discard()ed.
+    """
+
+    def __init__(self, path=TEXTFILE_PATH, clock=time.monotonic_ns):
+        self.path = path
+        self.clock = clock
+        self.pending = []
+        self.histograms = {}
+
+        # Counters
+        self.traces = 0
+        self.completed = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls):
+        """Tracer if JDI_TRACE_LATENCY is set, else None"""
+        if os.environ.get(TRACE_ENV, '') in ('', '0'):
+            return None
+        return cls()
+
+    def _histogram(self, name):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = LatencyHistogram()
+        return hist
+
+    # Tracing
+
+    def begin(self, source, event_ns=None, read_ns=None):
+        """Open a trace; event_ns is the kernel timestamp in CLOCK_MONOTONIC"""
+        now = self.clock()
+        if self.pending and (len(self.pending) >= MAX_PENDING
+                             or now - self.pending[0]['stamps']['begin'] > STALE_NS):
+            self.pending.pop(0)
+            self.dropped += 1
+        stamps = {'begin': now, 'read': read_ns if read_ns is not None else now}
+        if event_ns is not None:
+            stamps['event'] = event_ns
+        trace = {'source': source, 'stamps': stamps}
+        self.pending.append(trace)
+        self.traces += 1
+        return trace
+
+    def mark(self, stage):
+        if self.pending:
+            self.pending[-1]['stamps'][stage] = self.clock()
+
+    def discard(self):
+        """Forget the newest trace (the press was debounced)"""
+        if self.pending:
+            self.pending.pop()
+            self.dropped += 1
+
+    def complete(self):
+        """A backlight write finished: close every open trace"""
+        if not self.pending:
+            return
+        now = self.clock()
+        for trace in self.pending:
+            stamps = trace['stamps']
+            stamps['write'] = now
+            self.record(trace['source'], stamps)
+        self.pending = []
+
+    def record(self, source, stamps):
+        """Add the intervals between the stamped stages"""
+        present = [s for s in STAGES if s in stamps]
+        for a, b in zip(present, present[1:]):
+            name = INTERVALS.get((a, b), f"{a}_to_{b}")
+            self._histogram((source, name)).add(stamps[b] - stamps[a])
+        if len(present) > 1:
+            self._histogram((source, 'total')).add(stamps[present[-1]] - stamps[present[0]])
+        self.completed += 1
+
+    def kmsg_message(self, ts_usec, message):
+        """Driver button IRQ path: printk timestamp to userspace read"""
+        if 'Button pressed' not in message:
+            return
+        self.record('driver', {'event': ts_usec * 1000, 'read': self.clock()})
+
+    # Reporting
+
+    def stats(self):
+        return {
+            'traces': self.traces,
+            'completed': self.completed,
+            'dropped': self.dropped,
+            'pending': len(self.pending),
+            'stages': {f"{source}/{name}": hist.summary()
+                       for (source, name), hist in sorted(self.histograms.items())},
+        }
+
+    def report(self):
+        s = self.stats()
+        lines = [f"Button latency: {s['completed']} presses traced, {s['dropped']} dropped"]
+        for name, h in s['stages'].items():
+            lines.append(f"  {name:20} n={h['count']:<6} p50 {h['p50_ms']:>9.3f} ms  "
+                         f"p99 {h['p99_ms']:>9.3f} ms  max {h['max_ms']:>9.3f} ms")
+        return '\n'.join(lines)
+
+    def render(self):
+        """Prometheus summary per source and stage"""
+        lines = [
+            '# HELP jdi_button_stage_latency_seconds Button press latency per stage',
+            '# TYPE jdi_button_stage_latency_seconds summary',
+        ]
+        for (source, name), hist in sorted(self.histograms.items()):
+            labels = f'source="{source}",stage="{name}"'
+            for q in (0.5, 0.99):
+                lines.append(f'jdi_button_stage_latency_seconds{{{labels},quantile="{q}"}} '
+                             f"{hist.percentile(q) / 1e9:.6f}")
+            lines.append(f"jdi_button_stage_latency_seconds_sum{{{labels}}} {hist.sum_ns / 1e9:.6f}")
+            lines.append(f"jdi_button_stage_latency_seconds_count{{{labels}}} {hist.count}")
+        lines += [
+            '# HELP jdi_button_traces_dropped_total Presses that never led to a write',
+            '# TYPE jdi_button_traces_dropped_total counter',
+            f"jdi_button_traces_dropped_total {self.dropped}",
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path=None):
+        """Atomically replace the textfile; False if its directory is missing"""
+        path = path or self.path
+        directory = os.path.dirname(path) or '.'
+        if not os.path.isdir(directory):
+            return False
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+        return True
+
+    def dump(self):
+        """Print the report and write the textfile (signal handler side)"""
+        print(self.report(), flush=True)
+        try:
+            self.write_textfile()
+        except OSError as e:
+            print(f"Warning: could not write latency textfile: {e}")
+
+    def install_signal(self, loop=None, sig=DUMP_SIGNAL):
+        """Dump on `sig`, from the event loop when there is one"""
+        if loop is not None:
+            loop.add_signal_handler(sig, self.dump)
+        else:
+            signal.signal(sig, lambda *_: self.dump())
+
+
+def read_textfile(path=TEXTFILE_PATH):
+    """Parse the textfile into {(source, stage): {'0.5': s, '0.99': s, 'count': n}}"""
+    stages = {}
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.startswith('jdi_button_stage_latency_seconds'):
+                continue
+            name, _, value = line.rpartition(' ')
+            metric, _, labels = name.partition('{')
+            fields = dict(item.split('=', 1) for item in labels.rstrip('}').split(','))
+            fields = {k: v.strip('"') for k, v in fields.items()}
+            entry = stages.setdefault((fields['source'], fields['stage']), {})
+            if 'quantile' in fields:
+                entry[fields['quantile']] = float(value)
+            elif metric.endswith('_count'):
+                entry['count'] = int(float(value))
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show JDI button latency traces')
+    parser.add_argument('--textfile', default=TEXTFILE_PATH, help='Textfile to read')
+    parser.add_argument('--pid', type=int, help='Ask a running service to dump first')
+    args = parser.parse_args()
+
+    if args.pid:
+        try:
+            before = os.stat(args.textfile).st_mtime_ns
+        except OSError:
+            before = None
+        try:
+            os.kill(args.pid, DUMP_SIGNAL)
+        except OSError as e:
+            print(f"Could not signal {args.pid}: {e}")
+            return 1
+        for _ in range(50):
+            try:
+                if os.stat(args.textfile).st_mtime_ns != before:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.02)
+
+    try:
+        stages = read_textfile(args.textfile)
+    except OSError as e:
+        print(f"No latency traces available: {e}")
+        return 1
+    for (source, stage), entry in sorted(stages.items()):
+        print(f"{source + '/' + stage:20} n={entry.get('count', 0):<6} "
+              f"p50 {entry.get('0.5', 0) * 1000:9.3f} ms  p99 {entry.get('0.99', 0) * 1000:9.3f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
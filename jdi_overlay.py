@@ -0,0 +1,587 @@
+#!/usr/bin/python3
+"""
+Userspace bindings for the SHARP overlay ioctls of the JDI DRM driver
+Author: N@Xs - Enhanced Edition 2025
+
+Wraps DRM_IOCTL_SHARP_REDRAW/REDRAW_ROWS and DRM_IOCTL_SHARP_OV_ADD/REM/
+SHOW/HIDE/CLEAR/DEFER from src/ioctl_iface.h with fcntl.ioctl.
+
+Features:
+- Pixels are passed to the driver straight from a NumPy array, bytes or
+  memoryview, the `struct sharp_overlay_t` points at the caller's buffer
+- Batched add+show with preallocated ioctl argument structs
+- Show/hide redraw only the rows the overlay covers (negative x/y anchored
+  to the right/bottom edge as in draw_overlays); inside batch() the
+  driver holds the redraws and the damaged rows go out in one flush
+- composite(): NumPy preview of what draw_overlays() puts in the line
+  buffer, to check overlay placement without the panel
+- FakeDrmDevice stand-in so the API runs without the panel
+"""
+
+import os
+import sys
+import fcntl
+import ctypes
+import argparse
+import contextlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Linux ioctl request encoding (asm-generic/ioctl.h)
+_IOC_NONE = 0
+_IOC_WRITE = 1
+_IOC_READ = 2
+
+
+def _IOC(direction, type_, nr, size):
+    return (direction << 30) | (size << 16) | (type_ << 8) | nr
+
+
+DRM_IOCTL_BASE = ord('d')
+DRM_COMMAND_BASE = 0x40
+
+
+def DRM_IO(nr):
+    return _IOC(_IOC_NONE, DRM_IOCTL_BASE, nr, 0)
+
+
+def DRM_IOW(nr, ctype):
+    return _IOC(_IOC_WRITE, DRM_IOCTL_BASE, nr, ctypes.sizeof(ctype))
+
+
+def DRM_IOWR(nr, ctype):
+    return _IOC(_IOC_READ | _IOC_WRITE, DRM_IOCTL_BASE, nr, ctypes.sizeof(ctype))
+
+
+class sharp_overlay_t(ctypes.Structure):
+    _fields_ = [
+        ('x', ctypes.c_int),
+        ('y', ctypes.c_int),
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('pixels', ctypes.c_void_p),
+    ]
+
+
+class sharp_memory_ioctl_ov_add_t(ctypes.Union):
+    _fields_ = [
+        ('in_overlay', ctypes.POINTER(sharp_overlay_t)),
+        ('out_storage', ctypes.c_void_p),
+    ]
+
+
+class sharp_memory_ioctl_ov_rem_t(ctypes.Structure):
+    _fields_ = [('storage', ctypes.c_void_p)]
+
+
+class sharp_memory_ioctl_ov_show_t(ctypes.Union):
+    _fields_ = [
+        ('in_storage', ctypes.c_void_p),
+        ('out_display', ctypes.c_void_p),
+    ]
+
+
+class sharp_memory_ioctl_ov_hide_t(ctypes.Structure):
+    _fields_ = [('display', ctypes.c_void_p)]
+
+
+class sharp_memory_ioctl_redraw_rows_t(ctypes.Structure):
+    _fields_ = [
+        ('y1', ctypes.c_int),
+        ('y2', ctypes.c_int),
+    ]
+
+
+class sharp_memory_ioctl_ov_defer_t(ctypes.Structure):
+    _fields_ = [('defer', ctypes.c_int)]
+
+
+DRM_SHARP_REDRAW = 0x00
+DRM_SHARP_REDRAW_ROWS = 0x01
+DRM_SHARP_OV_ADD = 0x10
+DRM_SHARP_OV_REM = 0x11
+DRM_SHARP_OV_SHOW = 0x12
+DRM_SHARP_OV_HIDE = 0x13
+DRM_SHARP_OV_CLEAR = 0x14
+DRM_SHARP_OV_DEFER = 0x15
+
+DRM_IOCTL_SHARP_REDRAW = DRM_IO(DRM_COMMAND_BASE + DRM_SHARP_REDRAW)
+DRM_IOCTL_SHARP_REDRAW_ROWS = DRM_IOW(DRM_COMMAND_BASE + DRM_SHARP_REDRAW_ROWS,
+                                      sharp_memory_ioctl_redraw_rows_t)
+DRM_IOCTL_SHARP_OV_ADD = DRM_IOWR(DRM_COMMAND_BASE + DRM_SHARP_OV_ADD,
+                                  sharp_memory_ioctl_ov_add_t)
+DRM_IOCTL_SHARP_OV_REM = DRM_IOW(DRM_COMMAND_BASE + DRM_SHARP_OV_REM,
+                                 sharp_memory_ioctl_ov_rem_t)
+DRM_IOCTL_SHARP_OV_SHOW = DRM_IOWR(DRM_COMMAND_BASE + DRM_SHARP_OV_SHOW,
+                                   sharp_memory_ioctl_ov_show_t)
+DRM_IOCTL_SHARP_OV_HIDE = DRM_IOW(DRM_COMMAND_BASE + DRM_SHARP_OV_HIDE,
+                                  sharp_memory_ioctl_ov_hide_t)
+DRM_IOCTL_SHARP_OV_CLEAR = DRM_IO(DRM_COMMAND_BASE + DRM_SHARP_OV_CLEAR)
+DRM_IOCTL_SHARP_OV_DEFER = DRM_IOW(DRM_COMMAND_BASE + DRM_SHARP_OV_DEFER,
+                                   sharp_memory_ioctl_ov_defer_t)
+
+# SPI driver name the DRM card is bound to (see src/main.c)
+SPI_DRIVER_NAME = 'jdi-drm-enhanced'
+DRM_CLASS_PATH = '/sys/class/drm'
+
+PANEL_WIDTH = 400
+PANEL_HEIGHT = 240
+MAX_GAP = 2     # Clean rows merged into a span instead of a second redraw, as in jdi_fb
+
+
+def find_card(class_path=DRM_CLASS_PATH):
+    """Find the /dev/dri node of the JDI panel, falling back to card0"""
+    try:
+        names = sorted(os.listdir(class_path))
+    except OSError:
+        names = []
+
+    for name in names:
+        if not name.startswith('card') or '-' in name:
+            continue
+        driver = os.path.join(class_path, name, 'device', 'driver')
+        if os.path.basename(os.path.realpath(driver)) == SPI_DRIVER_NAME:
+            return f"/dev/dri/{name}"
+    return '/dev/dri/card0'
+
+
+def buffer_address(buf):
+    """Return the address of a C-contiguous buffer without copying it"""
+    if np is not None and isinstance(buf, np.ndarray):
+        if not buf.flags['C_CONTIGUOUS']:
+            raise ValueError("Overlay pixels must be C-contiguous")
+        return buf.ctypes.data
+
+    view = memoryview(buf)
+    if not view.c_contiguous:
+        raise ValueError("Overlay pixels must be C-contiguous")
+    if not view.readonly:
+        return ctypes.addressof(ctypes.c_char.from_buffer(view))
+    if np is not None:
+        return np.frombuffer(view, dtype=np.uint8).ctypes.data
+    if isinstance(buf, bytes):
+        return ctypes.cast(ctypes.c_char_p(buf), ctypes.c_void_p).value
+    raise ValueError("Read-only overlay buffers need NumPy or bytes")
+
+
+def pixel_shape(pixels, width=None, height=None):
+    """Work out (width, height) of an overlay pixel buffer"""
+    shape = getattr(pixels, 'shape', None)
+    if shape is None:
+        shape = memoryview(pixels).shape
+    if width is None or height is None:
+        if len(shape) != 2:
+            raise ValueError("Pass width and height for 1-D overlay buffers")
+        height, width = shape
+    if memoryview(pixels).nbytes < width * height:
+        raise ValueError(f"Overlay buffer smaller than {width}x{height}")
+    return width, height
+
+
+def anchor(x, y, panel_width=PANEL_WIDTH, panel_height=PANEL_HEIGHT):
+    """Screen position of an overlay, negative x/y count from the right/bottom edge"""
+    return (panel_width + x if x < 0 else x), (panel_height + y if y < 0 else y)
+
+
+def overlay_rows(y, height, panel_height=PANEL_HEIGHT):
+    """Rows [y1, y2) an overlay covers on the panel, None when it is off screen"""
+    if y < 0:
+        y += panel_height
+    y1, y2 = max(0, y), min(panel_height, y + height)
+    return (y1, y2) if y1 < y2 else None
+
+
+def merge_spans(spans, max_gap=MAX_GAP):
+    """Sorted row spans, those at most `max_gap` rows apart merged into one"""
+    merged = []
+    for y1, y2 in sorted(spans):
+        if merged and y1 - merged[-1][1] <= max_gap:
+            merged[-1][1] = max(merged[-1][1], y2)
+        else:
+            merged.append([y1, y2])
+    return [tuple(span) for span in merged]
+
+
+def composite(frame, overlays, rows=None, panel_width=None, panel_height=None):
+    """Line buffer draw_overlays() leaves for `frame`, as a new array
+
+    `frame` is the converted framebuffer: (H, W) gray8 in mono mode or
+    (H, W, 3) RGB888 in color mode, where the gray8 overlay pixels go to
+    all three channels. `overlays` are (x, y, width, height, pixels) in
+    drawing order, later ones on top (FakeDrmDevice.visible_overlays()).
+    `rows` restricts the result to one redraw clip (y1, y2) like the
+    driver's per-update buffer.
+    """
+    if np is None:
+        raise RuntimeError("composite() needs NumPy")
+    frame = np.asarray(frame, dtype=np.uint8)
+    panel_height = panel_height or frame.shape[0]
+    panel_width = panel_width or frame.shape[1]
+    y1, y2 = rows if rows is not None else (0, frame.shape[0])
+    out = frame[y1:y2].copy()
+
+    for x, y, width, height, pixels in overlays:
+        ox, oy = anchor(x, y, panel_width, panel_height)
+        # Intersection with the clip, in screen coordinates
+        top, bottom = max(oy, y1), min(oy + height, y2)
+        left, right = max(ox, 0), min(ox + width, frame.shape[1])
+        if top >= bottom or left >= right:
+            continue
+        src = np.frombuffer(pixels, dtype=np.uint8, count=width * height).reshape(height, width)
+        patch = src[top - oy:bottom - oy, left - ox:right - ox]
+        if out.ndim == 3:
+            patch = patch[:, :, None]
+        out[top - y1:bottom - y1, left:right] = patch
+    return out
+
+
+class DrmDevice:
+    """DRM card file descriptor issuing raw ioctls"""
+
+    def __init__(self, path=None):
+        self.path = path or find_card()
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CLOEXEC)
+
+    def ioctl(self, request, arg=None):
+        if arg is None:
+            return fcntl.ioctl(self.fd, request)
+        return fcntl.ioctl(self.fd, request, arg, True)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class FakeDrmDevice:
+    """Stand-in for the DRM card implementing the overlay ioctls in Python
+
+    Keeps the same storage/visible lists as src/drm_iface.c. Pixels are
+    copied out of the caller's buffer at OV_ADD time like kmemdup(). Every
+    redraw is recorded as its (y1, y2) row span in `redrawn`.
+    """
+
+    def __init__(self, width=400, height=240):
+        self.path = '<fake>'
+        self.width = width
+        self.height = height
+        self.storage = {}       # handle -> (x, y, width, height, pixels)
+        self.displays = {}      # handle -> storage handle
+        self.visible = []       # display handles in g_visible_overlays order
+        self.deferred = False   # Per open file (drm_file->driver_priv)
+        self.redrawn = []
+        self.redraws = 0
+        self.calls = 0
+        self._next_handle = 0x1000
+
+    def _handle(self):
+        self._next_handle += 0x40
+        return self._next_handle
+
+    def _redraw(self, y1, y2):
+        # drm_redraw_rows(): clamped, nothing for an empty range
+        y1, y2 = max(0, y1), min(self.height, y2)
+        if y1 < y2:
+            self.redraws += 1
+            self.redrawn.append((y1, y2))
+
+    def _redraw_overlay(self, storage):
+        if not self.deferred:
+            _, y, _, height, _ = self.storage[storage]
+            self._redraw(*(overlay_rows(y, height, self.height) or (0, 0)))
+
+    def ioctl(self, request, arg=None):
+        self.calls += 1
+        if request == DRM_IOCTL_SHARP_REDRAW:
+            self._redraw(0, self.height)
+        elif request == DRM_IOCTL_SHARP_REDRAW_ROWS:
+            self._redraw(arg.y1, arg.y2)
+        elif request == DRM_IOCTL_SHARP_OV_ADD:
+            ov = sharp_overlay_t.from_address(ctypes.addressof(arg.in_overlay.contents))
+            pixels = ctypes.string_at(ov.pixels, ov.width * ov.height)
+            handle = self._handle()
+            self.storage[handle] = (ov.x, ov.y, ov.width, ov.height, pixels)
+            arg.out_storage = handle
+        elif request == DRM_IOCTL_SHARP_OV_REM:
+            del self.storage[arg.storage]
+        elif request == DRM_IOCTL_SHARP_OV_SHOW:
+            storage = arg.in_storage
+            if storage not in self.storage:
+                raise OSError(22, "Unknown overlay storage")
+            handle = self._handle()
+            self.displays[handle] = storage
+            self.visible.append(handle)
+            arg.out_display = handle
+            self._redraw_overlay(storage)
+        elif request == DRM_IOCTL_SHARP_OV_HIDE:
+            storage = self.displays.pop(arg.display)
+            self.visible.remove(arg.display)
+            self._redraw_overlay(storage)
+        elif request == DRM_IOCTL_SHARP_OV_CLEAR:
+            self.storage.clear()
+            self.displays.clear()
+            self.visible.clear()
+        elif request == DRM_IOCTL_SHARP_OV_DEFER:
+            self.deferred = bool(arg.defer)
+        else:
+            raise OSError(25, "Inappropriate ioctl for device")
+        return 0
+
+    def visible_overlays(self):
+        """Visible overlays in drawing order as (x, y, width, height, pixels)"""
+        return [self.storage[self.displays[handle]] for handle in self.visible]
+
+    def composite(self, frame, rows=None):
+        """What the driver would send for `frame` with the visible overlays"""
+        return composite(frame, self.visible_overlays(), rows, self.width, self.height)
+
+    def close(self):
+        # postclose: a client that exits mid-batch gets a full redraw
+        if self.deferred:
+            self.deferred = False
+            self._redraw(0, self.height)
+
+
+class SharpOverlay:
+    """Overlay API on top of the SHARP DRM ioctls
+
+    Storage handles returned by add() and display handles returned by
+    show() are the opaque kernel pointers handed out by the driver.
+    """
+
+    def __init__(self, device=None, max_gap=MAX_GAP):
+        if device is None or isinstance(device, str):
+            device = DrmDevice(device)
+        self.device = device
+        self.panel_width = getattr(device, 'width', PANEL_WIDTH)
+        self.panel_height = getattr(device, 'height', PANEL_HEIGHT)
+        self.max_gap = max_gap
+
+        # Placement of every storage handle, the storage behind every display
+        self.placements = {}
+        self.displayed = {}
+
+        # Batch state: rows changed by show/hide while the driver holds redraws
+        self.damage = []
+        self._depth = 0
+        self._deferred = False
+        self._rows_supported = True
+
+        # Counters
+        self.flushes = 0
+        self.rows_redrawn = 0
+
+        # Reused ioctl argument structs
+        self._overlay = sharp_overlay_t()
+        self._add = sharp_memory_ioctl_ov_add_t()
+        self._rem = sharp_memory_ioctl_ov_rem_t()
+        self._show = sharp_memory_ioctl_ov_show_t()
+        self._hide = sharp_memory_ioctl_ov_hide_t()
+        self._rows = sharp_memory_ioctl_redraw_rows_t()
+        self._defer = sharp_memory_ioctl_ov_defer_t()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.device.close()
+
+    def add(self, pixels, x=0, y=0, width=None, height=None):
+        """Store an overlay of gray8 pixels, returns the storage handle
+
+        Negative x/y anchor the overlay to the right/bottom edge like
+        draw_overlays(). The buffer is read in place by the driver.
+        """
+        width, height = pixel_shape(pixels, width, height)
+        self._overlay.x = x
+        self._overlay.y = y
+        self._overlay.width = width
+        self._overlay.height = height
+        self._overlay.pixels = buffer_address(pixels)
+        self._add.in_overlay = ctypes.pointer(self._overlay)
+        self.device.ioctl(DRM_IOCTL_SHARP_OV_ADD, self._add)
+        storage = self._add.out_storage
+        self.placements[storage] = (x, y, width, height)
+        return storage
+
+    def remove(self, storage):
+        """Free overlay storage (hide it first if it is shown)"""
+        self._rem.storage = storage
+        self.device.ioctl(DRM_IOCTL_SHARP_OV_REM, self._rem)
+        self.placements.pop(storage, None)
+
+    def rows(self, storage):
+        """Rows [y1, y2) a stored overlay covers, None when off screen or unknown"""
+        placement = self.placements.get(storage)
+        if placement is None:
+            return None
+        _, y, _, height = placement
+        return overlay_rows(y, height, self.panel_height)
+
+    def _damage(self, storage):
+        if not self._deferred:
+            return
+        rows = self.rows(storage)
+        if rows is not None:
+            self.damage.append(rows)
+        elif storage not in self.placements:
+            # Added by someone else: placement unknown, redraw everything
+            self.damage.append((0, self.panel_height))
+
+    def show(self, storage):
+        """Show stored overlay, returns the display handle
+
+        The driver redraws the rows under the overlay, or holds the
+        redraw for the batch flush inside batch().
+        """
+        self._show.in_storage = storage
+        self.device.ioctl(DRM_IOCTL_SHARP_OV_SHOW, self._show)
+        display = self._show.out_display
+        self.displayed[display] = storage
+        self._damage(storage)
+        return display
+
+    def hide(self, display):
+        """Hide a shown overlay (redraws its rows, see show())"""
+        self._hide.display = display
+        self.device.ioctl(DRM_IOCTL_SHARP_OV_HIDE, self._hide)
+        self._damage(self.displayed.pop(display, None))
+
+    def clear(self):
+        """Hide and free every overlay"""
+        self.device.ioctl(DRM_IOCTL_SHARP_OV_CLEAR)
+        self.placements.clear()
+        self.displayed.clear()
+
+    def redraw(self):
+        """Redraw the whole framebuffer"""
+        self.device.ioctl(DRM_IOCTL_SHARP_REDRAW)
+
+    def redraw_rows(self, y1, y2):
+        """Redraw rows [y1, y2) (the whole framebuffer on drivers without REDRAW_ROWS)"""
+        if self._rows_supported:
+            self._rows.y1 = y1
+            self._rows.y2 = y2
+            try:
+                self.device.ioctl(DRM_IOCTL_SHARP_REDRAW_ROWS, self._rows)
+                self.rows_redrawn += max(0, min(y2, self.panel_height) - max(y1, 0))
+                return
+            except OSError:
+                self._rows_supported = False
+        self.redraw()
+        self.rows_redrawn += self.panel_height
+
+    def flush(self):
+        """Redraw the rows damaged in the batch, returns the spans sent"""
+        spans = merge_spans(self.damage, self.max_gap)
+        self.damage = []
+        for y1, y2 in spans:
+            self.redraw_rows(y1, y2)
+        if spans:
+            self.flushes += 1
+        return spans
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Hold the driver's show/hide redraws and flush the rows once at the end
+
+        Batches nest; only the outermost one flushes. Drivers without
+        OV_DEFER redraw on every call as before.
+        """
+        self._depth += 1
+        if self._depth == 1:
+            self._defer.defer = 1
+            try:
+                self.device.ioctl(DRM_IOCTL_SHARP_OV_DEFER, self._defer)
+                self._deferred = True
+            except OSError:
+                self._deferred = False
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if self._depth == 0 and self._deferred:
+                self._defer.defer = 0
+                self.device.ioctl(DRM_IOCTL_SHARP_OV_DEFER, self._defer)
+                self._deferred = False
+                self.flush()
+
+    def stats(self):
+        return {
+            'stored': len(self.placements),
+            'visible': len(self.displayed),
+            'flushes': self.flushes,
+            'rows_redrawn': self.rows_redrawn,
+        }
+
+    def add_and_show(self, pixels, x=0, y=0, width=None, height=None):
+        """Store and show an overlay, returns (storage, display)"""
+        storage = self.add(pixels, x, y, width, height)
+        return storage, self.show(storage)
+
+    def add_and_show_many(self, overlays):
+        """Store every overlay first, then show them in order
+
+        `overlays` is an iterable of (pixels, x, y) tuples. Returns a list
+        of (storage, display) pairs.
+        """
+        storages = [self.add(pixels, x, y) for pixels, x, y in overlays]
+        with self.batch():
+            return [(storage, self.show(storage)) for storage in storages]
+
+    def hide_many(self, displays):
+        """Hide several shown overlays, one flush"""
+        with self.batch():
+            for display in displays:
+                self.hide(display)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JDI overlay control')
+    parser.add_argument('command', choices=['redraw', 'clear', 'show'])
+    parser.add_argument('file', nargs='?', help='Raw gray8 overlay pixels (show)')
+    parser.add_argument('--x', type=int, default=0)
+    parser.add_argument('--y', type=int, default=0)
+    parser.add_argument('--width', type=int)
+    parser.add_argument('--height', type=int)
+    parser.add_argument('--rows', type=int, nargs=2, metavar=('Y1', 'Y2'),
+                        help='Redraw only rows [Y1, Y2) (redraw)')
+    parser.add_argument('--device', help='DRM card (default: auto-detect)')
+    args = parser.parse_args()
+
+    try:
+        overlay = SharpOverlay(args.device)
+    except OSError as e:
+        print(f"Error opening DRM device: {e}")
+        return 1
+
+    with overlay:
+        if args.command == 'redraw':
+            if args.rows:
+                overlay.redraw_rows(*args.rows)
+            else:
+                overlay.redraw()
+        elif args.command == 'clear':
+            overlay.clear()
+        else:
+            if not args.file or args.width is None or args.height is None:
+                print("show needs a file, --width and --height")
+                return 1
+            with open(args.file, 'rb') as f:
+                pixels = f.read()
+            storage, display = overlay.add_and_show(pixels, args.x, args.y,
+                                                    args.width, args.height)
+            rows = overlay.rows(storage)
+            print(f"storage=0x{storage:x} display=0x{display:x} "
+                  f"rows={f'{rows[0]}-{rows[1]}' if rows else 'none'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+"""
+Bounded overlay cache for the JDI DRM driver overlay storage
+Author: N@Xs - Enhanced Edition 2025
+
+Every DRM_IOCTL_SHARP_OV_ADD kmemdup()s the pixels into g_overlays and
+nothing limits how many entries pile up there. draw_overlays() also walks
+every visible overlay on each dirty update. This manager sits on top of
+SharpOverlay and keeps both bounded.
+
+Features:
+- Overlays keyed by content hash (pixels + placement), storage reused
+- Least-recently-shown eviction through OV_REM once a byte budget is exceeded
+- Cap on the number of visible overlays to bound per-update compositing cost
+- The hides a show() causes are redrawn together with it (SharpOverlay.batch)
+"""
+
+import hashlib
+from collections import OrderedDict
+
+from jdi_overlay import SharpOverlay, pixel_shape
+
+DEFAULT_BYTE_BUDGET = 256 * 1024
+DEFAULT_MAX_VISIBLE = 8
+
+
+def overlay_key(pixels, x, y, width, height):
+    """Content hash of an overlay, placement included"""
+    digest = hashlib.blake2b(memoryview(pixels).cast('B'), digest_size=16).hexdigest()
+    return f"{digest}:{x}:{y}:{width}x{height}"
+
+
+class _Entry:
+    __slots__ = ('storage', 'display', 'nbytes')
+
+    def __init__(self, storage, nbytes):
+        self.storage = storage
+        self.display = None
+        self.nbytes = nbytes
+
+
+class OverlayCache:
+    """LRU cache of driver overlay storage with a visible-list cap"""
+
+    def __init__(self, overlay=None, byte_budget=DEFAULT_BYTE_BUDGET,
+                 max_visible=DEFAULT_MAX_VISIBLE):
+        self.overlay = overlay if overlay is not None else SharpOverlay()
+        self.byte_budget = byte_budget
+        self.max_visible = max_visible
+
+        # Least recently shown first
+        self.entries = OrderedDict()
+        self.stored_bytes = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.auto_hides = 0
+
+    def visible_keys(self):
+        """Keys of visible overlays, least recently shown first"""
+        return [key for key, entry in self.entries.items() if entry.display is not None]
+
+    def show(self, pixels, x=0, y=0, width=None, height=None):
+        """Show an overlay, reusing stored pixels when the content is known
+
+        Returns the cache key used for hide()/release().
+        """
+        with self.overlay.batch():
+            return self._show(pixels, x, y, width, height)
+
+    def _show(self, pixels, x, y, width, height):
+        # Auto-hides, evictions and the show itself go out as one redraw
+        width, height = pixel_shape(pixels, width, height)
+        key = overlay_key(pixels, x, y, width, height)
+
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            storage = self.overlay.add(pixels, x, y, width, height)
+            entry = _Entry(storage, width * height)
+            self.entries[key] = entry
+            self.stored_bytes += entry.nbytes
+        else:
+            self.hits += 1
+        self.entries.move_to_end(key)
+
+        if entry.display is None:
+            self._limit_visible(self.max_visible - 1)
+            entry.display = self.overlay.show(entry.storage)
+
+        self._limit_bytes()
+        return key
+
+    def hide(self, key):
+        """Hide an overlay but keep its storage for later reuse"""
+        entry = self.entries.get(key)
+        if entry is not None and entry.display is not None:
+            self.overlay.hide(entry.display)
+            entry.display = None
+
+    def release(self, key):
+        """Hide an overlay and free its storage in the driver"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._drop(entry)
+
+    def clear(self):
+        """Hide and free every overlay (OV_CLEAR)"""
+        self.overlay.clear()
+        self.entries.clear()
+        self.stored_bytes = 0
+
+    def _drop(self, entry):
+        if entry.display is not None:
+            self.overlay.hide(entry.display)
+            entry.display = None
+        self.overlay.remove(entry.storage)
+        self.stored_bytes -= entry.nbytes
+
+    def _limit_visible(self, limit):
+        visible = self.visible_keys()
+        for key in visible[:max(0, len(visible) - limit)]:
+            self.hide(key)
+            self.auto_hides += 1
+
+    def _limit_bytes(self):
+        # Hidden entries go first, visible ones only if that is not enough
+        for only_hidden in (True, False):
+            for key in list(self.entries):
+                if self.stored_bytes <= self.byte_budget or len(self.entries) <= 1:
+                    return
+                entry = self.entries[key]
+                if only_hidden and entry.display is not None:
+                    continue
+                del self.entries[key]
+                self._drop(entry)
+                self.evictions += 1
+
+    def stats(self):
+        """Cache counters"""
+        return {
+            'entries': len(self.entries),
+            'visible': len(self.visible_keys()),
+            'stored_bytes': self.stored_bytes,
+            'byte_budget': self.byte_budget,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'auto_hides': self.auto_hides,
+        }
@@ -0,0 +1,257 @@
+#!/usr/bin/python3
+"""
+Perceptual RGB to 8-color quantization for the JDI panel
+Author: N@Xs - Enhanced Edition 2025
+
+The 8-color path thresholds every channel on its own against one
+color_cutoff (rgb_to_3bit_color() in src/display.c uses a fixed 127),
+which turns skin tones and UI palettes into the wrong primaries. This
+maps every RGB value to the nearest of the 8 panel colors in OKLab
+instead, through a precomputed lookup table.
+
+Features:
+- 3D LUT of 32x32x32 (default) up to the full 256x256x256 RGB cube
+- color_cutoff kept meaningful: on the gray axis the split between black
+  and white falls exactly at the cutoff, like the driver's threshold
+- Configurable gamma and chroma weight
+- Tables cached on disk (JDI_CACHE_DIR, default ~/.cache/jdi), keyed by
+  their parameters, and memory-mapped when loaded
+- Whole frames quantized with a single np.take into 0/255 XRGB8888
+  pixels the driver passes through unchanged
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
+
+import jdi_encoder
+
+CACHE_DIR = os.environ.get('JDI_CACHE_DIR', os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'jdi'))
+LUT_VERSION = 1
+LUT_SIZE = 32
+GAMMA = 2.2
+# OKLab a/b differences count this much more than lightness, so neutral
+# grays never snap to a primary of similar lightness
+CHROMA_WEIGHT = 4.0
+MAX_TABLE_SIZE = 64     # Bigger LUTs keep palette indices, not XRGB values
+
+# Panel colors by 3-bit index (r << 2 | g << 1 | b)
+PANEL_RGB = np.array([[(i >> 2) & 1, (i >> 1) & 1, i & 1] for i in range(8)],
+                     dtype=np.uint8) * 255
+PANEL_XRGB = (0xff000000 | PANEL_RGB[:, 0].astype(np.uint32) << 16
+              | PANEL_RGB[:, 1].astype(np.uint32) << 8 | PANEL_RGB[:, 2]).astype(np.uint32)
+
+# Linear sRGB to OKLab (Bjorn Ottosson)
+_LMS = np.array([[0.4122214708, 0.5363325363, 0.0514459929],
+                 [0.2119034982, 0.6806757080, 0.1073288098],
+                 [0.0883024619, 0.2817188376, 0.6299787005]])
+_LAB = np.array([[0.2104542553, 0.7936177850, -0.0040720468],
+                 [1.9779984951, -2.4285922050, 0.4505937099],
+                 [0.0259040371, 0.7827717662, -0.8086757660]])
+
+
+def rgb_to_oklab(rgb, gamma=GAMMA):
+    """(..., 3) RGB in 0-255 to OKLab"""
+    linear = (np.asarray(rgb, dtype=np.float64) / 255.0) ** gamma
+    return np.cbrt(linear @ _LMS.T) @ _LAB.T
+
+
+def gray_midpoint(gamma=GAMMA):
+    """Gray level whose OKLab lightness is halfway between black and white"""
+    return 255.0 * 0.125 ** (1.0 / gamma)
+
+
+def tone_curve(values, cutoff, gamma=GAMMA):
+    """Piecewise-linear curve that moves `cutoff` onto the gray midpoint"""
+    mid = gray_midpoint(gamma)
+    values = np.asarray(values, dtype=np.float64)
+    cutoff = min(254.5, max(0.5, cutoff - 0.5))
+    return np.where(values < cutoff, values * mid / cutoff,
+                    mid + (values - cutoff) * (255.0 - mid) / (255.0 - cutoff))
+
+
+def build_lut(size=LUT_SIZE, cutoff=jdi_encoder.DEFAULT_COLOR_CUTOFF, gamma=GAMMA,
+              chroma_weight=CHROMA_WEIGHT):
+    """(size ** 3) uint8 panel color indices for RGB cell centres"""
+    levels = (np.arange(size) + 0.5) * (256.0 / size) - 0.5
+    curved = tone_curve(levels, cutoff, gamma)
+    weights = np.array([1.0, chroma_weight, chroma_weight])
+    palette = rgb_to_oklab(PANEL_RGB, gamma)
+
+    g, b = np.meshgrid(curved, curved, indexing='ij')
+    gb = np.stack((g.ravel(), b.ravel()), axis=1)
+    lut = np.empty((size, size * size), dtype=np.uint8)
+    for i, r in enumerate(curved):
+        # One red plane at a time keeps the full cube within memory
+        rgb = np.column_stack((np.full(len(gb), r), gb))
+        lab = rgb_to_oklab(rgb, gamma)
+        distance = ((lab[:, np.newaxis, :] - palette[np.newaxis, :, :]) ** 2 * weights).sum(axis=2)
+        lut[i] = distance.argmin(axis=1)
+    return lut.ravel()
+
+
+def lut_key(size, cutoff, gamma, chroma_weight):
+    params = {'version': LUT_VERSION, 'size': size, 'cutoff': int(cutoff),
+              'gamma': round(float(gamma), 4), 'chroma_weight': round(float(chroma_weight), 4)}
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def as_xrgb32(frame):
+    """gray8, RGB888 (H, W, 3) or XRGB8888 frame as (H, W) uint32"""
+    frame = np.asarray(frame)
+    if frame.dtype == np.uint32 and frame.ndim == 2:
+        return frame
+    if frame.dtype == np.uint8 and frame.ndim == 2:
+        gray = frame.astype(np.uint32)
+        return gray << 16 | gray << 8 | gray
+    if frame.dtype == np.uint8 and frame.ndim == 3 and frame.shape[2] == 3:
+        rgb = frame.astype(np.uint32)
+        return rgb[:, :, 0] << 16 | rgb[:, :, 1] << 8 | rgb[:, :, 2]
+    if frame.dtype == np.uint8 and frame.ndim == 3 and frame.shape[2] == 4:
+        return np.ascontiguousarray(frame).view(np.uint32)[:, :, 0]
+    raise ValueError(f"Unsupported frame {frame.dtype} {frame.shape}")
+
+
+class ColorLUT:
+    """RGB to panel color lookup table for one (size, cutoff, gamma)"""
+
+    def __init__(self, size=LUT_SIZE, cutoff=jdi_encoder.DEFAULT_COLOR_CUTOFF, gamma=GAMMA,
+                 chroma_weight=CHROMA_WEIGHT, cache_dir=CACHE_DIR):
+        if size & (size - 1) or not 2 <= size <= 256:
+            raise ValueError(f"LUT size must be a power of two between 2 and 256, got {size}")
+        self.size = size
+        self.bits = size.bit_length() - 1
+        self.cutoff = cutoff
+        self.gamma = gamma
+        self.chroma_weight = chroma_weight
+        self.cache_dir = cache_dir
+        self.path = None
+        self.cached = False
+        self.build_s = 0.0
+
+        self.index = self._load()
+        # Small tables hold the XRGB values so apply() is one take
+        self.table = PANEL_XRGB.take(self.index) if size <= MAX_TABLE_SIZE else None
+
+    def _load(self):
+        if self.cache_dir:
+            self.path = os.path.join(self.cache_dir,
+                                     f"lut-{lut_key(self.size, self.cutoff, self.gamma, self.chroma_weight)}.npy")
+            try:
+                index = np.load(self.path, mmap_mode='r')
+                if index.shape == (self.size ** 3,) and index.dtype == np.uint8:
+                    self.cached = True
+                    return index
+            except (OSError, ValueError):
+                pass
+
+        started = time.perf_counter()
+        index = build_lut(self.size, self.cutoff, self.gamma, self.chroma_weight)
+        self.build_s = time.perf_counter() - started
+        if self.path:
+            self._save(index)
+        return index
+
+    def _save(self, index):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp.npy"
+            np.save(tmp, index)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"Warning: could not cache LUT: {e}")
+
+    def cells(self, xrgb):
+        """Flat LUT cell of every (H, W) uint32 pixel"""
+        k = self.bits
+        mask = np.uint32(self.size - 1)
+        return (((xrgb >> np.uint32(24 - k)) & mask) << np.uint32(2 * k)
+                | ((xrgb >> np.uint32(16 - k)) & mask) << np.uint32(k)
+                | ((xrgb >> np.uint32(8 - k)) & mask))
+
+    def apply(self, frame):
+        """Quantize a frame to 0/255 XRGB8888 (H, W, 4) uint8 pixels"""
+        xrgb = as_xrgb32(frame)
+        cells = self.cells(xrgb)
+        if self.table is not None:
+            out = self.table.take(cells)
+        else:
+            out = PANEL_XRGB.take(self.index.take(cells))
+        return out.view(np.uint8).reshape(xrgb.shape + (4,))
+
+    def panel_indices(self, frame):
+        """3-bit panel color index (r << 2 | g << 1 | b) of every pixel"""
+        return np.asarray(self.index).take(self.cells(as_xrgb32(frame)))
+
+
+def threshold_indices(frame, cutoff):
+    """Panel color indices the driver's per-channel threshold produces"""
+    xrgb = as_xrgb32(frame)
+    r = (xrgb >> 16) & 0xff
+    g = (xrgb >> 8) & 0xff
+    b = xrgb & 0xff
+    return ((r >= cutoff).astype(np.uint8) << 2 | (g >= cutoff).astype(np.uint8) << 1
+            | (b >= cutoff).astype(np.uint8))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantize frames to the 8 panel colors')
+    parser.add_argument('image', nargs='?', help='PPM or raw 400x240 frame')
+    parser.add_argument('--size', type=int, default=LUT_SIZE, help='LUT cells per channel')
+    parser.add_argument('--cutoff', type=int, help='color_cutoff (default: driver value)')
+    parser.add_argument('--gamma', type=float, default=GAMMA)
+    parser.add_argument('--chroma-weight', type=float, default=CHROMA_WEIGHT)
+    parser.add_argument('--output', help='Write the quantized frame as PPM')
+    parser.add_argument('--fb', help='Write the quantized frame to a framebuffer device')
+    parser.add_argument('--bench', type=int, metavar='FRAMES', help='Time apply() on the image')
+    parser.add_argument('--no-cache', action='store_true', help='Always rebuild the table')
+    args = parser.parse_args()
+
+    cutoff = args.cutoff
+    if cutoff is None:
+        cutoff = jdi_encoder.read_params()['color_cutoff']
+    try:
+        lut = ColorLUT(args.size, cutoff, args.gamma, args.chroma_weight,
+                       None if args.no_cache else CACHE_DIR)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    source = 'cache' if lut.cached else f"built in {lut.build_s * 1000:.0f} ms"
+    print(f"LUT {args.size}^3, cutoff {cutoff}, gamma {args.gamma:g} ({source})")
+    if not args.image:
+        return 0
+
+    import jdi_dither
+    try:
+        frame = jdi_dither.load_frame(args.image)
+    except (OSError, ValueError) as e:
+        print(f"Error loading {args.image}: {e}")
+        return 1
+
+    out = lut.apply(frame)
+    changed = (lut.panel_indices(frame) != threshold_indices(frame, cutoff)).mean()
+    print(f"{changed * 100:.1f}% of pixels differ from the per-channel threshold")
+
+    if args.bench:
+        started = time.perf_counter()
+        for _ in range(args.bench):
+            lut.apply(frame)
+        elapsed = time.perf_counter() - started
+        print(f"apply(): {elapsed * 1000 / args.bench:.2f} ms/frame")
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(f"P6 {out.shape[1]} {out.shape[0]} 255\n".encode())
+            f.write(np.ascontiguousarray(out[:, :, 2::-1]).tobytes())
+    if args.fb:
+        jdi_dither.write_framebuffer(out, args.fb)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,284 @@
+#!/usr/bin/python3
+"""
+Transactional display profile engine for the JDI LPM027M128C
+Author: N@Xs - Enhanced Edition 2025
+
+All display profiles used by monoset, lpm027-optimizer.sh,
+optimize_display.sh and powersave.py are declared here once. Applying a
+profile reads the current /sys/module/jdi_drm_enhanced/parameters/*
+values, writes only the differences in this one process and rolls back
+everything already written if any write fails.
+
+Features:
+- Single profile table (reflective, mip-optimize, 8colors, high-contrast,
+  low-power, performance, battery, quality, ...)
+- Diff-only writes through persistent sysfs attributes
+- Rollback on failure
+- --dry-run diff mode
+"""
+
+import sys
+import argparse
+
+from jdi_sysfs import default_sysfs
+
+# Profile values. 'brightness' is the PWM backlight level (clamped to
+# max_brightness); 'if_color'/'if_mono' apply depending on the color mode
+# the profile ends up in.
+PROFILES = {
+    '8colors': {
+        'color': 'Y',
+        'color_cutoff': 110,
+        'dither': 1,
+    },
+    'mono': {
+        'color': 'N',
+        'mono_cutoff': 50,
+    },
+    'reflective': {
+        'mono_cutoff': 75,
+        'color_cutoff': 125,
+        'dither': 1,
+    },
+    'mip-optimize': {
+        'auto_power_save': 'Y',
+        'idle_timeout': 90000,
+        'auto_clear': 'Y',
+        'overlays': 'Y',
+    },
+    'low-power': {
+        'color': 'N',
+        'mono_cutoff': 45,
+        'auto_power_save': 'Y',
+        'idle_timeout': 60000,
+        'brightness': 1,
+    },
+    'high-contrast': {
+        'dither': 1,
+        'if_color': {'color_cutoff': 140},
+        'if_mono': {'mono_cutoff': 65},
+    },
+    'performance': {
+        'dither': 1,
+        'color': 'Y',
+        'color_cutoff': 120,
+        'mono_cutoff': 48,
+        'auto_clear': 'Y',
+        'overlays': 'Y',
+    },
+    'battery': {
+        'auto_power_save': 'Y',
+        'idle_timeout': 300000,
+        'color': 'N',
+        'mono_cutoff': 40,
+        'brightness': 1,
+    },
+    'quality': {
+        'color': 'Y',
+        'color_cutoff': 140,
+        'dither': 1,
+        'mono_cutoff': 60,
+        'mono_invert': 'N',
+        'brightness': 4,
+    },
+    'calibrate': {
+        'auto_clear': 'Y',
+        'overlays': 'Y',
+        'color_cutoff': 110,
+        'mono_cutoff': 50,
+    },
+    # optimize_display.sh: also switches to 8-color mode
+    'optimize': {
+        'auto_power_save': 'Y',
+        'idle_timeout': 120000,
+        'dither': 1,
+        'auto_clear': 'Y',
+        'color': 'Y',
+        'brightness': 4,
+    },
+    # powersave.py optimize: leaves the color mode alone
+    'power-optimize': {
+        'auto_power_save': 'Y',
+        'idle_timeout': 120000,
+        'dither': 1,
+        'auto_clear': 'Y',
+        'brightness': 4,
+    },
+}
+PROFILES['color'] = PROFILES['8colors']
+
+BACKLIGHT_KEYS = ('brightness',)
+
+# Colors for output
+COLORS = {
+    'RED': '\033[0;31m',
+    'GREEN': '\033[0;32m',
+    'YELLOW': '\033[1;33m',
+    'BLUE': '\033[0;34m',
+    'NC': '\033[0m'
+}
+
+
+def log(level, message):
+    """Colored logging"""
+    color = {
+        'INFO': COLORS['BLUE'],
+        'SUCCESS': COLORS['GREEN'],
+        'WARNING': COLORS['YELLOW'],
+        'ERROR': COLORS['RED'],
+    }.get(level, COLORS['NC'])
+    print(f"{color}[{level}]{COLORS['NC']} {message}")
+
+
+class ProfileError(Exception):
+    """A profile could not be applied (changes were rolled back)"""
+
+
+def normalize(value):
+    """Format a value the way sysfs reports it"""
+    if value is True:
+        return 'Y'
+    if value is False:
+        return 'N'
+    return str(value)
+
+
+class ProfileEngine:
+    """Resolves profiles against the current state and applies the diff"""
+
+    def __init__(self, sysfs=None, profiles=None):
+        self.sysfs = sysfs or default_sysfs()
+        self.profiles = profiles if profiles is not None else PROFILES
+
+    def check_key(self, key):
+        """Raise ProfileError unless `key` is a backlight key or a module parameter"""
+        if key not in BACKLIGHT_KEYS and key not in self.sysfs.param_names():
+            raise ProfileError(f"Unknown parameter: {key}")
+        return key
+
+    def attr(self, key):
+        self.check_key(key)
+        if key in BACKLIGHT_KEYS:
+            return self.sysfs.backlight(key)
+        return self.sysfs.param(key)
+
+    def read(self, key):
+        """Current value of a parameter, None if it cannot be read
+
+        Raises ProfileError for names that are not parameters.
+        """
+        attr = self.attr(key)
+        try:
+            return attr.read()
+        except OSError:
+            return None
+
+    def resolve(self, values):
+        """Flatten a profile into {key: value} for the current state"""
+        if isinstance(values, str):
+            if values not in self.profiles:
+                raise ProfileError(f"Unknown profile: {values}")
+            values = self.profiles[values]
+
+        resolved = {k: normalize(v) for k, v in values.items()
+                    if k not in ('if_color', 'if_mono')}
+        if 'if_color' in values or 'if_mono' in values:
+            color = resolved.get('color') or self.read('color')
+            branch = values.get('if_color' if color == 'Y' else 'if_mono', {})
+            resolved.update((k, normalize(v)) for k, v in branch.items())
+
+        if 'brightness' in resolved:
+            try:
+                max_brightness = int(self.sysfs.backlight('max_brightness').cached())
+                resolved['brightness'] = str(min(int(resolved['brightness']), max_brightness))
+            except (OSError, ValueError):
+                pass
+        return resolved
+
+    def diff(self, profile):
+        """List of (key, current, target) for values that would change"""
+        changes = []
+        for key, target in self.resolve(profile).items():
+            current = self.read(key)
+            if current != target:
+                changes.append((key, current, target))
+        return changes
+
+    def apply(self, profile, dry_run=False):
+        """Write only the differences; roll back and raise on failure"""
+        changes = self.diff(profile)
+        if dry_run:
+            return changes
+
+        done = []
+        for key, current, target in changes:
+            try:
+                self.attr(key).write(target, force=True)
+            except OSError as e:
+                failed = self._rollback(done)
+                message = f"Failed to write {key}={target}: {e}"
+                if failed:
+                    message += f" (rollback failed for {', '.join(failed)})"
+                raise ProfileError(message) from e
+            done.append((key, current, target))
+        return changes
+
+    def _rollback(self, done):
+        failed = []
+        for key, previous, _ in reversed(done):
+            if previous is None:
+                failed.append(key)
+                continue
+            try:
+                self.attr(key).write(previous, force=True)
+            except OSError:
+                failed.append(key)
+        return failed
+
+
+def parse_assignments(items):
+    """Parse key=value arguments into a dict"""
+    values = {}
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep or not key:
+            raise ProfileError(f"Expected key=value, got '{item}'")
+        values[key] = value
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply JDI display profiles')
+    parser.add_argument('profile', help="Profile name, 'list', or 'set' followed by key=value")
+    parser.add_argument('values', nargs='*', help='key=value pairs for set')
+    parser.add_argument('--dry-run', action='store_true', help='Only show the diff')
+    parser.add_argument('--quiet', action='store_true', help='Only report errors')
+    args = parser.parse_args()
+
+    if args.profile == 'list':
+        for name in sorted(PROFILES):
+            print(name)
+        return 0
+
+    engine = ProfileEngine()
+    try:
+        profile = parse_assignments(args.values) if args.profile == 'set' else args.profile
+        changes = engine.apply(profile, dry_run=args.dry_run)
+    except ProfileError as e:
+        log('ERROR', str(e))
+        return 1
+
+    if args.dry_run:
+        for key, current, target in changes:
+            print(f"{key:16}: {current} -> {target}")
+        if not changes:
+            print("No changes")
+    elif not args.quiet:
+        for key, current, target in changes:
+            log('INFO', f"{key}: {current} -> {target}")
+        log('SUCCESS', f"Profile '{args.profile}' applied ({len(changes)} changes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
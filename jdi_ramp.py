@@ -0,0 +1,264 @@
+#!/usr/bin/python3
+"""
+Backlight ramp engine for the JDI daemon
+Author: N@Xs - Enhanced Edition 2025
+
+set_brightness() jumps straight between BRIGHTNESS_LEVELS, and a burst of
+button presses or auto-dim events turns into a burst of sysfs writes.
+The ramp animates the PWM value towards a target instead and coalesces
+everything that arrives while it runs.
+
+Features:
+- One event loop timer per transition (no thread, nothing armed when idle)
+- Easing curves (linear, ease-in, ease-out, ease-in-out) and duration
+- Overlapping requests are merged: the ramp restarts from where it is
+  towards the latest target only
+- Only whole values that differ from the last write reach sysfs
+- Writes per transition reported, to confirm the PWM path is not flooded
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+
+from jdi_sysfs import default_sysfs
+
+RAMP_DURATION = 0.4     # Seconds per transition
+RAMP_EASING = 'ease-in-out'
+MAX_RATE = 60           # Timer ticks per second while ramping
+HISTORY = 32            # Transitions kept for stats()
+
+EASINGS = {
+    'linear': lambda t: t,
+    'ease-in': lambda t: t * t,
+    'ease-out': lambda t: 1.0 - (1.0 - t) ** 2,
+    'ease-in-out': lambda t: t * t * (3.0 - 2.0 * t),
+}
+
+
+class BacklightRamp:
+    """Animates the backlight attribute towards the latest target
+
+    Without start(), or with a zero duration, set_target() writes the
+    target right away (still skipping repeated values).
+    """
+
+    def __init__(self, attr=None, duration=RAMP_DURATION, easing=RAMP_EASING,
+                 max_rate=MAX_RATE, on_write=None, clock=time.monotonic):
+        if easing not in EASINGS:
+            raise ValueError(f"Unknown easing {easing!r}, expected one of {', '.join(EASINGS)}")
+        self.attr = attr if attr is not None else default_sysfs().backlight('brightness')
+        self.duration = float(duration)
+        self.easing = easing
+        self.ease = EASINGS[easing]
+        self.max_rate = max_rate
+        self.on_write = on_write
+        self.clock = clock
+
+        self.loop = None
+        self._handle = None
+        self.current = None     # Last value written (or read back)
+        self.target = None
+        self.position = None    # Unrounded ramp position
+        self._from = None
+        self._started = 0.0
+        self._length = 0.0
+        self._transition = None
+
+        # Counters
+        self.transitions = 0
+        self.merged = 0
+        self.writes = 0
+        self.skipped = 0
+        self.errors = 0
+        self.history = deque(maxlen=HISTORY)
+
+    # Event loop side
+
+    def start(self, loop):
+        self.loop = loop
+
+    def stop(self):
+        """Cancel the timer and settle on the target"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._transition is not None:
+            self._write(self.target)
+            self._finish()
+        self.loop = None
+
+    def _arm(self):
+        self._handle = self.loop.call_later(1.0 / self.max_rate, self._on_timer)
+
+    def _on_timer(self):
+        self._handle = None
+        self.step()
+        if self._transition is not None:
+            self._arm()
+
+    # State
+
+    def sync(self):
+        """Take the current value from sysfs (someone else may have set it)"""
+        try:
+            self.current = int(self.attr.read())
+        except (OSError, ValueError):
+            return self.current
+        self.position = float(self.current)
+        return self.current
+
+    @property
+    def active(self):
+        return self._transition is not None
+
+    def _write(self, value):
+        if value == self.current:
+            self.skipped += 1
+            return False
+        try:
+            self.attr.write(value)
+        except OSError as e:
+            self.errors += 1
+            print(f"Error setting brightness: {e}")
+            return False
+        self.current = value
+        self.writes += 1
+        if self._transition is not None:
+            self._transition['writes'] += 1
+        if self.on_write is not None:
+            self.on_write(value)
+        return True
+
+    def _finish(self):
+        t = self._transition
+        t['to'] = self.target
+        t['ms'] = round((self.clock() - t['started']) * 1000, 1)
+        del t['started']
+        self.history.append(t)
+        self._transition = None
+
+    # Requests
+
+    def set_target(self, value, duration=None):
+        """Ramp towards `value`; a running transition is retargeted"""
+        value = int(value)
+        duration = self.duration if duration is None else float(duration)
+        if self.current is None:
+            self.sync()
+        if self.position is None:
+            self.position = float(self.current if self.current is not None else value)
+
+        if self._transition is not None:
+            self.merged += 1
+            self._transition['requests'] += 1
+        elif value == self.current:
+            self.target = value
+            return False
+        else:
+            self.transitions += 1
+            self._transition = {'from': self.current, 'to': value, 'requests': 1,
+                                'writes': 0, 'started': self.clock()}
+
+        self.target = value
+        self._from = self.position
+        self._started = self.clock()
+        self._length = duration
+        if self.loop is None or duration <= 0:
+            self.position = float(value)
+            self._write(value)
+            self._finish()
+            return True
+        writes = self.writes
+        self.step()
+        if (self.writes == writes and self._transition is not None
+                and self.current is not None and value != self.current):
+            # The first whole step goes out right away: with few levels the
+            # eased curve would otherwise hold the old value for half the ramp
+            self._write(self.current + (1 if value > self.current else -1))
+            self._settle()
+        if self._transition is not None and self._handle is None:
+            self._arm()
+        return True
+
+    def step(self):
+        """Advance the ramp to the current time and write if the value moved"""
+        if self._transition is None:
+            return
+        t = min(1.0, (self.clock() - self._started) / self._length)
+        self.position = self._from + (self.target - self._from) * self.ease(t)
+        value = self.target if t >= 1.0 else int(round(self.position))
+        if self.current is not None:
+            # Never step back away from the target (the first step may lead the curve)
+            value = max(value, self.current) if self.target >= self.current else min(value, self.current)
+        self._write(value)
+        if t >= 1.0:
+            self._finish()
+        else:
+            self._settle()
+
+    def _settle(self):
+        """End the transition once the target is written, the rest of
+        the curve would only produce skipped writes"""
+        if self._transition is not None and self.current == self.target:
+            self.position = float(self.target)
+            self._finish()
+
+    def stats(self):
+        per = [t['writes'] for t in self.history]
+        return {
+            'transitions': self.transitions,
+            'merged_requests': self.merged,
+            'writes': self.writes,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'writes_per_transition': round(sum(per) / len(per), 2) if per else 0.0,
+            'max_writes_per_transition': max(per, default=0),
+            'last': list(self.history)[-5:],
+        }
+
+
+async def run_demo(ramp, targets, interval):
+    """Send targets `interval` seconds apart and wait for the ramp to settle"""
+    ramp.start(asyncio.get_running_loop())
+    for value in targets:
+        ramp.set_target(value)
+        await asyncio.sleep(interval)
+    while ramp.active:
+        await asyncio.sleep(ramp.duration / 4 or 0.01)
+    ramp.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ramp the JDI backlight to a value')
+    parser.add_argument('targets', type=int, nargs='+',
+                        help='Brightness values, sent one after another')
+    parser.add_argument('--duration', type=float, default=RAMP_DURATION)
+    parser.add_argument('--easing', choices=list(EASINGS), default=RAMP_EASING)
+    parser.add_argument('--interval', type=float, default=0.0,
+                        help='Seconds between targets (a burst when shorter than the duration)')
+    parser.add_argument('--json', action='store_true', help='Print stats as JSON')
+    args = parser.parse_args()
+
+    ramp = BacklightRamp(duration=args.duration, easing=args.easing)
+    if not ramp.attr.exists():
+        print(f"Backlight not available: {ramp.attr.path}")
+        return 1
+    ramp.sync()
+    asyncio.run(run_demo(ramp, args.targets, args.interval))
+
+    s = ramp.stats()
+    if args.json:
+        print(json.dumps(s))
+    else:
+        print(f"{len(args.targets)} requests -> {s['transitions']} transitions, "
+              f"{s['writes']} writes ({s['writes_per_transition']}/transition, "
+              f"max {s['max_writes_per_transition']}), {s['merged_requests']} merged")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
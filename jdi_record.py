@@ -0,0 +1,510 @@
+#!/usr/bin/python3
+"""
+Frame recording and replay for the JDI panel
+Author: N@Xs - Enhanced Edition 2025
+
+Sessions are stored in the panel's own bit format: packed 1bpp (mono,
+12000 bytes a frame) or 3bpp (8-color) rows, exactly the line data of the
+tagged lines, instead of 384000 bytes of XRGB8888 per frame.
+
+Container (.jdr):
+- 64-byte header: magic, version, geometry, bits per pixel, keyframe
+  interval, frame count, index offset
+- Records: 16-byte record header, then a keyframe (all rows) or a delta
+  (changed-row bitmap plus the changed rows), zlib-compressed when that
+  is smaller
+- Index at the end: fixed-size entries (timestamp, offset, size, kind),
+  read in place from the mmap; rebuilt by scanning the records when a
+  recording was not closed
+
+Features:
+- Random access: decode from the nearest keyframe, sequential reads
+  reuse the last frame
+- Streaming replay with the original timing (optionally scaled) or flat
+  out, into the panel emulator, an SPI stream file or a jdi_fb
+  framebuffer
+"""
+
+import sys
+import mmap
+import time
+import zlib
+import struct
+import argparse
+
+import numpy as np
+
+import jdi_encoder
+from jdi_encoder import WIDTH, HEIGHT, CMD_WRITE_COLOR, CMD_WRITE_MONO
+
+MAGIC = b'JDIR'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHHIQQd')
+HEADER_SIZE = 64
+RECORD = struct.Struct('<BBHIQ')    # kind, codec, changed rows, payload size, timestamp ns
+
+KIND_KEYFRAME = 0
+KIND_DELTA = 1
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+
+INDEX_DTYPE = np.dtype([
+    ('timestamp_ns', '<u8'),
+    ('offset', '<u8'),      # Payload offset in the file
+    ('size', '<u4'),
+    ('kind', 'u1'),
+    ('codec', 'u1'),
+    ('rows', '<u2'),        # Rows stored in the record
+])
+
+KEYFRAME_INTERVAL = 100
+ZLIB_LEVEL = 6
+
+
+def row_bytes(width, bits):
+    """Packed bytes per row: 1 bit (mono) or 3 bits (8-color) per pixel"""
+    return width * bits // 8
+
+
+def pack_frame(frame, color=jdi_encoder.DEFAULT_COLOR, **params):
+    """Frame (gray8, RGB888 or XRGB8888) to packed panel rows"""
+    return jdi_encoder.encode_lines(frame, color, **params)[:, 1:-1]
+
+
+def unpack_rows(packed, width, bits):
+    """Packed rows to (n, width, 3) RGB 0/255 pixels"""
+    unpacked = np.unpackbits(packed, axis=1)
+    if bits == 1:
+        pixels = np.repeat(unpacked[:, :width, np.newaxis], 3, axis=2)
+    else:
+        pixels = unpacked[:, :width * 3].reshape(len(packed), width, 3)
+    return pixels * np.uint8(255)
+
+
+def tagged_message(packed, rows, bits):
+    """SPI write-line message for `rows` of a packed frame"""
+    lines = np.zeros((len(rows), packed.shape[1] + 2), dtype=np.uint8)
+    lines[:, 0] = (np.asarray(rows) + 1) & 0xFF
+    lines[:, 1:-1] = packed[rows]
+    cmd = CMD_WRITE_MONO if bits == 1 else CMD_WRITE_COLOR
+    return bytes((cmd,)) + lines.tobytes() + b'\x00'
+
+
+class Recorder:
+    """Appends packed frames to a .jdr file"""
+
+    def __init__(self, path, width=WIDTH, height=HEIGHT, color=jdi_encoder.DEFAULT_COLOR,
+                 keyframe_interval=KEYFRAME_INTERVAL, level=ZLIB_LEVEL, params=None,
+                 clock=time.monotonic_ns):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.bits = 3 if color else 1
+        self.color = color
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.params = params or {}
+        self.clock = clock
+
+        self.f = open(path, 'wb')
+        self.f.write(self._header(0, 0))
+        self.index = []
+        self.previous = None
+        self.start_ns = None
+
+        # Counters
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.skipped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _header(self, count, index_offset):
+        header = HEADER.pack(MAGIC, VERSION, self.width, self.height, self.bits,
+                             self.keyframe_interval, count, index_offset, time.time())
+        return header.ljust(HEADER_SIZE, b'\x00')
+
+    def add(self, frame, timestamp_ns=None):
+        """Record a gray8/RGB888/XRGB8888 frame"""
+        return self.add_packed(pack_frame(frame, self.color, **self.params), timestamp_ns)
+
+    def add_packed(self, packed, timestamp_ns=None):
+        """Record packed panel rows; unchanged frames are skipped
+
+        Returns the number of rows stored.
+        """
+        packed = np.ascontiguousarray(packed, dtype=np.uint8)
+        if packed.shape != (self.height, row_bytes(self.width, self.bits)):
+            raise ValueError(f"Expected packed rows {self.height}x"
+                             f"{row_bytes(self.width, self.bits)}, got {packed.shape}")
+        now = self.clock() if timestamp_ns is None else timestamp_ns
+        if self.start_ns is None:
+            self.start_ns = now
+
+        if self.previous is None or len(self.index) % self.keyframe_interval == 0:
+            kind = KIND_KEYFRAME
+            rows = self.height
+            payload = packed.tobytes()
+        else:
+            changed = (packed != self.previous).any(axis=1)
+            rows = int(changed.sum())
+            if not rows:
+                self.skipped += 1
+                return 0
+            kind = KIND_DELTA
+            payload = np.packbits(changed).tobytes() + packed[changed].tobytes()
+
+        self._write(kind, rows, payload, now - self.start_ns)
+        self.previous = packed.copy()
+        return rows
+
+    def _write(self, kind, rows, payload, timestamp_ns):
+        codec = CODEC_RAW
+        if self.level:
+            compressed = zlib.compress(payload, self.level)
+            if len(compressed) < len(payload):
+                codec, payload = CODEC_ZLIB, compressed
+        self.f.write(RECORD.pack(kind, codec, rows, len(payload), timestamp_ns))
+        offset = self.f.tell()
+        self.f.write(payload)
+        self.index.append((timestamp_ns, offset, len(payload), kind, codec, rows))
+        self.raw_bytes += self.height * row_bytes(self.width, self.bits)
+        self.stored_bytes += RECORD.size + len(payload)
+
+    def close(self):
+        """Write the index and finish the header"""
+        if self.f is None:
+            return
+        index_offset = self.f.tell()
+        self.f.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        self.f.seek(0)
+        self.f.write(self._header(len(self.index), index_offset))
+        self.f.close()
+        self.f = None
+
+
+class Recording:
+    """Read-only, memory-mapped .jdr file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.width, self.height, self.bits, self.keyframe_interval,
+         count, index_offset, self.created) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a JDI recording (version {VERSION})")
+        self.row_bytes = row_bytes(self.width, self.bits)
+        self.color = self.bits == 3
+
+        if index_offset:
+            self.index = np.frombuffer(self.mm, dtype=INDEX_DTYPE, count=count,
+                                       offset=index_offset)
+            self.complete = True
+        else:
+            self.index = self._scan()
+            self.complete = False
+
+        self._last = None       # (frame number, packed rows)
+
+    def _scan(self):
+        """Rebuild the index of a recording that was never closed"""
+        entries = []
+        pos = HEADER_SIZE
+        while pos + RECORD.size <= len(self.mm):
+            kind, codec, rows, size, timestamp_ns = RECORD.unpack_from(self.mm, pos)
+            if pos + RECORD.size + size > len(self.mm):
+                break   # Truncated last record
+            entries.append((timestamp_ns, pos + RECORD.size, size, kind, codec, rows))
+            pos += RECORD.size + size
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def duration(self):
+        return float(self.index[-1]['timestamp_ns']) / 1e9 if len(self.index) else 0.0
+
+    def _payload(self, n):
+        entry = self.index[n]
+        data = self.mm[entry['offset']:entry['offset'] + entry['size']]
+        return zlib.decompress(data) if entry['codec'] == CODEC_ZLIB else data
+
+    def _apply(self, n, packed):
+        """Apply record `n` onto `packed` in place, returns the changed rows"""
+        payload = self._payload(n)
+        if self.index[n]['kind'] == KIND_KEYFRAME:
+            packed[:] = np.frombuffer(payload, dtype=np.uint8).reshape(packed.shape)
+            return np.arange(self.height)
+        mask_len = (self.height + 7) // 8
+        changed = np.unpackbits(np.frombuffer(payload[:mask_len], dtype=np.uint8))[:self.height]
+        rows = np.flatnonzero(changed)
+        packed[rows] = np.frombuffer(payload[mask_len:], dtype=np.uint8).reshape(len(rows), -1)
+        return rows
+
+    def frame(self, n):
+        """Packed rows of frame `n` (decoded from the nearest keyframe)"""
+        if not 0 <= n < len(self.index):
+            raise IndexError(f"Frame {n} out of range (0-{len(self.index) - 1})")
+        if self._last is not None and self._last[0] <= n:
+            start, packed = self._last[0] + 1, self._last[1].copy()
+        else:
+            keyframes = np.flatnonzero(self.index['kind'][:n + 1] == KIND_KEYFRAME)
+            start, packed = int(keyframes[-1]), np.zeros((self.height, self.row_bytes), np.uint8)
+        for i in range(start, n + 1):
+            self._apply(i, packed)
+        self._last = (n, packed)
+        return packed.copy()
+
+    def frames(self, start=0):
+        """Yield (timestamp_ns, packed rows, changed rows) from frame `start`
+
+        The yielded array is reused, copy it to keep it.
+        """
+        if start >= len(self.index):
+            return
+        packed = self.frame(start)
+        yield int(self.index[start]['timestamp_ns']), packed, np.arange(self.height)
+        for n in range(start + 1, len(self.index)):
+            rows = self._apply(n, packed)
+            yield int(self.index[n]['timestamp_ns']), packed, rows
+
+    def stats(self):
+        size = len(self.mm)
+        raw = len(self.index) * self.height * self.row_bytes
+        return {
+            'frames': len(self.index),
+            'keyframes': int((self.index['kind'] == KIND_KEYFRAME).sum()),
+            'duration_s': self.duration(),
+            'width': self.width,
+            'height': self.height,
+            'bits': self.bits,
+            'file_bytes': size,
+            'packed_bytes': raw,
+            'xrgb_bytes': len(self.index) * self.height * self.width * 4,
+            'rows_stored': int(self.index['rows'].sum()),
+            'complete': self.complete,
+        }
+
+    def close(self):
+        self.index = None
+        self._last = None
+        try:
+            self.mm.close()
+        except BufferError:
+            pass
+
+
+class EmulatorSink:
+    """Sends changed rows to a jdi_emulator.PanelEmulator"""
+
+    def __init__(self, emulator, bits):
+        self.emulator = emulator
+        self.bits = bits
+
+    def __call__(self, packed, rows):
+        self.emulator.transfer(tagged_message(packed, rows, self.bits))
+
+
+class StreamSink:
+    """Writes the SPI messages to a binary file (jdi_emulator.py input)"""
+
+    def __init__(self, f, bits):
+        self.f = f
+        self.bits = bits
+
+    def __call__(self, packed, rows):
+        self.f.write(tagged_message(packed, rows, self.bits))
+
+
+class FramebufferSink:
+    """Draws changed rows into a jdi_fb framebuffer and flushes them
+
+    Pixels are 0/255 per channel, so any cutoff between 1 and 255 gives
+    back the recorded bits (mono_invert must match the recording).
+    """
+
+    def __init__(self, fb, width, bits):
+        self.fb = fb
+        self.width = width
+        self.bits = bits
+
+    def __call__(self, packed, rows):
+        pixels = unpack_rows(packed[rows], self.width, self.bits)
+        self.fb.pixels[rows, :self.width, :3] = pixels[:, :, ::-1]
+        for start, stop in runs(rows):
+            self.fb.damage(0, start, self.width, stop - start)
+        self.fb.flush()
+
+
+def runs(rows):
+    """Sorted row indices as [start, stop) runs"""
+    result = []
+    for row in rows:
+        row = int(row)
+        if result and row == result[-1][1]:
+            result[-1][1] = row + 1
+        else:
+            result.append([row, row + 1])
+    return [tuple(run) for run in result]
+
+
+def replay(recording, sink, start=0, realtime=True, speed=1.0):
+    """Feed frames to `sink(packed, rows)`, returns (frames, seconds)"""
+    frames = 0
+    started = time.monotonic()
+    first = None
+    for timestamp_ns, packed, rows in recording.frames(start):
+        if first is None:
+            first = timestamp_ns
+        if realtime:
+            delay = (timestamp_ns - first) / 1e9 / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        sink(packed, rows)
+        frames += 1
+    return frames, time.monotonic() - started
+
+
+def record_framebuffer(recorder, fb, fps, seconds):
+    """Sample a framebuffer view at `fps`, recording frames that changed"""
+    period = 1.0 / fps
+    deadline = time.monotonic() + seconds if seconds else None
+    next_sample = time.monotonic()
+    while deadline is None or next_sample < deadline:
+        recorder.add(fb.pixels)
+        next_sample += period
+        delay = next_sample - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def print_info(recording):
+    s = recording.stats()
+    mode = '8-color 3bpp' if s['bits'] == 3 else 'mono 1bpp'
+    print(f"{recording.path}: {s['width']}x{s['height']} {mode}"
+          f"{'' if s['complete'] else ' (not closed, index rebuilt)'}")
+    print(f"Frames: {s['frames']} ({s['keyframes']} keyframes) over {s['duration_s']:.2f} s")
+    print(f"Rows stored: {s['rows_stored']} of {s['frames'] * s['height']}")
+    print(f"Size: {s['file_bytes']} bytes (packed {s['packed_bytes']}, "
+          f"XRGB8888 {s['xrgb_bytes']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record and replay JDI panel sessions')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    rec = sub.add_parser('record', help='Record a framebuffer or raw frames')
+    rec.add_argument('output')
+    rec.add_argument('frames', nargs='*', help='Raw/PPM frames (default: sample --fb)')
+    rec.add_argument('--fb', default='/dev/fb0', help='Framebuffer device to sample')
+    rec.add_argument('--fps', type=float, default=10.0)
+    rec.add_argument('--seconds', type=float, default=0, help='0 records until Ctrl-C')
+    rec.add_argument('--mono', action='store_true', help='1bpp instead of 3bpp')
+    rec.add_argument('--from-sysfs', action='store_true', help='Cutoffs from the driver')
+    rec.add_argument('--keyframe-interval', type=int, default=KEYFRAME_INTERVAL)
+    rec.add_argument('--level', type=int, default=ZLIB_LEVEL, help='zlib level, 0 stores raw')
+
+    info = sub.add_parser('info', help='Show recording statistics')
+    info.add_argument('recording')
+
+    play = sub.add_parser('replay', help='Replay a recording')
+    play.add_argument('recording')
+    play.add_argument('--start', type=int, default=0, help='First frame')
+    play.add_argument('--flat-out', action='store_true', help='Ignore the original timing')
+    play.add_argument('--speed', type=float, default=1.0, help='Timing scale factor')
+    play.add_argument('--fb', choices=['dumb', 'fbdev', 'file'], help='Replay into a framebuffer')
+    play.add_argument('--device', help='DRM card, fbdev node or file for --fb')
+    play.add_argument('--stream', help='Write the SPI messages to a file')
+    play.add_argument('--snapshot', metavar='PPM', help='Emulator image after the replay')
+
+    export = sub.add_parser('export', help='Write one frame as PPM')
+    export.add_argument('recording')
+    export.add_argument('frame', type=int)
+    export.add_argument('output')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        params = jdi_encoder.read_params() if args.from_sysfs else {}
+        params.pop('color', None)
+        recorder = Recorder(args.output, color=not args.mono,
+                            keyframe_interval=args.keyframe_interval, level=args.level,
+                            params=params)
+        with recorder:
+            if args.frames:
+                import jdi_dither
+                period_ns = int(1e9 / args.fps)
+                for n, path in enumerate(args.frames):
+                    recorder.add(jdi_dither.load_frame(path), n * period_ns)
+            else:
+                from jdi_fb import FbdevFramebuffer
+                try:
+                    fb = FbdevFramebuffer(args.fb)
+                except (OSError, ValueError) as e:
+                    print(f"Error opening {args.fb}: {e}")
+                    return 1
+                try:
+                    record_framebuffer(recorder, fb, args.fps, args.seconds)
+                except KeyboardInterrupt:
+                    pass
+                finally:
+                    fb.close()
+        print(f"Recorded {len(recorder.index)} frames ({recorder.skipped} unchanged skipped), "
+              f"{recorder.stored_bytes} bytes for {recorder.raw_bytes} packed")
+        return 0
+
+    try:
+        recording = Recording(args.recording)
+    except (OSError, ValueError) as e:
+        print(f"Error opening recording: {e}")
+        return 1
+
+    with recording:
+        if args.command == 'info':
+            print_info(recording)
+        elif args.command == 'export':
+            from jdi_emulator import PanelEmulator
+            emulator = PanelEmulator(recording.width, recording.height)
+            emulator.image[:] = unpack_rows(recording.frame(args.frame),
+                                            recording.width, recording.bits)
+            emulator.save_ppm(args.output)
+        elif args.fb:
+            from jdi_fb import open_framebuffer
+            try:
+                fb = open_framebuffer(args.fb, args.device)
+            except (OSError, ValueError) as e:
+                print(f"Error opening {args.fb} framebuffer: {e}")
+                return 1
+            with fb:
+                sink = FramebufferSink(fb, recording.width, recording.bits)
+                frames, elapsed = replay(recording, sink, args.start,
+                                         not args.flat_out, args.speed)
+            print(f"Replayed {frames} frames in {elapsed:.2f} s")
+        elif args.stream:
+            with open(args.stream, 'wb') as f:
+                frames, elapsed = replay(recording, StreamSink(f, recording.bits),
+                                         args.start, not args.flat_out, args.speed)
+            print(f"Wrote {frames} messages in {elapsed:.2f} s")
+        else:
+            from jdi_emulator import PanelEmulator, print_report
+            emulator = PanelEmulator(recording.width, recording.height)
+            frames, elapsed = replay(recording, EmulatorSink(emulator, recording.bits),
+                                     args.start, not args.flat_out, args.speed)
+            print_report(emulator, elapsed)
+            if args.snapshot:
+                emulator.save_ppm(args.snapshot)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+"""
+Frame-rate-capped damage coalescing for the JDI panel
+Author: N@Xs - Enhanced Edition 2025
+
+Every flush of a small widget costs one commit and one spi_sync_transfer
+with its ndelay(80), converting full-width rows each time. The scheduler
+collects damage from any number of producers and flushes the merged row
+runs at most `max_rate` times per second.
+
+Features:
+- Overlapping and adjacent row ranges from all producers merged into runs
+  (jdi_fb.DamageTracker)
+- Maximum flush rate, high-priority damage flushed right away (together
+  with whatever else is pending)
+- asyncio loop timer or manual poll() for other main loops
+- Counters: updates, merged updates, transfers and SPI bytes saved
+  against flushing every update on its own
+"""
+
+import sys
+import time
+import argparse
+
+import numpy as np
+
+import jdi_encoder
+from jdi_encoder import mono_line_len, color_line_len
+from jdi_differ import message_len
+from jdi_emulator import MESSAGE_OVERHEAD_NS
+from jdi_fb import open_framebuffer
+
+MAX_RATE = 20.0         # Flushes per second
+
+
+class FlushScheduler:
+    """Coalesces damage on a framebuffer and flushes it at a capped rate
+
+    `fb` is a jdi_fb.Framebuffer (anything with damage() and flush()
+    returning the (x1, y1, x2, y2) clips sent). Without a loop, call
+    poll() from the application's own loop.
+    """
+
+    def __init__(self, fb, max_rate=MAX_RATE, color=jdi_encoder.DEFAULT_COLOR,
+                 clock=time.monotonic):
+        self.fb = fb
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.line_len = color_line_len(fb.width) if color else mono_line_len(fb.width)
+        self.clock = clock
+
+        self.loop = None
+        self._handle = None
+        self.last_flush = None
+        self._pending_updates = 0
+        self._pending_bytes = 0
+
+        # Counters
+        self.updates = 0
+        self.priority_updates = 0
+        self.flushes = 0
+        self.commits = 0
+        self.merged = 0
+        self.bytes_sent = 0
+        self.bytes_unmerged = 0
+        self.producers = {}
+
+    # Event loop side
+
+    def start(self, loop):
+        self.loop = loop
+
+    def stop(self):
+        """Cancel the timer and flush what is pending"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self.flush()
+
+    def _arm(self, delay):
+        if self._handle is None:
+            self._handle = self.loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._handle = None
+        self.flush()
+
+    # Producers
+
+    def damage(self, x, y, width, height, producer='default', priority=False):
+        """Report damage; flushed now if priority, otherwise within the rate cap"""
+        self.fb.damage(x, y, width, height)
+        rows = max(0, min(self.fb.height, y + height) - max(0, y))
+        self.updates += 1
+        self.producers[producer] = self.producers.get(producer, 0) + 1
+        self._pending_updates += 1
+        self._pending_bytes += message_len(rows, self.line_len)
+
+        if priority:
+            self.priority_updates += 1
+            self.flush()
+            return
+        delay = self.next_flush() - self.clock()
+        if self.loop is not None:
+            # Even when due, wait for the loop so same-iteration damage merges
+            self._arm(max(0.0, delay))
+        elif delay <= 0:
+            self.flush()
+
+    def next_flush(self):
+        """Earliest time the rate cap allows the next flush"""
+        if self.last_flush is None:
+            return self.clock()
+        return self.last_flush + self.interval
+
+    def poll(self):
+        """Flush if something is pending and the rate cap allows it"""
+        if self._pending_updates and self.clock() >= self.next_flush():
+            self.flush()
+
+    def flush(self):
+        """Flush all pending damage now, returns the clips sent"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self._pending_updates:
+            return []
+        clips = self.fb.flush()
+        self.last_flush = self.clock()
+        self.flushes += 1
+        self.commits += len(clips)
+        self.merged += self._pending_updates - len(clips)
+        self.bytes_sent += sum(message_len(y2 - y1, self.line_len) for _, y1, _, y2 in clips)
+        self.bytes_unmerged += self._pending_bytes
+        self._pending_updates = 0
+        self._pending_bytes = 0
+        return clips
+
+    def stats(self):
+        transfers_saved = self.updates - self._pending_updates - self.commits
+        return {
+            'updates': self.updates,
+            'priority_updates': self.priority_updates,
+            'flushes': self.flushes,
+            'commits': self.commits,
+            'merged_updates': self.merged,
+            'bytes_sent': self.bytes_sent,
+            'bytes_saved': self.bytes_unmerged - self.bytes_sent,
+            'transfers_saved': transfers_saved,
+            'overhead_saved_ms': transfers_saved * MESSAGE_OVERHEAD_NS / 1e6,
+            'producers': dict(self.producers),
+        }
+
+
+def simulate(fb, widgets, rate, seconds, max_rate=MAX_RATE,
+             color=jdi_encoder.DEFAULT_COLOR, priority_every=0, seed=1):
+    """Dashboard of `widgets` boxes updating `rate` times per second each
+
+    Runs on a virtual clock, returns the scheduler stats.
+    """
+    now = [0.0]
+    scheduler = FlushScheduler(fb, max_rate, color, clock=lambda: now[0])
+    rng = np.random.default_rng(seed)
+    cols = 4
+    cell_w, cell_h = fb.width // cols, 24
+    events = []
+    for i in range(widgets):
+        offset = rng.random() / rate
+        events += [(offset + n / rate, i) for n in range(int(seconds * rate))]
+    events.sort()
+
+    for n, (when, i) in enumerate(events):
+        now[0] = when
+        scheduler.poll()
+        x, y = (i % cols) * cell_w, (i // cols) * (cell_h + 4)
+        fb.fill(int(rng.integers(0, 2)) * 0xffffffff, x + 4, y + 4, cell_w - 8, cell_h - 8)
+        scheduler.damage(x + 4, y + 4, cell_w - 8, cell_h - 8, producer=f"widget{i}",
+                         priority=bool(priority_every) and n % priority_every == 0)
+    now[0] = seconds + scheduler.interval
+    scheduler.poll()
+    return scheduler.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a dashboard through the flush scheduler')
+    parser.add_argument('--widgets', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=30.0, help='Updates/s per widget')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--max-rate', type=float, default=MAX_RATE, help='Flushes/s cap')
+    parser.add_argument('--priority-every', type=int, default=0,
+                        help='Every Nth update is high priority')
+    parser.add_argument('--mono', action='store_true', help='Account mono lines')
+    parser.add_argument('--backend', choices=['dumb', 'fbdev', 'file'], default='file')
+    parser.add_argument('--device', help='DRM card, fbdev node or file')
+    args = parser.parse_args()
+
+    try:
+        fb = open_framebuffer(args.backend, args.device)
+    except (OSError, ValueError) as e:
+        print(f"Error opening {args.backend} framebuffer: {e}")
+        return 1
+
+    with fb:
+        s = simulate(fb, args.widgets, args.rate, args.seconds, args.max_rate,
+                     not args.mono, args.priority_every)
+
+    print(f"Updates: {s['updates']} from {len(s['producers'])} producers "
+          f"({s['priority_updates']} high priority)")
+    print(f"Flushes: {s['flushes']} ({s['commits']} commits, "
+          f"{s['merged_updates']} updates merged)")
+    print(f"SPI bytes: {s['bytes_sent']} sent, {s['bytes_saved']} saved")
+    print(f"Transfers saved: {s['transfers_saved']} "
+          f"({s['overhead_saved_ms']:.1f} ms of per-transfer overhead)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
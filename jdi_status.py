@@ -0,0 +1,423 @@
+#!/usr/bin/python3
+"""
+JDI Display Status Collector
+Author: N@Xs - Enhanced Edition 2025
+
+In-process replacement for the lsmod/pgrep/ps/systemctl/cat pipeline of
+jdi-status. Everything comes from /proc and sysfs, no subprocesses.
+
+Features:
+- Structured snapshot: driver, framebuffer, DRM card, PWM backlight,
+  module parameters, button controller process and service
+- Human (colored) and JSON output
+- Parameters the caller cannot read (0660 root) are asked from the
+  control service (jdi_control.py), so jdi-status works without sudo
+- --watch: user-space writes to sysfs attributes show up at once through
+  inotify; everything, including driver-side changes inotify does not
+  report, is re-read on the poll interval
+"""
+
+import os
+import sys
+import json
+import time
+import select
+import argparse
+
+from jdi_input import Inotify, IN_MODIFY
+from jdi_sysfs import default_sysfs
+import jdi_ctl
+
+PROC_ROOT = os.environ.get('JDI_PROC_ROOT', '/proc')
+MODULE_NAME = 'jdi_drm_enhanced'
+CONTROLLER_SCRIPTS = ('enhanced_back.py', 'jdi_daemon.py')
+BUTTON_SERVICE = 'jdi-backlight-button.service'
+SERVICE_WANTS = '/etc/systemd/system/multi-user.target.wants'
+FB_DEVICE = '/dev/fb0'
+FB_SIZE_ATTR = 'class/graphics/fb0/virtual_size'
+DRM_CLASS_DIR = 'class/drm'
+BACKLIGHT_ATTRS = ('brightness', 'max_brightness', 'actual_brightness', 'bl_power', 'type')
+WATCH_INTERVAL = 2.0
+
+# Colors for output
+COLORS = {
+    'RED': '\033[0;31m',
+    'GREEN': '\033[0;32m',
+    'YELLOW': '\033[1;33m',
+    'BLUE': '\033[0;34m',
+    'CYAN': '\033[0;36m',
+    'NC': '\033[0m'
+}
+
+
+def read_text(path):
+    """Contents of a small file, None if it cannot be read"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read().decode(errors='replace')
+    except OSError:
+        return None
+
+
+def parse_modules(content, name=MODULE_NAME):
+    """Entry for `name` in /proc/modules, or None"""
+    for line in content.splitlines():
+        fields = line.split()
+        if fields and fields[0] == name:
+            return {
+                'size': int(fields[1]),
+                'refcount': int(fields[2]),
+                'state': fields[4] if len(fields) > 4 else None,
+            }
+    return None
+
+
+class StatusCollector:
+    """Builds status snapshots from /proc and sysfs"""
+
+    def __init__(self, sysfs=None, proc_root=PROC_ROOT):
+        self.sysfs = sysfs or default_sysfs()
+        self.proc_root = proc_root
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self._param_names = None
+
+    def read_attr(self, attr):
+        try:
+            return attr.read()
+        except OSError:
+            return None
+
+    def param_names(self):
+        """Module parameter names (listed once, they do not change)"""
+        if self._param_names is None:
+            try:
+                self._param_names = sorted(os.listdir(self.sysfs.params_dir()))
+            except OSError:
+                return []
+        return self._param_names
+
+    # Sections
+
+    def driver(self):
+        content = read_text(os.path.join(self.proc_root, 'modules'))
+        module = parse_modules(content) if content else None
+        loaded = module is not None or os.path.isdir(self.sysfs.params_dir())
+        return dict(module or {}, loaded=loaded)
+
+    def framebuffer(self):
+        size = self.read_attr(self.sysfs.attr(FB_SIZE_ATTR))
+        return {
+            'device': FB_DEVICE if os.path.exists(FB_DEVICE) else None,
+            'resolution': size,
+        }
+
+    def drm_card(self):
+        try:
+            names = os.listdir(self.sysfs.path(DRM_CLASS_DIR))
+        except OSError:
+            return None
+        cards = sorted(n for n in names if n.startswith('card') and '-' not in n)
+        return cards[0] if cards else None
+
+    def backlight(self):
+        values = {name: self.read_attr(self.sysfs.backlight(name)) for name in BACKLIGHT_ATTRS}
+        values['available'] = values['brightness'] is not None
+        return values
+
+    def params(self, names=None):
+        names = self.param_names() if names is None else names
+        values = {name: self.read_attr(self.sysfs.param(name)) for name in names}
+        missing = [name for name, value in values.items() if value is None]
+        if missing:
+            values.update(self.service_params(missing))
+        return values
+
+    def service_params(self, names):
+        """Parameter values from the control service (it runs as root)"""
+        try:
+            ok, output = jdi_ctl.request(['get'] + names)
+        except OSError:
+            return {}
+        if len(names) == 1:
+            # A single name is answered with the bare value
+            return {names[0]: output.strip()} if ok else {}
+        values = {}
+        for line in output.splitlines():
+            key, sep, value = line.partition('=')
+            if sep and key in names:
+                values[key] = value
+        return values
+
+    def controller(self):
+        """Button controller process, found by scanning /proc/*/cmdline"""
+        try:
+            pids = [name for name in os.listdir(self.proc_root) if name.isdigit()]
+        except OSError:
+            pids = []
+
+        info = {'running': False, 'pid': None, 'script': None, 'uptime': None,
+                'service_active': False,
+                'service_enabled': os.path.exists(os.path.join(SERVICE_WANTS, BUTTON_SERVICE))}
+        for pid in sorted(pids, key=int):
+            cmdline = read_text(os.path.join(self.proc_root, pid, 'cmdline'))
+            if not cmdline:
+                continue
+            script = next((os.path.basename(arg) for arg in cmdline.split('\0')
+                           if os.path.basename(arg) in CONTROLLER_SCRIPTS), None)
+            if script is None:
+                continue
+            cgroup = read_text(os.path.join(self.proc_root, pid, 'cgroup')) or ''
+            info.update(running=True, pid=int(pid), script=script,
+                        uptime=self.process_uptime(pid),
+                        service_active=BUTTON_SERVICE in cgroup)
+            break
+        return info
+
+    def process_uptime(self, pid):
+        """Seconds since the process started, from /proc/<pid>/stat"""
+        stat = read_text(os.path.join(self.proc_root, pid, 'stat'))
+        uptime = read_text(os.path.join(self.proc_root, 'uptime'))
+        if not stat or not uptime:
+            return None
+        # Fields after the parenthesised comm; starttime is field 22
+        fields = stat.rsplit(')', 1)[1].split()
+        started = int(fields[19]) / self.clock_ticks
+        return round(float(uptime.split()[0]) - started, 1)
+
+    def snapshot(self):
+        """Complete status as a JSON-serialisable dict"""
+        return {
+            'time': time.time(),
+            'driver': self.driver(),
+            'framebuffer': self.framebuffer(),
+            'drm_card': self.drm_card(),
+            'backlight': self.backlight(),
+            'params': self.params(),
+            'controller': self.controller(),
+        }
+
+
+def flatten(snapshot):
+    """{'section.key': value} view of a snapshot, used for change detection"""
+    flat = {}
+    for section, values in snapshot.items():
+        if section == 'time':
+            continue
+        if isinstance(values, dict):
+            for key, value in values.items():
+                flat[f"{section}.{key}"] = value
+        else:
+            flat[section] = values
+    return flat
+
+
+class StatusWatcher:
+    """Keeps a snapshot current, re-reading only what changed"""
+
+    def __init__(self, collector, interval=WATCH_INTERVAL):
+        self.collector = collector
+        self.interval = interval
+        self.snapshot = collector.snapshot()
+        self._inotify = None
+        self._dirs = {}
+        try:
+            inotify = Inotify()
+            for section, path in (('params', collector.sysfs.params_dir()),
+                                  ('backlight', collector.sysfs.backlight_dir())):
+                if os.path.isdir(path):
+                    self._dirs[inotify.add_watch(path, IN_MODIFY)] = section
+            self._inotify = inotify
+        except OSError:
+            self._dirs = {}
+
+    def _reread(self, section, name):
+        sysfs = self.collector.sysfs
+        if section == 'params':
+            self.snapshot['params'].update(self.collector.params([name]))
+            return
+        self.snapshot['backlight'][name] = self.collector.read_attr(sysfs.backlight(name))
+        self.snapshot['backlight']['available'] = self.snapshot['backlight']['brightness'] is not None
+
+    def wait(self):
+        """Block until something changed; returns [(key, old, new)]"""
+        poller = select.poll()
+        if self._inotify is not None:
+            poller.register(self._inotify.fileno(), select.POLLIN)
+
+        while True:
+            before = flatten(self.snapshot)
+            if poller.poll(self.interval * 1000):
+                for path, _, name in self._inotify.read_events():
+                    section = next((s for wd, s in self._dirs.items()
+                                    if self._inotify.watches[wd] == path), None)
+                    if section and name:
+                        self._reread(section, name)
+            else:
+                c = self.collector
+                # Driver-side changes (backlit, power save) never reach inotify
+                self.snapshot.update(driver=c.driver(), framebuffer=c.framebuffer(),
+                                     drm_card=c.drm_card(), controller=c.controller(),
+                                     backlight=c.backlight(), params=c.params())
+            self.snapshot['time'] = time.time()
+
+            after = flatten(self.snapshot)
+            changes = [(key, before.get(key), value) for key, value in after.items()
+                       if before.get(key) != value and key != 'controller.uptime']
+            if changes:
+                return changes
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+
+
+def format_uptime(seconds):
+    if seconds is None:
+        return 'N/A'
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    text = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{days}-{text}" if days else text
+
+
+def print_human(status):
+    """Same layout as the original jdi-status script"""
+    c = COLORS
+    print(f"{c['BLUE']}[INFO]{c['NC']} JDI Display System Status Monitor")
+    print("==================================")
+
+    if not status['driver']['loaded']:
+        print(f"Driver: {c['RED']}✗ Not loaded{c['NC']}")
+        print("Load with: sudo modprobe jdi_drm_enhanced")
+        return
+
+    print(f"Driver: {c['GREEN']}✓ Loaded{c['NC']}")
+    fb = status['framebuffer']
+    if fb['device']:
+        print(f"Framebuffer: {c['GREEN']}✓ Available at {fb['device']}{c['NC']}")
+    else:
+        print(f"Framebuffer: {c['RED']}✗ Not available{c['NC']}")
+    if fb['resolution']:
+        print(f"Resolution: {fb['resolution']}")
+    if status['drm_card']:
+        print(f"DRM Card: {c['GREEN']}✓ {status['drm_card']} available{c['NC']}")
+
+    print(f"\n{c['YELLOW']}PWM Backlight Status:{c['NC']}")
+    bl = status['backlight']
+    if bl['available']:
+        current, max_val = int(bl['brightness']), int(bl['max_brightness'] or 0)
+        if current > 0:
+            print(f"  Status: {c['GREEN']}✓ ON{c['NC']}")
+        else:
+            print(f"  Status: {c['RED']}✗ OFF{c['NC']}")
+        print(f"  Brightness: {current}/{max_val}")
+        if current > 0 and max_val:
+            print(f"  Percentage: {current * 100 // max_val}%")
+        print(f"  Type: {bl['type']}")
+    else:
+        print(f"  {c['RED']}✗ PWM backlight not available{c['NC']}")
+
+    params = status['params']
+    print(f"\n{c['YELLOW']}Display Mode:{c['NC']}")
+    color_mode = params.get('color')
+    if color_mode == 'Y':
+        print(f"  Mode: {c['GREEN']}COLOR{c['NC']}")
+        print(f"  Color cutoff: {params.get('color_cutoff') or 'N/A'}")
+    elif color_mode == 'N':
+        print(f"  Mode: {c['YELLOW']}MONOCHROME{c['NC']}")
+        print(f"  Mono cutoff: {params.get('mono_cutoff') or 'N/A'}")
+        print(f"  Inversion: {params.get('mono_invert') or 'N/A'}")
+    else:
+        print("  Mode: N/A (needs sudo or the control service)")
+
+    print(f"\n{c['YELLOW']}Power Management:{c['NC']}")
+    for param in ('auto_power_save', 'auto_clear', 'dither', 'idle_timeout'):
+        if param not in params:
+            continue
+        value = params[param]
+        if value in ('Y', '1'):
+            print(f"  {param}: {c['GREEN']}ON{c['NC']} ({value})")
+        elif value in ('N', '0'):
+            print(f"  {param}: {c['RED']}OFF{c['NC']} ({value})")
+        elif value is not None:
+            print(f"  {param}: {value}")
+        else:
+            print(f"  {param}: {c['YELLOW']}N/A{c['NC']} (needs sudo or the control service)")
+
+    print(f"\n{c['YELLOW']}Button Controller:{c['NC']}")
+    ctl = status['controller']
+    if ctl['running']:
+        print(f"  Status: {c['GREEN']}✓ Running{c['NC']} (PID: {ctl['pid']}, {ctl['script']})")
+        print(f"  Uptime: {format_uptime(ctl['uptime'])}")
+        if ctl['service_active']:
+            print(f"  Service: {c['GREEN']}✓ Active{c['NC']} (systemd)")
+        if ctl['service_enabled']:
+            print("  Auto-start: ✓ Enabled")
+    else:
+        print(f"  Status: {c['RED']}✗ Not running{c['NC']}")
+        print(f"  Start with: sudo systemctl start {BUTTON_SERVICE}")
+
+    print(f"\n{c['CYAN']}System Summary:{c['NC']}")
+    mark = lambda ok: '✓' if ok else '✗'
+    print(f"  Driver: ✓ | PWM: {mark(bl['available'])} | Button: {mark(ctl['running'])} | "
+          f"Display: {'COLOR' if color_mode == 'Y' else 'MONO'}")
+
+
+def print_commands():
+    print(f"\n{COLORS['CYAN']}Available Commands:{COLORS['NC']}")
+    print("  jdi-status                 - This system status monitor")
+    print("  jdi-status --json          - Status snapshot as JSON")
+    print("  jdi-status --watch         - Follow status changes")
+    print("  monoset [command]          - Color/mono mode control")
+    print("  brightness                 - Show PWM brightness")
+    print("  brightness-set N           - Set PWM brightness (0-3)")
+    print("  sudo powersave status      - Power management details")
+    print("  sudo optimize status       - Complete optimization status")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JDI display status')
+    parser.add_argument('--json', action='store_true', help='Print the snapshot as JSON')
+    parser.add_argument('--watch', action='store_true', help='Keep running and print changes')
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL,
+                        help='Seconds between full rescans in watch mode')
+    args = parser.parse_args()
+
+    collector = StatusCollector()
+    if not args.watch:
+        status = collector.snapshot()
+        if args.json:
+            print(json.dumps(status, indent=2, sort_keys=True))
+        else:
+            print_human(status)
+            print_commands()
+        return 0
+
+    watcher = StatusWatcher(collector, args.interval)
+    if args.json:
+        print(json.dumps(watcher.snapshot, sort_keys=True), flush=True)
+    else:
+        print_human(watcher.snapshot)
+        print(flush=True)
+    try:
+        while True:
+            changes = watcher.wait()
+            if args.json:
+                print(json.dumps({'time': watcher.snapshot['time'],
+                                  'changes': {k: new for k, _, new in changes}},
+                                 sort_keys=True), flush=True)
+            else:
+                stamp = time.strftime('%H:%M:%S')
+                for key, old, new in changes:
+                    print(f"[{stamp}] {key}: {old} -> {new}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+"""
+Persistent sysfs attribute access for the JDI tools
+Author: N@Xs - Enhanced Edition 2025
+
+Features:
+- Attribute file descriptors stay open, values are read/written with
+  os.pread/os.pwrite at offset 0 (no open/close per access)
+- Last known value is cached and writes that would not change anything
+  are skipped
+- Configurable sysfs root (JDI_SYSFS_ROOT) so the tools can run against a
+  temp-directory stand-in
+- Attribute names are plain file names, anything that could leave the
+  attribute directory ('/', '..') is refused
+"""
+
+import os
+
+SYSFS_ROOT = os.environ.get('JDI_SYSFS_ROOT', '/sys')
+MODULE_PARAMS_DIR = 'module/jdi_drm_enhanced/parameters'
+BACKLIGHT_DIR = 'class/backlight/jdi-backlight'
+
+READ_SIZE = 4096
+
+# Module parameters of the driver (src/params_iface.c)
+PARAM_NAMES = ('color', 'mono_cutoff', 'mono_invert', 'color_cutoff', 'overlays',
+               'auto_clear', 'backlit', 'auto_power_save', 'idle_timeout', 'dither')
+
+
+def check_name(name):
+    """Raise ValueError unless `name` is a single attribute file name"""
+    if not name or '/' in name or '\0' in name or name in ('.', '..'):
+        raise ValueError(f"Invalid attribute name: {name!r}")
+    return name
+
+
+class SysfsAttr:
+    """One sysfs attribute with a persistent fd and a value cache"""
+
+    def __init__(self, path, truncate=False):
+        self.path = path
+        self.truncate = truncate  # Regular files in a stand-in tree need it
+        self.fd = -1
+        self.writable = False
+        self.value = None
+        self.reads = 0
+        self.writes = 0
+        self.skipped = 0
+
+    def exists(self):
+        return self.fd >= 0 or os.path.exists(self.path)
+
+    def _open(self, write):
+        if self.fd >= 0 and (self.writable or not write):
+            return
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        if write:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CLOEXEC)
+            self.writable = True
+            return
+        try:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CLOEXEC)
+            self.writable = True
+        except PermissionError:
+            self.fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+            self.writable = False
+
+    def read(self):
+        """Read the current value (always hits the attribute)"""
+        self._open(write=False)
+        self.value = os.pread(self.fd, READ_SIZE, 0).decode().strip()
+        self.reads += 1
+        return self.value
+
+    def cached(self):
+        """Last known value, read once if nothing is known yet"""
+        if self.value is None:
+            return self.read()
+        return self.value
+
+    def write(self, value, force=False):
+        """Write `value` unless it matches the last known value
+
+        Returns True if the attribute was written.
+        """
+        text = str(value)
+        if not force and text == self.value:
+            self.skipped += 1
+            return False
+        self._open(write=True)
+        data = text.encode()
+        os.pwrite(self.fd, data, 0)
+        if self.truncate:
+            os.ftruncate(self.fd, len(data))
+        self.value = text
+        self.writes += 1
+        return True
+
+    def invalidate(self):
+        """Forget the cached value (someone else may have changed it)"""
+        self.value = None
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class Sysfs:
+    """Registry of open attributes below a sysfs root"""
+
+    def __init__(self, root=None):
+        self.root = root or SYSFS_ROOT
+        self.truncate = os.path.realpath(self.root) != '/sys'
+        self._attrs = {}
+        self._param_names = None
+
+    def attr(self, relpath):
+        attr = self._attrs.get(relpath)
+        if attr is None:
+            attr = SysfsAttr(os.path.join(self.root, relpath), self.truncate)
+            self._attrs[relpath] = attr
+        return attr
+
+    def path(self, relpath):
+        return os.path.join(self.root, relpath)
+
+    def param(self, name):
+        """Attribute of a jdi_drm_enhanced module parameter"""
+        return self.attr(os.path.join(MODULE_PARAMS_DIR, check_name(name)))
+
+    def backlight(self, name='brightness'):
+        """Attribute of the jdi-backlight class device"""
+        return self.attr(os.path.join(BACKLIGHT_DIR, check_name(name)))
+
+    def params_dir(self):
+        return self.path(MODULE_PARAMS_DIR)
+
+    def param_names(self):
+        """Parameter names the driver exposes (the known ones if it is not loaded)"""
+        if self._param_names is None:
+            try:
+                listed = os.listdir(self.params_dir())
+            except OSError:
+                return list(PARAM_NAMES)
+            self._param_names = sorted(set(PARAM_NAMES) | set(listed))
+        return self._param_names
+
+    def backlight_dir(self):
+        return self.path(BACKLIGHT_DIR)
+
+    def invalidate(self):
+        """Forget all cached values (long-running processes, before each request)"""
+        self._param_names = None
+        for attr in self._attrs.values():
+            attr.invalidate()
+
+    def stats(self):
+        """Per-attribute read/write/skip counters"""
+        return {relpath: {'reads': a.reads, 'writes': a.writes, 'skipped': a.skipped}
+                for relpath, a in self._attrs.items()}
+
+    def close(self):
+        for attr in self._attrs.values():
+            attr.close()
+
+
+_default = None
+
+
+def default_sysfs():
+    """Process-wide Sysfs instance for the configured root"""
+    global _default
+    if _default is None:
+        _default = Sysfs()
+    return _default
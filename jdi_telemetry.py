@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+"""
+Backlight and power telemetry for the JDI tools
+Author: N@Xs - Enhanced Edition 2025
+
+Features:
+- Time spent at each PWM backlight level
+- Button press counts and press-to-write latency histogram
+- Auto-dim and idle backlight-off events (the driver itself exposes no
+  power-save events)
+- Estimated backlight energy from a configurable per-level mW table
+- Ring buffer of recent samples
+- Atomic node-exporter textfile output (write to temp file + rename)
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+from collections import deque
+
+TEXTFILE_DIR = os.environ.get('JDI_TEXTFILE_DIR', '/var/lib/prometheus/node-exporter')
+TEXTFILE_NAME = 'jdi_backlight.prom'
+TEXTFILE_PATH = os.path.join(TEXTFILE_DIR, TEXTFILE_NAME)
+TELEMETRY_INTERVAL = 60  # Seconds between textfile writes
+
+# Estimated backlight draw per PWM level in mW; measure your board and
+# override with --level-mw
+LEVEL_MW = {0: 0.0, 1: 20.0, 2: 45.0, 3: 90.0}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+RING_SIZE = 256
+
+KMSG_PATH = '/dev/kmsg'
+
+
+def parse_level_mw(text):
+    """Parse '0:0,1:20,2:45,3:90' into {level: mW}"""
+    table = {}
+    for item in text.split(','):
+        level, sep, mw = item.partition(':')
+        if not sep:
+            raise ValueError(f"Expected level:mW, got '{item}'")
+        table[int(level)] = float(mw)
+    return table
+
+
+class Telemetry:
+    """Thread-safe backlight/power counters with Prometheus text output"""
+
+    def __init__(self, level_mw=None, ring_size=RING_SIZE, clock=time.monotonic):
+        self.level_mw = dict(LEVEL_MW if level_mw is None else level_mw)
+        self.clock = clock
+        self.samples = deque(maxlen=ring_size)
+        self._lock = threading.Lock()
+
+        self.start_time = time.time()
+        self.level = None
+        self._level_since = clock()
+        self.seconds_at_level = {}
+        self.energy_mj = 0.0
+
+        self.presses = {}
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.auto_dims = 0
+        self.power_events = {}
+        self.textfile_writes = 0
+
+    def _sample(self, kind, value):
+        self.samples.append((time.time(), kind, value))
+
+    def _close_interval(self, now):
+        if self.level is not None:
+            elapsed = now - self._level_since
+            self.seconds_at_level[self.level] = self.seconds_at_level.get(self.level, 0.0) + elapsed
+            self.energy_mj += self.level_mw.get(self.level, 0.0) * elapsed
+        self._level_since = now
+
+    def set_level(self, level):
+        """Record the PWM level now in effect"""
+        with self._lock:
+            if level == self.level:
+                return
+            self._close_interval(self.clock())
+            self.level = level
+            self._sample('level', level)
+
+    def press(self, button, latency=None):
+        """Record a button press; latency is press-to-write in seconds"""
+        with self._lock:
+            self.presses[button] = self.presses.get(button, 0) + 1
+            if latency is not None:
+                self.latency_sum += latency
+                self.latency_count += 1
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if latency <= bound:
+                        self.latency_buckets[i] += 1
+            self._sample('press', button)
+
+    def auto_dim(self):
+        with self._lock:
+            self.auto_dims += 1
+            self._sample('auto_dim', self.level)
+
+    def power_event(self, event):
+        """Power state change made by the tools (e.g. 'idle_off')"""
+        with self._lock:
+            self.power_events[event] = self.power_events.get(event, 0) + 1
+            self._sample('power', event)
+
+    def recent(self, count=None):
+        """Most recent samples as (wall time, kind, value), oldest first"""
+        with self._lock:
+            samples = list(self.samples)
+        return samples if count is None else samples[-count:]
+
+    def snapshot(self):
+        """Counters with the current level interval accounted up to now"""
+        with self._lock:
+            self._close_interval(self.clock())
+            return {
+                'start_time': self.start_time,
+                'level': self.level,
+                'power_mw': self.level_mw.get(self.level, 0.0) if self.level is not None else 0.0,
+                'seconds_at_level': dict(self.seconds_at_level),
+                'energy_joules': self.energy_mj / 1000.0,
+                'presses': dict(self.presses),
+                'latency_buckets': list(self.latency_buckets),
+                'latency_sum': self.latency_sum,
+                'latency_count': self.latency_count,
+                'auto_dims': self.auto_dims,
+                'power_events': dict(self.power_events),
+            }
+
+    def render(self):
+        """Prometheus text exposition format"""
+        s = self.snapshot()
+        lines = [
+            '# HELP jdi_backlight_level Current PWM backlight level',
+            '# TYPE jdi_backlight_level gauge',
+            f"jdi_backlight_level {s['level'] if s['level'] is not None else 'NaN'}",
+            '# HELP jdi_backlight_seconds_total Time spent at each PWM level',
+            '# TYPE jdi_backlight_seconds_total counter',
+        ]
+        for level in sorted(set(self.level_mw) | set(s['seconds_at_level'])):
+            lines.append(f'jdi_backlight_seconds_total{{level="{level}"}} '
+                         f"{s['seconds_at_level'].get(level, 0.0):.3f}")
+        lines += [
+            '# HELP jdi_backlight_power_milliwatts Estimated backlight draw at the current level',
+            '# TYPE jdi_backlight_power_milliwatts gauge',
+            f"jdi_backlight_power_milliwatts {s['power_mw']:.1f}",
+            '# HELP jdi_backlight_energy_joules_total Estimated backlight energy',
+            '# TYPE jdi_backlight_energy_joules_total counter',
+            f"jdi_backlight_energy_joules_total {s['energy_joules']:.3f}",
+            '# HELP jdi_button_presses_total Button presses',
+            '# TYPE jdi_button_presses_total counter',
+        ]
+        for button, count in sorted(s['presses'].items()):
+            lines.append(f'jdi_button_presses_total{{button="{button}"}} {count}')
+        lines += [
+            '# HELP jdi_button_latency_seconds Button press to backlight write latency',
+            '# TYPE jdi_button_latency_seconds histogram',
+        ]
+        for bound, count in zip(LATENCY_BUCKETS, s['latency_buckets']):
+            lines.append(f'jdi_button_latency_seconds_bucket{{le="{bound}"}} {count}')
+        lines += [
+            f'jdi_button_latency_seconds_bucket{{le="+Inf"}} {s["latency_count"]}',
+            f"jdi_button_latency_seconds_sum {s['latency_sum']:.6f}",
+            f"jdi_button_latency_seconds_count {s['latency_count']}",
+            '# HELP jdi_auto_dim_total Auto-dim events',
+            '# TYPE jdi_auto_dim_total counter',
+            f"jdi_auto_dim_total {s['auto_dims']}",
+            '# HELP jdi_panel_power_events_total Power state changes made by the idle engine',
+            '# TYPE jdi_panel_power_events_total counter',
+        ]
+        for event, count in sorted(s['power_events'].items()):
+            lines.append(f'jdi_panel_power_events_total{{event="{event}"}} {count}')
+        lines += [
+            '# HELP jdi_telemetry_start_time_seconds When collection started',
+            '# TYPE jdi_telemetry_start_time_seconds gauge',
+            f"jdi_telemetry_start_time_seconds {s['start_time']:.0f}",
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path=TEXTFILE_PATH):
+        """Atomically replace the node-exporter textfile
+
+        Returns False if the directory does not exist.
+        """
+        directory = os.path.dirname(path) or '.'
+        if not os.path.isdir(directory):
+            return False
+        data = self.render().encode()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        os.replace(tmp, path)
+        self.textfile_writes += 1
+        return True
+
+
+class KmsgWatcher:
+    """Passes the driver's button messages in /dev/kmsg to the latency tracer"""
+
+    def __init__(self, tracer, path=KMSG_PATH):
+        self.tracer = tracer    # jdi_latency.LatencyTracer
+        self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+        os.lseek(self.fd, 0, os.SEEK_END)  # Only new messages
+
+    def read(self):
+        """Process all pending records"""
+        while True:
+            try:
+                record = os.read(self.fd, 8192)
+            except BlockingIOError:
+                return
+            except BrokenPipeError:
+                continue  # Ring buffer overwrote records we had not read
+            if not record:
+                return
+            prefix, _, message = record.partition(b';')
+            # prefix is "priority,sequence,timestamp_us,flags"
+            fields = prefix.split(b',')
+            if len(fields) > 2 and fields[2].isdigit():
+                self.tracer.kmsg_message(int(fields[2]), message.decode(errors='replace'))
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def read_textfile(path=TEXTFILE_PATH):
+    """Parse a written textfile back into {metric{labels}: value}"""
+    metrics = {}
+    with open(path, 'r') as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            name, _, value = line.rpartition(' ')
+            metrics[name] = float(value)
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show JDI backlight telemetry')
+    parser.add_argument('--textfile', default=TEXTFILE_PATH, help='Textfile to read')
+    parser.add_argument('--raw', action='store_true', help='Print the textfile as is')
+    args = parser.parse_args()
+
+    try:
+        if args.raw:
+            with open(args.textfile, 'r') as f:
+                sys.stdout.write(f.read())
+            return 0
+        metrics = read_textfile(args.textfile)
+    except OSError as e:
+        print(f"No telemetry available: {e}")
+        return 1
+
+    for name, value in metrics.items():
+        print(f"{name:48} {value:g}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
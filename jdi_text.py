@@ -0,0 +1,416 @@
+#!/usr/bin/python3
+"""
+Glyph-cached 1bpp text renderer for the JDI panel
+Author: N@Xs - Enhanced Edition 2025
+
+fbcon draws text into XRGB8888 and the driver converts and thresholds
+every pixel again. Text is already 1 bit deep: this renderer keeps a grid
+of character cells, builds packed 400-pixel rows by byte-blitting cached
+glyph rows and emits only the rows of text cells that changed, either as
+mono tagged lines (the panel's wire format) or into a framebuffer view.
+
+Features:
+- PSF1/PSF2 console fonts (gzip too), TrueType/OpenType when Pillow is
+  installed, integer scaling for bigger sizes
+- Bit-packed glyph cache shared by several fonts and sizes, LRU-bounded
+- Cell widths padded to whole bytes so rows are plain byte copies
+- Changed-cell tracking: only touched text rows are rendered and sent
+"""
+
+import os
+import sys
+import gzip
+import time
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    ImageFont = None
+
+from jdi_encoder import WIDTH, HEIGHT, CMD_WRITE_MONO
+
+FONT_DIRS = ('/usr/share/consolefonts', '/usr/share/kbd/consolefonts')
+# Same family as the fbcon=font:VGA8x8 the panel is set up with
+DEFAULT_FONTS = ('Uni2-VGA8.psf.gz', 'Lat15-VGA8.psf.gz', 'Uni2-VGA16.psf.gz',
+                 'default8x16.psfu.gz', 'default8x16.psf.gz')
+GLYPH_CACHE_SIZE = 2048
+
+PSF1_MAGIC = b'\x36\x04'
+PSF1_MODE512 = 0x01
+PSF1_MODEHASTAB = 0x02
+PSF1_MODEHASSEQ = 0x04
+PSF1_SEPARATOR = 0xFFFF
+PSF1_STARTSEQ = 0xFFFE
+PSF2_MAGIC = b'\x72\xb5\x4a\x86'
+PSF2_HAS_UNICODE_TABLE = 0x01
+PSF2_SEPARATOR = 0xFF
+PSF2_STARTSEQ = 0xFE
+
+WHITE = 0xffffffff
+BLACK = 0xff000000
+
+
+class PsfFont:
+    """Linux console font (PSF1 or PSF2, optionally gzip compressed)"""
+
+    def __init__(self, path, scale=1):
+        self.path = path
+        self.scale = scale
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            data = f.read()
+
+        if data[:2] == PSF1_MAGIC:
+            mode, charsize = data[2], data[3]
+            count = 512 if mode & PSF1_MODE512 else 256
+            width, height, offset = 8, charsize, 4
+            has_table = mode & (PSF1_MODEHASTAB | PSF1_MODEHASSEQ)
+        elif data[:4] == PSF2_MAGIC:
+            header = np.frombuffer(data, dtype='<u4', count=8)
+            _, _, offset, flags, count, charsize, height, width = (int(v) for v in header)
+            has_table = flags & PSF2_HAS_UNICODE_TABLE
+        else:
+            raise ValueError(f"{path}: not a PSF font")
+
+        row_bytes = (width + 7) // 8
+        glyphs = np.frombuffer(data, dtype=np.uint8, count=count * charsize, offset=offset)
+        glyphs = glyphs.reshape(count, height, charsize // height)[:, :, :row_bytes]
+        self.glyphs = np.unpackbits(glyphs, axis=2)[:, :, :width].astype(bool)
+        self.width = width
+        self.height = height
+
+        table = data[offset + count * charsize:] if has_table else b''
+        if data[:2] == PSF1_MAGIC:
+            self.index = self._psf1_table(table)
+        else:
+            self.index = self._psf2_table(table)
+
+        self.key = ('psf', os.path.basename(path), scale)
+        self.cell_width = -(-width * scale // 8) * 8
+        self.cell_height = height * scale
+
+    @staticmethod
+    def _psf1_table(table):
+        index = {}
+        codes = np.frombuffer(table[:len(table) // 2 * 2], dtype='<u2')
+        glyph = 0
+        in_sequence = False
+        for code in codes:
+            if code == PSF1_SEPARATOR:
+                glyph += 1
+                in_sequence = False
+            elif code == PSF1_STARTSEQ:
+                in_sequence = True
+            elif not in_sequence:
+                index.setdefault(chr(code), glyph)
+        return index
+
+    @staticmethod
+    def _psf2_table(table):
+        index = {}
+        for glyph, entry in enumerate(table.split(bytes((PSF2_SEPARATOR,)))):
+            singles = entry.split(bytes((PSF2_STARTSEQ,)), 1)[0]
+            for char in singles.decode('utf-8', errors='ignore'):
+                index.setdefault(char, glyph)
+        return index
+
+    def _glyph_index(self, char):
+        if self.index:
+            return self.index.get(char, self.index.get('?', 0))
+        code = ord(char)  # No table: glyphs are in code page order
+        return code if code < len(self.glyphs) else ord('?')
+
+    def rasterize(self, char):
+        """Ink bits of `char` as an (cell_height, cell_width) bool array"""
+        bits = self.glyphs[self._glyph_index(char)]
+        if self.scale > 1:
+            bits = bits.repeat(self.scale, axis=0).repeat(self.scale, axis=1)
+        cell = np.zeros((self.cell_height, self.cell_width), dtype=bool)
+        cell[:, :bits.shape[1]] = bits
+        return cell
+
+
+class TrueTypeFont:
+    """Monospaced TrueType/OpenType font rasterized with Pillow"""
+
+    def __init__(self, path, size):
+        if ImageFont is None:
+            raise ValueError("TrueType fonts need Pillow (sudo apt install python3-pil)")
+        self.path = path
+        self.font = ImageFont.truetype(path, size)
+        ascent, descent = self.font.getmetrics()
+        self.key = ('ttf', os.path.basename(path), size)
+        self.cell_width = -(-int(round(self.font.getlength('M'))) // 8) * 8
+        self.cell_height = ascent + descent
+
+    def rasterize(self, char):
+        image = Image.new('1', (self.cell_width, self.cell_height), 0)
+        ImageDraw.Draw(image).text((0, 0), char, font=self.font, fill=1)
+        return np.array(image, dtype=bool)
+
+
+def find_font(name=None):
+    """Resolve a font file name against the console font directories"""
+    names = [name] if name else DEFAULT_FONTS
+    for candidate in names:
+        if os.path.isfile(candidate):
+            return candidate
+        for directory in FONT_DIRS:
+            path = os.path.join(directory, candidate)
+            if os.path.isfile(path):
+                return path
+    raise ValueError(f"Font not found: {name or ', '.join(DEFAULT_FONTS)}")
+
+
+def load_font(name=None, size=None):
+    """Load a console font (size = integer scale) or TrueType font (size = px)"""
+    path = find_font(name)
+    if path.endswith(('.ttf', '.otf')):
+        return TrueTypeFont(path, size or 16)
+    return PsfFont(path, size or 1)
+
+
+class GlyphCache:
+    """Bit-packed glyphs keyed by (font, char), least recently used dropped first"""
+
+    def __init__(self, max_glyphs=GLYPH_CACHE_SIZE):
+        self.max_glyphs = max_glyphs
+        self._glyphs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def glyph(self, font, char):
+        """(cell_height, cell_width / 8) uint8 ink rows of `char`"""
+        key = (font.key, char)
+        packed = self._glyphs.get(key)
+        if packed is not None:
+            self._glyphs.move_to_end(key)
+            self.hits += 1
+            return packed
+
+        self.misses += 1
+        packed = np.packbits(font.rasterize(char), axis=1)
+        self._glyphs[key] = packed
+        if len(self._glyphs) > self.max_glyphs:
+            self._glyphs.popitem(last=False)
+            self.evictions += 1
+        return packed
+
+    def stats(self):
+        return {
+            'glyphs': len(self._glyphs),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class TextRenderer:
+    """Character grid rendered straight to packed panel rows
+
+    Panel bits are 1 for white. Dark text on white unless `inverse`.
+    """
+
+    def __init__(self, font, width=WIDTH, height=HEIGHT, cache=None, inverse=False):
+        self.font = font
+        self.width = width
+        self.height = height
+        self.cache = cache or GlyphCache()
+        self.inverse = inverse
+
+        self.cols = width // font.cell_width
+        self.rows = height // font.cell_height
+        self.cells = np.full((self.rows, self.cols), ' ', dtype='<U1')
+        self.dirty = np.ones(self.rows, dtype=bool)  # First update sends everything
+        self.packed = np.full((height, width // 8), 0x00 if inverse else 0xFF, dtype=np.uint8)
+
+        # Counters
+        self.updates = 0
+        self.text_rows_rendered = 0
+        self.lines_emitted = 0
+
+    # Text
+
+    def write(self, row, col, text):
+        """Put `text` at a cell position (clipped to the grid)"""
+        if not 0 <= row < self.rows or col >= self.cols:
+            return
+        if col < 0:
+            text, col = text[-col:], 0
+        text = text[:self.cols - col]
+        if not text:
+            return
+        chars = np.array(list(text), dtype='<U1')
+        current = self.cells[row, col:col + len(chars)]
+        if (current != chars).any():
+            current[:] = chars
+            self.dirty[row] = True
+
+    def write_line(self, row, text):
+        """Replace a whole text row (padded with spaces)"""
+        self.write(row, 0, text[:self.cols].ljust(self.cols))
+
+    def set_text(self, text):
+        """Replace the whole screen with `text`, one text row per line"""
+        lines = text.split('\n')
+        for row in range(self.rows):
+            self.write_line(row, lines[row] if row < len(lines) else '')
+
+    def clear(self):
+        self.set_text('')
+
+    # Rendering
+
+    def update(self):
+        """Render changed text rows into `packed`, returns the pixel rows touched"""
+        text_rows = np.flatnonzero(self.dirty)
+        if not len(text_rows):
+            return np.zeros(0, dtype=np.intp)
+
+        glyph = self.cache.glyph
+        font = self.font
+        h = font.cell_height
+        span = self.cols * font.cell_width // 8
+        for row in text_rows:
+            # (cols, h, cell bytes) -> (h, cols * cell bytes)
+            glyphs = np.stack([glyph(font, char) for char in self.cells[row]])
+            ink = glyphs.transpose(1, 0, 2).reshape(h, span)
+            dest = self.packed[row * h:(row + 1) * h, :span]
+            if self.inverse:
+                dest[:] = ink
+            else:
+                np.invert(ink, out=dest)
+
+        self.dirty[:] = False
+        self.updates += 1
+        self.text_rows_rendered += len(text_rows)
+        return (text_rows[:, np.newaxis] * h + np.arange(h)).ravel()
+
+    def tagged_lines(self, rows):
+        """Mono tagged lines (1-based tag, data, zero trailer) for pixel rows"""
+        lines = np.empty((len(rows), self.width // 8 + 2), dtype=np.uint8)
+        lines[:, 0] = (np.asarray(rows) + 1) & 0xFF
+        lines[:, 1:-1] = self.packed[rows]
+        lines[:, -1] = 0
+        self.lines_emitted += len(rows)
+        return lines
+
+    def render(self):
+        """Tagged lines of every changed pixel row (empty if nothing changed)"""
+        return self.tagged_lines(self.update())
+
+    def message(self):
+        """SPI write-line message with the changed rows, b'' if nothing changed
+
+        Line tags address rows individually, so rows from several text
+        rows go into one message.
+        """
+        lines = self.render()
+        if not len(lines):
+            return b''
+        return bytes((CMD_WRITE_MONO,)) + lines.tobytes() + b'\x00'
+
+    def draw(self, fb):
+        """Draw changed rows into a jdi_fb framebuffer and mark them damaged"""
+        rows = self.update()
+        if not len(rows):
+            return rows
+        h = self.font.cell_height
+        for y in rows[::h]:
+            bits = np.unpackbits(self.packed[y:y + h], axis=1)[:, :fb.width]
+            fb.xrgb[y:y + h, :bits.shape[1]] = np.where(bits, np.uint32(WHITE), np.uint32(BLACK))
+            fb.damage(0, int(y), bits.shape[1], h)
+        return rows
+
+    def stats(self):
+        s = {
+            'cols': self.cols,
+            'rows': self.rows,
+            'updates': self.updates,
+            'text_rows_rendered': self.text_rows_rendered,
+            'lines_emitted': self.lines_emitted,
+        }
+        s.update(self.cache.stats())
+        return s
+
+
+def bench(renderer, frames):
+    """Clock line plus a scrolling log, returns (seconds, lines, bytes)"""
+    lines = 0
+    size = 0
+    started = time.perf_counter()
+    for n in range(frames):
+        renderer.write(0, 0, f"{n:08d} {time.strftime('%H:%M:%S')}")
+        if n % 10 == 0:
+            renderer.write_line(1 + (n // 10) % (renderer.rows - 1), f"log entry {n}")
+        message = renderer.message()
+        if message:
+            lines += (len(message) - 2) // (renderer.width // 8 + 2)
+            size += len(message)
+    return time.perf_counter() - started, lines, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render text straight to JDI mono lines')
+    parser.add_argument('text', nargs='?', help='Text file, "-" for stdin')
+    parser.add_argument('--font', help='PSF/TTF font file or name in the console font dirs')
+    parser.add_argument('--size', type=int, help='Scale for PSF fonts, pixel size for TTF')
+    parser.add_argument('--inverse', action='store_true', help='White text on black')
+    parser.add_argument('--output', help='Write the SPI message to a file ("-" for stdout)')
+    parser.add_argument('--fb', choices=['dumb', 'fbdev', 'file'], help='Draw into a framebuffer')
+    parser.add_argument('--device', help='DRM card, fbdev node or file for --fb')
+    parser.add_argument('--bench', type=int, metavar='FRAMES', help='Clock/log update benchmark')
+    args = parser.parse_args()
+
+    try:
+        font = load_font(args.font, args.size)
+    except (OSError, ValueError) as e:
+        print(f"Error loading font: {e}")
+        return 1
+    renderer = TextRenderer(font, inverse=args.inverse)
+
+    if args.bench:
+        renderer.message()
+        elapsed, lines, size = bench(renderer, args.bench)
+        s = renderer.stats()
+        print(f"{renderer.cols}x{renderer.rows} cells of {font.cell_width}x{font.cell_height}")
+        print(f"{args.bench} updates in {elapsed * 1000:.1f} ms "
+              f"({elapsed * 1e6 / args.bench:.0f} us/update)")
+        print(f"Lines: {lines / args.bench:.1f}/update of {renderer.height}, "
+              f"{size / args.bench:.0f} bytes/update")
+        print(f"Glyph cache: {s['glyphs']} glyphs, {s['hits']} hits, {s['misses']} misses")
+        return 0
+
+    if args.text:
+        with (sys.stdin if args.text == '-' else open(args.text, 'r')) as f:
+            renderer.set_text(f.read().expandtabs())
+
+    if args.fb:
+        from jdi_fb import open_framebuffer
+        try:
+            fb = open_framebuffer(args.fb, args.device)
+        except (OSError, ValueError) as e:
+            print(f"Error opening {args.fb} framebuffer: {e}")
+            return 1
+        with fb:
+            renderer.draw(fb)
+            fb.flush()
+    elif args.output:
+        message = renderer.message()
+        if args.output == '-':
+            sys.stdout.buffer.write(message)
+        else:
+            with open(args.output, 'wb') as f:
+                f.write(message)
+    else:
+        print(f"{renderer.cols}x{renderer.rows} cells, {len(renderer.render())} lines to send")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+#!/usr/bin/python3
+"""
+Automatic mono_cutoff/color_cutoff tuner for the JDI driver
+Author: N@Xs - Enhanced Edition 2025
+
+The cutoffs are hand-picked per profile (mono_cutoff 32/48/50/75,
+color_cutoff 110-127) and fine detail is lost whenever the content does
+not match. The tuner samples the framebuffer, keeps luminance and channel
+histograms up to date for the rows that changed and picks the threshold
+that best separates the content (Otsu).
+
+Features:
+- Per-row histograms: only changed rows are re-counted, the frame
+  histogram is updated by subtracting/adding them
+- Bounded work per tick (rows and column subsampling), rows over the
+  budget are carried over to the next tick
+- Otsu threshold with a separability floor (flat content keeps the
+  current value), hysteresis and a settle count against flicker
+- Module parameters written only when the value really changes, cost
+  per tick reported
+"""
+
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from jdi_encoder import xrgb8888_to_gray8, xrgb8888_to_bgr888
+from jdi_sysfs import default_sysfs
+
+INTERVAL = 2.0          # Seconds between samples
+MAX_ROWS = 60           # Rows histogrammed per tick
+COLUMN_STEP = 2         # Every Nth column is sampled
+HYSTERESIS = 8          # Minimum change worth a parameter write
+SETTLE = 3              # Ticks a new value must hold before it is written
+MIN_SEPARABILITY = 0.5  # Otsu between-class / total variance floor
+MIN_CUTOFF = 16
+MAX_CUTOFF = 240
+BINS = 256
+
+
+def otsu(hist):
+    """Otsu threshold of a 256-bin histogram: (cutoff, separability)
+
+    Values >= cutoff are the bright class, matching the driver's
+    `>= cutoff` test. Separability is between-class over total variance
+    (0 for flat content, close to 1 for clean two-level content).
+    """
+    hist = np.asarray(hist, dtype=np.float64)
+    total = hist.sum()
+    if total == 0:
+        return None, 0.0
+    levels = np.arange(len(hist))
+    p = hist / total
+    omega = np.cumsum(p)
+    mu = np.cumsum(p * levels)
+    mu_t = mu[-1]
+    var_t = (p * (levels - mu_t) ** 2).sum()
+    if var_t == 0:
+        return None, 0.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_b = (mu_t * omega - mu) ** 2 / (omega * (1.0 - omega))
+    var_b[~np.isfinite(var_b)] = 0.0
+    # Empty bins make a plateau of equal maxima; take its middle
+    best = np.flatnonzero(var_b >= var_b.max() * (1 - 1e-9))
+    k = int(best[len(best) // 2])
+    return k + 1, float(var_b[k] / var_t)
+
+
+class RowHistograms:
+    """Frame histogram kept up to date from per-row histograms"""
+
+    def __init__(self, height):
+        self.rows = np.zeros((height, BINS), dtype=np.int32)
+        self.total = np.zeros(BINS, dtype=np.int64)
+
+    def update(self, rows, values):
+        """Replace the histograms of `rows`; values is (len(rows), n) uint8"""
+        count = len(rows)
+        offsets = (np.arange(count) * BINS)[:, np.newaxis]
+        new = np.bincount((values.astype(np.int32) + offsets).ravel(),
+                          minlength=count * BINS).reshape(count, BINS)
+        self.total += new.sum(axis=0) - self.rows[rows].sum(axis=0)
+        self.rows[rows] = new
+
+
+class CutoffTuner:
+    """Samples a framebuffer view and keeps the cutoff parameters tuned
+
+    `frame` is an (H, W, 4) XRGB8888 array that stays valid between
+    ticks (a jdi_fb view of /dev/fb0). Without a loop, call tick() from
+    the application's own loop.
+    """
+
+    def __init__(self, frame, sysfs=None, max_rows=MAX_ROWS, column_step=COLUMN_STEP,
+                 hysteresis=HYSTERESIS, settle=SETTLE, min_separability=MIN_SEPARABILITY,
+                 dry_run=False, interval=INTERVAL):
+        self.frame = frame
+        self.sysfs = sysfs or default_sysfs()
+        self.max_rows = max_rows
+        self.column_step = column_step
+        self.hysteresis = hysteresis
+        self.settle = settle
+        self.min_separability = min_separability
+        self.dry_run = dry_run
+        self.interval = interval
+
+        height = frame.shape[0]
+        self.previous = np.zeros(frame.shape[:2], dtype=np.uint32)
+        self.pending = np.ones(height, dtype=bool)  # First ticks cover every row
+        self.gray = RowHistograms(height)
+        self.channel = RowHistograms(height)
+        self.candidates = {'mono_cutoff': [None, 0], 'color_cutoff': [None, 0]}
+        self.suggested = {'mono_cutoff': None, 'color_cutoff': None}
+        self.separability = {'mono_cutoff': 0.0, 'color_cutoff': 0.0}
+        self.primed = False     # Set once every row has been counted
+
+        self.loop = None
+        self._handle = None
+
+        # Counters
+        self.ticks = 0
+        self.rows_sampled = 0
+        self.rows_deferred = 0
+        self.writes = 0
+        self.tick_ns = 0
+        self.max_tick_ns = 0
+
+    # Event loop side
+
+    def start(self, loop):
+        self.loop = loop
+        self._handle = loop.call_soon(self._on_timer)
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _on_timer(self):
+        self.tick()
+        self._handle = self.loop.call_later(self.interval, self._on_timer)
+
+    # Sampling
+
+    def changed_rows(self):
+        """Mark rows that differ from the last sample as pending"""
+        current = self.frame.view(np.uint32).reshape(self.previous.shape)
+        changed = (current != self.previous).any(axis=1)
+        self.pending |= changed
+        return changed
+
+    def sample(self):
+        """Re-count up to max_rows pending rows, returns the rows done"""
+        rows = np.flatnonzero(self.pending)
+        self.rows_deferred += max(0, len(rows) - self.max_rows)
+        rows = rows[:self.max_rows]
+        if not len(rows):
+            return rows
+
+        pixels = self.frame[rows, ::self.column_step]
+        self.previous[rows] = self.frame[rows].view(np.uint32).reshape(len(rows), -1)
+        self.gray.update(rows, xrgb8888_to_gray8(pixels))
+        self.channel.update(rows, xrgb8888_to_bgr888(pixels).reshape(len(rows), -1))
+        self.pending[rows] = False
+        self.rows_sampled += len(rows)
+        return rows
+
+    # Decisions
+
+    def _decide(self, name, hist, current):
+        cutoff, separability = otsu(hist)
+        self.separability[name] = separability
+        if cutoff is None or separability < self.min_separability:
+            self.candidates[name] = [None, 0]
+            return None
+        cutoff = min(MAX_CUTOFF, max(MIN_CUTOFF, cutoff))
+        self.suggested[name] = cutoff
+        if current is not None and abs(cutoff - current) < self.hysteresis:
+            self.candidates[name] = [None, 0]
+            return None
+
+        candidate, count = self.candidates[name]
+        if candidate is not None and abs(cutoff - candidate) < self.hysteresis:
+            count += 1
+        else:
+            count = 1
+        self.candidates[name] = [cutoff, count]
+        return cutoff if count >= self.settle else None
+
+    def current(self, name):
+        try:
+            return int(self.sysfs.param(name).read())
+        except (OSError, ValueError):
+            return None
+
+    def tick(self):
+        """Sample, update the histograms and write settled cutoffs"""
+        started = time.monotonic_ns()
+        self.changed_rows()
+        self.sample()
+        self.primed = self.primed or not self.pending.any()
+
+        written = {}
+        for name, hist in (('mono_cutoff', self.gray.total),
+                           ('color_cutoff', self.channel.total)):
+            if not self.primed:
+                break
+            value = self._decide(name, hist, self.current(name))
+            if value is None:
+                continue
+            self.candidates[name] = [None, 0]
+            if not self.dry_run:
+                try:
+                    if self.sysfs.param(name).write(value):
+                        self.writes += 1
+                except OSError as e:
+                    print(f"Warning: could not write {name}: {e}")
+                    continue
+            written[name] = value
+
+        elapsed = time.monotonic_ns() - started
+        self.ticks += 1
+        self.tick_ns += elapsed
+        self.max_tick_ns = max(self.max_tick_ns, elapsed)
+        return written
+
+    def stats(self):
+        ticks = self.ticks or 1
+        return {
+            'ticks': self.ticks,
+            'rows_sampled': self.rows_sampled,
+            'rows_deferred': self.rows_deferred,
+            'writes': self.writes,
+            'suggested': dict(self.suggested),
+            'separability': {k: round(v, 3) for k, v in self.separability.items()},
+            'tick_ms': self.tick_ns / ticks / 1e6,
+            'max_tick_ms': self.max_tick_ns / 1e6,
+            'cpu_percent': self.tick_ns / ticks / 1e7 / self.interval if self.interval else 0.0,
+        }
+
+
+def frame_from_image(path):
+    """Load a PPM/raw frame as an (H, W, 4) XRGB8888 array"""
+    import jdi_dither
+    frame = jdi_dither.load_frame(path)
+    if frame.ndim == 2:
+        return np.repeat(frame[:, :, np.newaxis], 4, axis=2)
+    if frame.shape[2] == 3:
+        return jdi_dither.rgb_to_xrgb(frame)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the JDI cutoff parameters to the content')
+    parser.add_argument('--image', help='Analyse a PPM/raw frame once instead of the framebuffer')
+    parser.add_argument('--fb', default='/dev/fb0', help='Framebuffer device to sample')
+    parser.add_argument('--interval', type=float, default=INTERVAL)
+    parser.add_argument('--max-rows', type=int, default=MAX_ROWS, help='Rows per tick')
+    parser.add_argument('--column-step', type=int, default=COLUMN_STEP)
+    parser.add_argument('--hysteresis', type=int, default=HYSTERESIS)
+    parser.add_argument('--settle', type=int, default=SETTLE)
+    parser.add_argument('--dry-run', action='store_true', help='Report, do not write parameters')
+    parser.add_argument('--json', action='store_true', help='Print stats as JSON')
+    args = parser.parse_args()
+
+    fb = None
+    try:
+        if args.image:
+            frame = frame_from_image(args.image)
+        else:
+            from jdi_fb import FbdevFramebuffer
+            fb = FbdevFramebuffer(args.fb)
+            frame = fb.pixels
+    except (OSError, ValueError) as e:
+        print(f"Error opening frame source: {e}")
+        return 1
+
+    tuner = CutoffTuner(frame, max_rows=frame.shape[0] if args.image else args.max_rows,
+                        column_step=args.column_step, hysteresis=args.hysteresis,
+                        settle=1 if args.image else args.settle,
+                        dry_run=args.dry_run or bool(args.image), interval=args.interval)
+
+    def report():
+        s = tuner.stats()
+        if args.json:
+            print(json.dumps(s))
+        else:
+            print(f"mono_cutoff {s['suggested']['mono_cutoff']} "
+                  f"(separability {s['separability']['mono_cutoff']}), "
+                  f"color_cutoff {s['suggested']['color_cutoff']} "
+                  f"(separability {s['separability']['color_cutoff']}); "
+                  f"{s['tick_ms']:.2f} ms/tick, {s['writes']} writes")
+
+    try:
+        if args.image:
+            tuner.tick()
+            report()
+            return 0
+        while True:
+            written = tuner.tick()
+            for name, value in written.items():
+                print(f"{name} -> {value}")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        report()
+    finally:
+        if fb is not None:
+            fb.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
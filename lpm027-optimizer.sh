@@ -12,6 +12,18 @@ PURPLE='\033[0;35m'
 CYAN='\033[0;36m'
 NC='\033[0m'
 
+# Profiles are applied in one process by jdi_profiles.py (diff-only, rollback on error),
+# through the resident control service when it runs (no sudo, no interpreter start-up)
+SCRIPT_DIR="$(cd "$(dirname "$(readlink -f "${BASH_SOURCE[0]}")")" && pwd)"
+
+apply_profile() {
+    python3 -S "$SCRIPT_DIR/jdi_ctl.py" profile --quiet "$@" 2>/dev/null
+    local rc=$?
+    # 2: control service not running
+    [ $rc -ne 2 ] && return $rc
+    sudo python3 "$SCRIPT_DIR/jdi_profiles.py" --quiet "$@"
+}
+
 log_info() {
     echo -e "${BLUE}[INFO]${NC} $1"
 }
@@ -66,79 +78,42 @@ check_display() {
 optimize_for_performance() {
     log_info "Aplicando optimización de rendimiento para LPM027M128C..."
     
-    # Configuración de dithering optimizada para IGZO
-    echo '1' | sudo tee /sys/module/jdi_drm_enhanced/parameters/dither > /dev/null
+    # Dithering, color cutoff 120, mono cutoff 48, auto clear, overlays
+    apply_profile performance || { log_error "Error aplicando el perfil (cambios revertidos)"; return 1; }
     log_success "Dithering habilitado (optimizado para IGZO)"
-    
-    # Configuración de color optimizada
-    echo 'Y' | sudo tee /sys/module/jdi_drm_enhanced/parameters/color > /dev/null
-    echo '120' | sudo tee /sys/module/jdi_drm_enhanced/parameters/color_cutoff > /dev/null
     log_success "Modo color habilitado con cutoff optimizado (120)"
-    
-    # Mono settings optimizados para contraste IGZO
-    echo '48' | sudo tee /sys/module/jdi_drm_enhanced/parameters/mono_cutoff > /dev/null
     log_success "Mono cutoff optimizado para contraste IGZO (48)"
-    
-    # Auto clear para preservar la memoria LCD
-    echo 'Y' | sudo tee /sys/module/jdi_drm_enhanced/parameters/auto_clear > /dev/null
     log_success "Auto clear habilitado (preserva memoria LCD)"
-    
-    # Overlays para mejor rendimiento
-    echo 'Y' | sudo tee /sys/module/jdi_drm_enhanced/parameters/overlays > /dev/null
     log_success "Overlays habilitados"
 }
 
 optimize_for_battery() {
     log_info "Aplicando optimización de batería para LPM027M128C..."
     
-    # Auto power save con timeout agresivo
-    echo 'Y' | sudo tee /sys/module/jdi_drm_enhanced/parameters/auto_power_save > /dev/null
-    echo '300000' | sudo tee /sys/module/jdi_drm_enhanced/parameters/idle_timeout > /dev/null
-    log_success "Auto power save configurado (60s timeout)"
-    
-    # Modo mono para ahorro de energía
-    echo 'N' | sudo tee /sys/module/jdi_drm_enhanced/parameters/color > /dev/null
-    echo '40' | sudo tee /sys/module/jdi_drm_enhanced/parameters/mono_cutoff > /dev/null
+    # Auto power save, mono mode cutoff 40, PWM backlight at minimum
+    apply_profile battery || { log_error "Error aplicando el perfil (cambios revertidos)"; return 1; }
+    log_success "Auto power save configurado (300s timeout)"
     log_success "Modo mono para ahorro de energía (cutoff 40)"
-    
-    # PWM backlight al mínimo
-    echo '1' > /sys/class/backlight/jdi-backlight/brightness
     log_success "Backlight PWM al mínimo (nivel 1)"
 }
 
 optimize_for_quality() {
     log_info "Aplicando optimización de calidad para LPM027M128C..."
     
-    # Configuración de alta calidad
-    echo 'Y' | sudo tee /sys/module/jdi_drm_enhanced/parameters/color > /dev/null
-    echo '140' | sudo tee /sys/module/jdi_drm_enhanced/parameters/color_cutoff > /dev/null
+    # Color cutoff 140, dithering, mono cutoff 60 without inversion, backlight
+    apply_profile quality || { log_error "Error aplicando el perfil (cambios revertidos)"; return 1; }
     log_success "Modo color de alta calidad (cutoff 140)"
-    
-    # Dithering avanzado
-    echo '1' | sudo tee /sys/module/jdi_drm_enhanced/parameters/dither > /dev/null
     log_success "Dithering avanzado habilitado"
-    
-    # Mono settings para máximo contraste
-    echo '60' | sudo tee /sys/module/jdi_drm_enhanced/parameters/mono_cutoff > /dev/null
-    echo 'N' | sudo tee /sys/module/jdi_drm_enhanced/parameters/mono_invert > /dev/null
     log_success "Configuración mono de alta calidad"
-    
-    # PWM backlight óptimo
-    echo '4' > /sys/class/backlight/jdi-backlight/brightness
-    log_success "Backlight PWM óptimo (nivel 4)"
+    log_success "Backlight PWM óptimo (nivel máximo disponible)"
 }
 
 calibrate_display() {
     log_info "Calibrando display LPM027M128C..."
     
-    # Configuración específica para IGZO
-    echo 'Y' | sudo tee /sys/module/jdi_drm_enhanced/parameters/auto_clear > /dev/null
-    echo 'Y' | sudo tee /sys/module/jdi_drm_enhanced/parameters/overlays > /dev/null
-    
-    # Test de colores para calibración
+    # Configuración específica para IGZO y calibración de cutoffs
     log_info "Aplicando configuración de calibración..."
-    echo '110' | sudo tee /sys/module/jdi_drm_enhanced/parameters/color_cutoff > /dev/null
-    echo '50' | sudo tee /sys/module/jdi_drm_enhanced/parameters/mono_cutoff > /dev/null
+    apply_profile calibrate || { log_error "Error aplicando el perfil (cambios revertidos)"; return 1; }
     
     log_success "Calibración LPM027M128C completada"
 }
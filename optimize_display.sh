@@ -10,6 +10,8 @@ BLUE='\033[0;34m'
 PURPLE='\033[0;35m'
 NC='\033[0m'
 
+SCRIPT_DIR="$(cd "$(dirname "$(readlink -f "${BASH_SOURCE[0]}")")" && pwd)"
+
 log_info() {
     echo -e "${BLUE}[INFO]${NC} $1"
 }
@@ -56,27 +58,12 @@ optimize_all() {
         return 1
     fi
     
-    # Enable power save with 2min timeout
-    log_info "Configuring power management..."
-    python3 /home/pi/jdi-drm-enhanced64/powersave.py enable-powersave --timeout 120000
-    
-    # Enable hardware dithering
-    log_info "Enabling hardware dithering..."
-    python3 /home/pi/jdi-drm-enhanced64/powersave.py dither-on
-    
-    # Configure auto clear
-    log_info "Enabling auto clear..."
-    echo 'Y' > /sys/module/jdi_drm_enhanced/parameters/auto_clear
-    
-    # Enable color mode
-    log_info "Ensuring color mode is enabled..."
-    echo 'Y' > /sys/module/jdi_drm_enhanced/parameters/color
-    
-    # Set optimal PWM backlight level
-    if check_pwm_backlight; then
-        log_info "Setting optimal PWM backlight level..."
-        echo '4' > /sys/class/backlight/jdi-backlight/brightness
-        log_success "PWM backlight set to level 4/6"
+    # Power save with 2min timeout, dithering, auto clear, color mode and
+    # PWM backlight level, written in one process (only changed values)
+    log_info "Applying optimize profile..."
+    if ! python3 "$SCRIPT_DIR/jdi_profiles.py" optimize; then
+        log_error "Optimization failed, previous settings restored"
+        return 1
     fi
     
     log_success "Optimization complete!"
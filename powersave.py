@@ -10,22 +10,31 @@ import argparse
 import time
 from pathlib import Path
 
+from jdi_sysfs import default_sysfs
+from jdi_profiles import ProfileEngine, ProfileError
+from jdi_telemetry import read_textfile, TEXTFILE_PATH
+
 class JDIPowerManager:
-    def __init__(self):
+    def __init__(self, sysfs=None, brightness_writer=None):
+        # Persistent sysfs attributes (pread/pwrite, unchanged writes skipped)
+        self.sysfs = sysfs or default_sysfs()
+        # Applies PWM levels instead of the sysfs write (the control
+        # service hands them to the daemon, which owns the backlight)
+        self.brightness_writer = brightness_writer
+        
         # Module parameters (still used for power management)
-        self.module_path = Path('/sys/module/jdi_drm_enhanced/parameters')
+        self.module_path = Path(self.sysfs.params_dir())
         self.params = {
-            'auto_power_save': self.module_path / 'auto_power_save',
-            'idle_timeout': self.module_path / 'idle_timeout',
-            'dither': self.module_path / 'dither',
-            'auto_clear': self.module_path / 'auto_clear',
-            'color': self.module_path / 'color',
+            name: self.sysfs.param(name)
+            for name in ('auto_power_save', 'idle_timeout', 'dither', 'auto_clear', 'color')
         }
         
         # PWM Backlight control (NEW - real illumination control)
-        self.pwm_backlight_path = Path('/sys/class/backlight/jdi-backlight/brightness')
-        self.pwm_max_brightness_path = Path('/sys/class/backlight/jdi-backlight/max_brightness')
-        self.pwm_power_path = Path('/sys/class/backlight/jdi-backlight/bl_power')
+        self.pwm_backlight = self.sysfs.backlight('brightness')
+        self.pwm_max_brightness = self.sysfs.backlight('max_brightness')
+        self.pwm_backlight_path = Path(self.pwm_backlight.path)
+        self.pwm_max_brightness_path = Path(self.pwm_max_brightness.path)
+        self.pwm_power_path = Path(self.sysfs.backlight('bl_power').path)
         
         # Colors for output
         self.colors = {
@@ -67,8 +76,7 @@ class JDIPowerManager:
         """Read parameter value"""
         try:
             if param_name in self.params:
-                with open(self.params[param_name], 'r') as f:
-                    return f.read().strip()
+                return self.params[param_name].read()
             return None
         except PermissionError:
             self.log('ERROR', f'Permission denied reading {param_name}. Try with sudo.')
@@ -81,8 +89,7 @@ class JDIPowerManager:
         """Write parameter value"""
         try:
             if param_name in self.params:
-                with open(self.params[param_name], 'w') as f:
-                    f.write(str(value))
+                self.params[param_name].write(value)
                 return True
             return False
         except PermissionError:
@@ -95,8 +102,7 @@ class JDIPowerManager:
     def read_pwm_brightness(self):
         """Read current PWM brightness"""
         try:
-            with open(self.pwm_backlight_path, 'r') as f:
-                return int(f.read().strip())
+            return int(self.pwm_backlight.read())
         except Exception as e:
             self.log('ERROR', f'Error reading PWM brightness: {e}')
             return None
@@ -104,17 +110,18 @@ class JDIPowerManager:
     def read_pwm_max_brightness(self):
         """Read maximum PWM brightness"""
         try:
-            with open(self.pwm_max_brightness_path, 'r') as f:
-                return int(f.read().strip())
+            # Fixed by the driver, read once
+            return int(self.pwm_max_brightness.cached())
         except Exception as e:
             self.log('ERROR', f'Error reading max PWM brightness: {e}')
             return 6  # Default fallback
     
     def set_pwm_brightness(self, level):
         """Set PWM brightness level"""
+        if self.brightness_writer is not None:
+            return self.brightness_writer(level)
         try:
-            with open(self.pwm_backlight_path, 'w') as f:
-                f.write(str(level))
+            self.pwm_backlight.write(level)
             return True
         except PermissionError:
             self.log('ERROR', 'Permission denied setting brightness. Try with sudo.')
@@ -126,7 +133,7 @@ class JDIPowerManager:
     def show_status(self):
         """Show current power management status"""
         if not self.check_driver():
-            return
+            return False
             
         self.log('INFO', 'JDI Display Power Management Status')
         print('=' * 40)
@@ -172,6 +179,38 @@ class JDIPowerManager:
                 print(f"  Auto sleep after: {timeout_sec}s of inactivity")
             else:
                 print("  Auto sleep: Disabled")
+        return True
+    
+    def show_telemetry(self, path=TEXTFILE_PATH):
+        """Summarize the backlight telemetry written by the button daemon"""
+        try:
+            metrics = read_textfile(path)
+        except OSError:
+            self.log('WARNING', f'No telemetry at {path} (is the button service running?)')
+            return False
+        
+        self.log('INFO', 'JDI Backlight Telemetry')
+        print('=' * 40)
+        prefix = 'jdi_backlight_seconds_total{level="'
+        total = sum(v for k, v in metrics.items() if k.startswith(prefix))
+        for key, seconds in sorted(metrics.items()):
+            if key.startswith(prefix):
+                level = key[len(prefix):-2]
+                share = seconds * 100 / total if total else 0
+                print(f"  Level {level}: {seconds / 3600:8.2f} h ({share:.0f}%)")
+        
+        energy = metrics.get('jdi_backlight_energy_joules_total', 0.0)
+        print(f"  Estimated backlight energy: {energy / 3.6:.1f} mWh")
+        presses = sum(v for k, v in metrics.items() if k.startswith('jdi_button_presses_total'))
+        print(f"  Button presses: {presses:.0f}")
+        count = metrics.get('jdi_button_latency_seconds_count', 0)
+        if count:
+            latency = metrics['jdi_button_latency_seconds_sum'] / count
+            print(f"  Mean press latency: {latency * 1000:.1f} ms")
+        print(f"  Auto-dim events: {metrics.get('jdi_auto_dim_total', 0):.0f}")
+        idle_off = metrics.get('jdi_panel_power_events_total{event="idle_off"}', 0)
+        print(f"  Idle backlight-off events: {idle_off:.0f}")
+        return True
     
     def enable_powersave(self, timeout_ms=120000):
         """Enable auto power save with timeout"""
@@ -251,20 +290,50 @@ class JDIPowerManager:
         """Apply optimal power settings"""
         self.log('INFO', 'Applying optimal power settings...')
         
-        # Enable auto power save with 2 minute timeout
-        self.enable_powersave(120000)
-        
-        # Enable hardware dithering
-        self.set_dithering(True)
-        
-        # Enable auto clear
-        self.write_param('auto_clear', 'Y')
-        
-        # Set backlight to medium level
-        if self.check_pwm_backlight():
-            self.set_backlight(True, 4)
+        # Auto power save (2 minute timeout), dithering, auto clear and
+        # backlight level from the 'power-optimize' profile (color mode is
+        # not touched), only changed values are written and everything is
+        # rolled back on failure
+        engine = ProfileEngine(self.sysfs)
+        try:
+            changes = engine.apply('power-optimize')
+        except ProfileError as e:
+            self.log('ERROR', f'{e} - previous settings restored')
+            return False
         
+        for key, current, target in changes:
+            self.log('INFO', f'{key}: {current} -> {target}')
         self.log('SUCCESS', 'Optimal power settings applied')
+        return True
+
+COMMANDS = ('status', 'enable-powersave', 'disable-powersave', 'dither-on', 'dither-off',
+            'backlight-on', 'backlight-off', 'brightness', 'optimize', 'telemetry')
+
+def run_command(pm, command, timeout=120000, level=4):
+    """Run one powersave command; None for unknown commands"""
+    if command not in COMMANDS:
+        return None
+    if command == 'status':
+        return pm.show_status()
+    elif command == 'enable-powersave':
+        return pm.enable_powersave(timeout)
+    elif command == 'disable-powersave':
+        return pm.disable_powersave()
+    elif command == 'dither-on':
+        return pm.set_dithering(True)
+    elif command == 'dither-off':
+        return pm.set_dithering(False)
+    elif command == 'backlight-on':
+        return pm.set_backlight(True, level)
+    elif command == 'backlight-off':
+        return pm.set_backlight(False)
+    elif command == 'brightness':
+        return pm.check_pwm_backlight() and pm.set_pwm_brightness(level)
+    elif command == 'optimize':
+        return pm.optimize_power()
+    elif command == 'telemetry':
+        return pm.show_telemetry()
+    return False
 
 def main():
     parser = argparse.ArgumentParser(description='JDI Display Power Management with PWM')
@@ -275,30 +344,11 @@ def main():
     args = parser.parse_args()
     pm = JDIPowerManager()
     
-    if args.command == 'status':
-        pm.show_status()
-    elif args.command == 'enable-powersave':
-        pm.enable_powersave(args.timeout)
-    elif args.command == 'disable-powersave':
-        pm.disable_powersave()
-    elif args.command == 'dither-on':
-        pm.set_dithering(True)
-    elif args.command == 'dither-off':
-        pm.set_dithering(False)
-    elif args.command == 'backlight-on':
-        pm.set_backlight(True, args.level)
-    elif args.command == 'backlight-off':
-        pm.set_backlight(False)
-    elif args.command == 'brightness':
-        if pm.check_pwm_backlight():
-            pm.set_pwm_brightness(args.level)
-    elif args.command == 'optimize':
-        pm.optimize_power()
-    else:
+    if run_command(pm, args.command, args.timeout, args.level) is None:
         print(f"Unknown command: {args.command}")
         print("Available commands: status, enable-powersave, disable-powersave,")
         print("                   dither-on, dither-off, backlight-on, backlight-off,")
-        print("                   brightness, optimize")
+        print("                   brightness, optimize, telemetry")
         sys.exit(1)
 
 if __name__ == '__main__':
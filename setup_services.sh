@@ -45,7 +45,7 @@ RemainAfterExit=yes
 WantedBy=multi-user.target
 PERMISSIONS_SERVICE_EOF
 
-    # 2. GPIO17 backlight button service
+    # 2. GPIO17 backlight button service (single backlight/power daemon)
     sudo tee /etc/systemd/system/jdi-backlight-button.service > /dev/null << 'BACKLIGHT_SERVICE_EOF'
 [Unit]
 Description=JDI GPIO17 Backlight Button Controller
@@ -54,9 +54,10 @@ Wants=multi-user.target
 
 [Service]
 Type=simple
-User=pi
-Group=pi
-ExecStart=/usr/bin/python3 /home/pi/jdi-drm64/enhanced_back.py
+# Root: the driver parameters it keeps in sync are 0660 root
+User=root
+Group=root
+ExecStart=/usr/bin/python3 /home/pi/jdi-drm64/jdi_daemon.py
 Restart=always
 RestartSec=5
 Environment=PYTHONUNBUFFERED=1
@@ -80,30 +81,36 @@ RemainAfterExit=yes
 WantedBy=multi-user.target
 OPTIMIZE_SERVICE_EOF
 
-    # 4. Power save service
-    sudo tee /etc/systemd/system/jdi-powersave.service > /dev/null << 'POWERSAVE_SERVICE_EOF'
+    # 4. Driver power save (auto_power_save/idle_timeout) is owned by the
+    #    daemon, which follows its idle stages. Remove the old oneshot unit
+    #    that wrote the same parameters on start/stop.
+    sudo systemctl disable --now jdi-powersave.service 2>/dev/null || true
+    sudo rm -f /etc/systemd/system/jdi-powersave.service
+
+    # 5. Control service (root; jdi_ctl.py commands over /run/jdi/control.sock)
+    sudo tee /etc/systemd/system/jdi-control.service > /dev/null << 'CONTROL_SERVICE_EOF'
 [Unit]
-Description=JDI Intelligent Power Management
+Description=JDI Control Service (Unix socket)
 After=multi-user.target
 
 [Service]
 Type=simple
 User=root
-ExecStart=/usr/bin/python3 /home/pi/jdi-drm64/powersave.py --timeout 300
+ExecStart=/usr/bin/python3 /home/pi/jdi-drm64/jdi_control.py --group video
 Restart=always
-RestartSec=10
+RestartSec=5
 Environment=PYTHONUNBUFFERED=1
 
 [Install]
 WantedBy=multi-user.target
-POWERSAVE_SERVICE_EOF
+CONTROL_SERVICE_EOF
 
     # Enable all services
     sudo systemctl daemon-reload
     sudo systemctl enable jdi-permissions.service
     sudo systemctl enable jdi-backlight-button.service
     sudo systemctl enable jdi-auto-optimize.service
-    sudo systemctl enable jdi-powersave.service
+    sudo systemctl enable jdi-control.service
     
     log_success "All systemd services configured and enabled"
 }
@@ -124,7 +131,6 @@ add_comprehensive_aliases() {
 # Author: N@Xs - Enhanced Edition 2025
 alias monoset='/home/pi/jdi-drm64/monoset'
 alias dither='/home/pi/jdi-drm64/dithering.sh'
-alias powersave='sudo python3 /home/pi/jdi-drm64/powersave.py'
 alias backlight='python3 /home/pi/jdi-drm64/enhanced_back.py'
 alias optimize='sudo /home/pi/jdi-drm64/optimize_display.sh'
 alias jdi-status='/home/pi/jdi-drm64/jdi-status'
@@ -133,6 +139,22 @@ alias lpm027optimizer='/home/pi/jdi-drm64/lpm027-optimizer.sh'
 alias testjdi='/home/pi/jdi-drm64/test_driver_complete.sh'
 alias jdi-permissions='sudo chmod +x /home/pi/jdi-drm64/*.sh /home/pi/jdi-drm64/*.py /home/pi/jdi-drm64/monoset /home/pi/jdi-drm64/jdi-status'
 
+# Control service client: no sudo, no interpreter start-up for the work
+# (exit status 2: service not running, fall back to the standalone tools)
+jdi-ctl() { python3 -S /home/pi/jdi-drm64/jdi_ctl.py "$@"; }
+powersave() {
+    jdi-ctl powersave "$@" 2>/dev/null
+    local rc=$?
+    [ $rc -ne 2 ] && return $rc
+    sudo python3 /home/pi/jdi-drm64/powersave.py "$@"
+}
+jdi-brightness() {
+    jdi-ctl brightness "$1" 2>/dev/null
+    local rc=$?
+    [ $rc -ne 2 ] && return $rc
+    echo "$1" | sudo tee /sys/class/backlight/jdi-backlight/brightness > /dev/null
+}
+
 # LPM027M128C Specific Commands (based on PDF specifications)
 alias lpm027-status='jdi-status'
 alias lmp027-8colors='monoset color'
@@ -143,20 +165,22 @@ alias lpm027-lowpower='powersave --timeout 60'
 alias lpm027-optimize='lpm027optimizer'
 
 # Quick Configuration Presets
-alias preset-indoor='monoset color && echo 4 | sudo tee /sys/class/backlight/jdi-backlight/brightness'
-alias preset-outdoor='lpm027-reflective && echo 6 | sudo tee /sys/class/backlight/jdi-backlight/brightness'
-alias preset-battery='lpm027-lowpower && echo 1 | sudo tee /sys/class/backlight/jdi-backlight/brightness'
+alias preset-indoor='monoset color && jdi-brightness 4'
+alias preset-outdoor='lpm027-reflective && jdi-brightness 6'
+alias preset-battery='lpm027-lowpower && jdi-brightness 1'
 alias preset-performance='monoset color && optimize'
-alias preset-reading='monoset color && echo 3 | sudo tee /sys/class/backlight/jdi-backlight/brightness'
+alias preset-reading='monoset color && jdi-brightness 3'
 
 # Power Management
-alias power-status='systemctl status jdi-powersave.service'
-alias power-performance='sudo systemctl stop jdi-powersave.service'
-alias power-eco='sudo systemctl start jdi-powersave.service'
+# The daemon (jdi-backlight-button.service) owns the driver power save:
+# it enables it on start and only adjusts idle_timeout afterwards
+alias power-status='powersave status'
+alias power-performance='powersave disable-powersave'
+alias power-eco='sudo systemctl restart jdi-backlight-button.service'
 
 # Brightness Control
 alias brightness='cat /sys/class/backlight/jdi-backlight/brightness'
-alias brightness-set='sudo tee /sys/class/backlight/jdi-backlight/brightness <<<'
+alias brightness-set='jdi-brightness'
 
 # JDI Help function
 jdi-help() {
@@ -167,6 +191,7 @@ jdi-help() {
     echo "  jdi-status       - Complete system status monitor"
     echo "  brightness       - Show current PWM brightness (0-3)"
     echo "  brightness-set N - Set PWM brightness (0-3)"
+    echo "  jdi-ctl CMD      - Control service (status, profile, brightness, powersave)"
     echo ""
     echo "🖥️ LPM027M128C Specific Commands (PDF specifications):"
     echo "  lpm027-status    - LPM027M128C color/mono status"
@@ -187,8 +212,8 @@ jdi-help() {
     echo "⚡ Power Management (MIP Technology):"
     echo "  powersave        - Advanced power management"
     echo "  power-status     - Power management status"
-    echo "  power-performance- Performance power mode"
-    echo "  power-eco        - Eco power mode"
+    echo "  power-performance- Performance power mode (driver power save off)"
+    echo "  power-eco        - Eco power mode (daemon re-enables power save)"
     echo ""
     echo "🔧 System Commands:"
     echo "  monoset          - Display status monitor"
@@ -232,7 +257,7 @@ main() {
     echo -e "${GREEN}Services created and enabled:${NC}"
     echo "  ✅ jdi-backlight-button.service (GPIO17 button)"
     echo "  ✅ jdi-auto-optimize.service (auto optimization)"
-    echo "  ✅ jdi-powersave.service (5-minute power saving)"
+    echo "  ✅ jdi-control.service (control socket, no sudo needed)"
     echo "  ✅ jdi-permissions.service (boot permissions)"
     echo ""
     echo -e "${CYAN}Available commands:${NC}"
@@ -103,6 +103,18 @@ struct overlay_display_t
 static LIST_HEAD(g_overlays);
 static LIST_HEAD(g_visible_overlays);
 
+// Per-client state in drm_file->driver_priv
+struct overlay_file_t
+{
+	// Overlay show/hide calls do not redraw (the client flushes the rows itself)
+	bool defer;
+};
+
+static struct overlay_file_t *overlay_file(struct drm_file *file)
+{
+	return file ? (struct overlay_file_t *)file->driver_priv : NULL;
+}
+
 /* Global button state */
 static struct work_struct g_button_work;
 extern bool g_param_backlit;
@@ -226,7 +238,7 @@ static void draw_overlays(struct sharp_memory_panel *panel, u8* buf, int width,
 		y = (ov->y < 0) ? (panel->height + ov->y) : ov->y;
 
 		// Any overlap?
-		if (((y + ov->height) < clip->y1) || (clip->y2 < y)) {
+		if (((y + ov->height) <= clip->y1) || (clip->y2 <= y)) {
 			continue;
 		}
 
@@ -245,9 +257,11 @@ static void draw_overlays(struct sharp_memory_panel *panel, u8* buf, int width,
 
 			for (sx = 0; sx < ov->width; sx++) {
 
-				if (sx < clip->x1) {
+				// Clip in screen columns, pixels past the edge must not
+				// wrap into the neighbouring line
+				if ((x + sx) < clip->x1) {
 					continue;
-				} else if (clip->x2 <= sx) {
+				} else if (clip->x2 <= (x + sx)) {
 					break;
 				}
 
@@ -586,13 +600,33 @@ DEFINE_DRM_GEM_DMA_FOPS(sharp_memory_fops);
 
 static const struct drm_ioctl_desc sharp_memory_ioctls[] = {
 	DRM_IOCTL_DEF_DRV_REDRAW,
+	DRM_IOCTL_DEF_DRV_REDRAW_ROWS,
 	DRM_IOCTL_DEF_DRV_OV_ADD,
 	DRM_IOCTL_DEF_DRV_OV_REM,
 	DRM_IOCTL_DEF_DRV_OV_SHOW,
 	DRM_IOCTL_DEF_DRV_OV_HIDE,
-	DRM_IOCTL_DEF_DRV_OV_CLEAR
+	DRM_IOCTL_DEF_DRV_OV_CLEAR,
+	DRM_IOCTL_DEF_DRV_OV_DEFER
 };
 
+static int sharp_memory_open(struct drm_device *drm, struct drm_file *file)
+{
+	file->driver_priv = kzalloc(sizeof(struct overlay_file_t), GFP_KERNEL);
+	return file->driver_priv ? 0 : -ENOMEM;
+}
+
+static void sharp_memory_postclose(struct drm_device *drm, struct drm_file *file)
+{
+	struct overlay_file_t *priv = overlay_file(file);
+
+	// A client that exits mid-batch would leave its overlay changes undrawn
+	if (priv && priv->defer) {
+		drm_redraw_fb(drm, -1);
+	}
+	kfree(priv);
+	file->driver_priv = NULL;
+}
+
 static const struct drm_driver sharp_memory_driver = {
 	.driver_features = DRIVER_GEM | DRIVER_MODESET | DRIVER_ATOMIC,
 	.fops = &sharp_memory_fops,
@@ -604,7 +638,9 @@ static const struct drm_driver sharp_memory_driver = {
 	.minor = 1,
 
 	.ioctls = sharp_memory_ioctls,
-	.num_ioctls = ARRAY_SIZE(sharp_memory_ioctls)
+	.num_ioctls = ARRAY_SIZE(sharp_memory_ioctls),
+	.open = sharp_memory_open,
+	.postclose = sharp_memory_postclose
 };
 
 int drm_probe(struct spi_device *spi)
@@ -768,6 +804,11 @@ void drm_remove(struct spi_device *spi)
 }
 
 int drm_redraw_fb(struct drm_device *drm, int height)
+{
+	return drm_redraw_rows(drm, 0, (height > 0) ? height : INT_MAX);
+}
+
+int drm_redraw_rows(struct drm_device *drm, int y1, int y2)
 {
 	struct sharp_memory_panel *panel;
 	struct drm_framebuffer *fb;
@@ -780,18 +821,52 @@ int drm_redraw_fb(struct drm_device *drm, int height)
 		return 0;
 	}
 
+	// Clamp to the framebuffer, nothing to do for an empty range
+	y1 = max(y1, 0);
+	y2 = min(y2, (int)fb->height);
+	if (y2 <= y1) {
+		return 0;
+	}
+
 	// Create dirty region
 	dirty_rect.x1 = 0;
 	dirty_rect.x2 = fb->width;
-	dirty_rect.y1 = 0;
-	dirty_rect.y2 = (height > 0)
-		? height
-		: fb->height;
+	dirty_rect.y1 = y1;
+	dirty_rect.y2 = y2;
 
 	// Call framebuffer region update handler
 	return fb->funcs->dirty(fb, NULL, 0, 0, &dirty_rect, 1);
 }
 
+int drm_redraw_overlay(struct drm_device *drm, void* storage_,
+	struct drm_file *file)
+{
+	struct overlay_storage_t *storage = (struct overlay_storage_t *)storage_;
+	struct overlay_file_t *priv = overlay_file(file);
+	struct sharp_memory_panel *panel;
+	int y;
+
+	if (!drm || !storage || (priv && priv->defer)) {
+		return 0;
+	}
+	panel = drm_to_panel(drm);
+
+	// Only the rows the overlay covers, anchored as in draw_overlays
+	y = (storage->overlay.y < 0)
+		? (panel->height + storage->overlay.y)
+		: storage->overlay.y;
+	return drm_redraw_rows(drm, y, y + storage->overlay.height);
+}
+
+void drm_defer_overlay_redraws(struct drm_file *file, bool defer)
+{
+	struct overlay_file_t *priv = overlay_file(file);
+
+	if (priv) {
+		priv->defer = defer;
+	}
+}
+
 void* drm_add_overlay(int x, int y, int width, int height,
 	unsigned char const* pixels)
 {
@@ -849,11 +924,14 @@ void* drm_show_overlay(void* storage_)
 	return entry;
 }
 
-void drm_hide_overlay(void* entry_)
+void* drm_hide_overlay(void* entry_)
 {
 	struct overlay_display_t *entry = (struct overlay_display_t *)entry_;
+	struct overlay_storage_t *storage = entry->storage;
 
 	list_del(&entry->list);
 	kfree(entry);
+
+	return storage;
 }
 
@@ -29,11 +29,15 @@ int drm_probe(struct spi_device *spi);
 void drm_remove(struct spi_device *spi);
 
 int drm_redraw_fb(struct drm_device *drm, int height);
+int drm_redraw_rows(struct drm_device *drm, int y1, int y2);
+int drm_redraw_overlay(struct drm_device *drm, void* storage,
+	struct drm_file *file);
+void drm_defer_overlay_redraws(struct drm_file *file, bool defer);
 void* drm_add_overlay(int x, int y, int width, int height,
 	unsigned char const* pixels);
 void drm_remove_overlay(void* storage);
 void drm_clear_overlays(void);
 void* drm_show_overlay(void* storage);
-void drm_hide_overlay(void* display);
+void* drm_hide_overlay(void* display);
 
 #endif
@@ -21,6 +21,16 @@ int sharp_memory_ioctl_redraw(struct drm_device *dev, void *data,
 	return 0;
 }
 
+int sharp_memory_ioctl_redraw_rows(struct drm_device *dev, void *rows_,
+	struct drm_file *file)
+{
+	struct sharp_memory_ioctl_redraw_rows_t *rows
+		= (struct sharp_memory_ioctl_redraw_rows_t *)rows_;
+
+	drm_redraw_rows(dev, rows->y1, rows->y2);
+	return 0;
+}
+
 int sharp_memory_ioctl_ov_add(struct drm_device *dev,
 	void *in_overlay_out_storage, struct drm_file *file)
 {
@@ -67,9 +77,12 @@ int sharp_memory_ioctl_ov_show(struct drm_device *dev,
 	union sharp_memory_ioctl_ov_show_t *show
 		= (union sharp_memory_ioctl_ov_show_t *)in_storage_out_display;
 
-	show->out_display = drm_show_overlay(show->in_storage);
+	void *storage = show->in_storage;
 
-	drm_redraw_fb(dev, -1);
+	show->out_display = drm_show_overlay(storage);
+
+	// Only the rows under the overlay change
+	drm_redraw_overlay(dev, storage, file);
 
 	return 0;
 }
@@ -80,9 +93,9 @@ int sharp_memory_ioctl_ov_hide(struct drm_device *dev, void *display_,
 	struct sharp_memory_ioctl_ov_hide_t *display
 		= (struct sharp_memory_ioctl_ov_hide_t *)display_;
 
-	drm_hide_overlay(display->display);
+	void *storage = drm_hide_overlay(display->display);
 
-	drm_redraw_fb(dev, -1);
+	drm_redraw_overlay(dev, storage, file);
 
 	return 0;
 }
@@ -95,3 +108,13 @@ int sharp_memory_ioctl_ov_clear(struct drm_device *dev, void *_,
 	return 0;
 }
 
+int sharp_memory_ioctl_ov_defer(struct drm_device *dev, void *defer_,
+	struct drm_file *file)
+{
+	struct sharp_memory_ioctl_ov_defer_t *defer
+		= (struct sharp_memory_ioctl_ov_defer_t *)defer_;
+
+	drm_defer_overlay_redraws(file, defer->defer != 0);
+	return 0;
+}
+
@@ -32,8 +32,22 @@ struct sharp_memory_ioctl_ov_hide_t
 	void *display;
 };
 
+// Rows [y1, y2) to redraw, clamped to the framebuffer
+struct sharp_memory_ioctl_redraw_rows_t
+{
+	int y1, y2;
+};
+
+// Non-zero: OV_SHOW/OV_HIDE from this file do not redraw until reset
+struct sharp_memory_ioctl_ov_defer_t
+{
+	int defer;
+};
+
 int sharp_memory_ioctl_redraw(struct drm_device *dev, void *,
 	struct drm_file *file);
+int sharp_memory_ioctl_redraw_rows(struct drm_device *dev, void *rows,
+	struct drm_file *file);
 
 int sharp_memory_ioctl_ov_add(struct drm_device *dev, \
 	void *in_overlay_out_storage, struct drm_file *file);
@@ -45,19 +59,26 @@ int sharp_memory_ioctl_ov_hide(struct drm_device *dev, void *display,
 	struct drm_file *file);
 int sharp_memory_ioctl_ov_clear(struct drm_device *dev, void *,
 	struct drm_file *file);
+int sharp_memory_ioctl_ov_defer(struct drm_device *dev, void *defer,
+	struct drm_file *file);
 
 // No parameters, callable from kernel space
 #define DRM_SHARP_REDRAW 0x00
 
 // Parameters, must call from userspace
+#define DRM_SHARP_REDRAW_ROWS 0x01
 #define DRM_SHARP_OV_ADD 0x10
 #define DRM_SHARP_OV_REM 0x11
 #define DRM_SHARP_OV_SHOW 0x12
 #define DRM_SHARP_OV_HIDE 0x13
 #define DRM_SHARP_OV_CLEAR 0x14
+#define DRM_SHARP_OV_DEFER 0x15
 
 #define DRM_IOCTL_SHARP_REDRAW \
 	DRM_IO(DRM_COMMAND_BASE + DRM_SHARP_REDRAW)
+#define DRM_IOCTL_SHARP_REDRAW_ROWS \
+	DRM_IOW(DRM_COMMAND_BASE + DRM_SHARP_REDRAW_ROWS, \
+		struct sharp_memory_ioctl_redraw_rows_t)
 
 #define DRM_IOCTL_SHARP_OV_ADD \
 	DRM_IOWR(DRM_COMMAND_BASE + DRM_SHARP_OV_ADD, \
@@ -73,9 +94,14 @@ int sharp_memory_ioctl_ov_clear(struct drm_device *dev, void *,
 		struct sharp_memory_ioctl_ov_hide_t)
 #define DRM_IOCTL_SHARP_OV_CLEAR \
 	DRM_IO(DRM_COMMAND_BASE + DRM_SHARP_OV_CLEAR)
+#define DRM_IOCTL_SHARP_OV_DEFER \
+	DRM_IOW(DRM_COMMAND_BASE + DRM_SHARP_OV_DEFER, \
+		struct sharp_memory_ioctl_ov_defer_t)
 
 #define DRM_IOCTL_DEF_DRV_REDRAW \
 	DRM_IOCTL_DEF_DRV(SHARP_REDRAW, sharp_memory_ioctl_redraw, DRM_RENDER_ALLOW)
+#define DRM_IOCTL_DEF_DRV_REDRAW_ROWS \
+	DRM_IOCTL_DEF_DRV(SHARP_REDRAW_ROWS, sharp_memory_ioctl_redraw_rows, DRM_RENDER_ALLOW)
 
 #define DRM_IOCTL_DEF_DRV_OV_ADD \
 	DRM_IOCTL_DEF_DRV(SHARP_OV_ADD, sharp_memory_ioctl_ov_add, DRM_RENDER_ALLOW)
@@ -87,5 +113,7 @@ int sharp_memory_ioctl_ov_clear(struct drm_device *dev, void *,
 	DRM_IOCTL_DEF_DRV(SHARP_OV_HIDE, sharp_memory_ioctl_ov_hide, DRM_RENDER_ALLOW)
 #define DRM_IOCTL_DEF_DRV_OV_CLEAR \
 	DRM_IOCTL_DEF_DRV(SHARP_OV_CLEAR, sharp_memory_ioctl_ov_clear, DRM_RENDER_ALLOW)
+#define DRM_IOCTL_DEF_DRV_OV_DEFER \
+	DRM_IOCTL_DEF_DRV(SHARP_OV_DEFER, sharp_memory_ioctl_ov_defer, DRM_RENDER_ALLOW)
 
 #endif